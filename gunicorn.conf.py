@@ -0,0 +1,41 @@
+"""Production server: ``gunicorn -c gunicorn.conf.py``, configured from the environment.
+
+WEB_SERVER=uvicorn (default) serves the ASGI app, which the live board needs;
+WEB_SERVER=gthread serves the WSGI app with WEB_THREADS threads per worker.
+Each worker has its own DB pool, so Postgres sees up to WEB_WORKERS * DB_POOL_MAX_SIZE connections.
+Several workers need a shared cache and broker (DJANGO_CACHE=redis,
+REALTIME_BROKER=projects.realtime.RedisBroker); without them only one is started.
+"""
+import multiprocessing
+import os
+import sys
+
+bind = os.getenv('WEB_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('WEB_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+
+# Board versions, cached fragments and ETags live in the cache, live events in the broker:
+# per-process ones would serve stale boards and drop events across workers.
+_per_process = [name for name, value, default in (
+    ('DJANGO_CACHE', os.getenv('DJANGO_CACHE', 'locmem'), 'locmem'),
+    ('REALTIME_BROKER', os.getenv('REALTIME_BROKER', 'projects.realtime.InProcessBroker'), 'projects.realtime.InProcessBroker'),
+) if value == default]
+if workers > 1 and _per_process:
+    print(f'gunicorn.conf.py: {" and ".join(_per_process)} are per process; starting 1 worker instead of {workers}.',
+          file=sys.stderr)
+    workers = 1
+
+if os.getenv('WEB_SERVER', 'uvicorn') == 'gthread':
+    wsgi_app = 'project_manager.wsgi:application'
+    worker_class = 'gthread'
+    threads = int(os.getenv('WEB_THREADS', '4'))
+else:
+    wsgi_app = 'project_manager.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+
+timeout = int(os.getenv('WEB_TIMEOUT', '30'))
+graceful_timeout = int(os.getenv('WEB_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.getenv('WEB_KEEPALIVE', '5'))
+# Recycle workers now and then so slow leaks cannot build up.
+max_requests = int(os.getenv('WEB_MAX_REQUESTS', '5000'))
+max_requests_jitter = max_requests // 10
+accesslog = '-' if os.getenv('WEB_ACCESS_LOG', '0') == '1' else None
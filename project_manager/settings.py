@@ -20,11 +20,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'projects.instrumentation.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'projects.activity.ActivityMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -48,6 +50,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'project_manager.wsgi.application'
+ASGI_APPLICATION = 'project_manager.asgi.application'
 
 # DB: SQLite by default; set USE_POSTGRES=1 for Postgres
 if os.getenv('USE_POSTGRES', '0') == '1':
@@ -59,13 +62,59 @@ if os.getenv('USE_POSTGRES', '0') == '1':
             'PASSWORD': os.getenv('POSTGRES_PASSWORD', 'postgres'),
             'HOST': os.getenv('POSTGRES_HOST', 'db'),
             'PORT': os.getenv('POSTGRES_PORT', '5432'),
+            # Without the pool: seconds to keep a connection open between requests (WSGI workers only;
+            # under ASGI every request runs in a new thread and cannot reuse it).
+            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
         }
     }
+    # Connection pool per worker process (psycopg_pool); the default under the ASGI server.
+    if os.getenv('DB_POOL', '1') == '1':
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS'] = {'pool': {
+            'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '2')),
+            'max_size': int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+            'timeout': int(os.getenv('DB_POOL_TIMEOUT', '10')),
+        }}
 else:
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            'OPTIONS': {
+                # Wait for a busy writer instead of failing, and take the write lock when a transaction starts.
+                'timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', '20')),
+                'transaction_mode': 'IMMEDIATE',
+            },
+        }
+    }
+    # Write-ahead log: readers no longer block on the writer. Fsync at checkpoints only (safe in WAL mode).
+    if os.getenv('SQLITE_WAL', '1') == '1':
+        DATABASES['default']['OPTIONS']['init_command'] = (
+            'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL; PRAGMA temp_store=MEMORY; '
+            'PRAGMA cache_size=-20000; PRAGMA mmap_size=134217728'
+        )
+
+# Cache: in-process by default; DJANGO_CACHE=file or DJANGO_CACHE=redis to share it between workers
+CACHE_BACKEND = os.getenv('DJANGO_CACHE', 'locmem')
+if CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL', 'redis://localhost:6379/0'),
+        }
+    }
+elif CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv('DJANGO_CACHE_DIR', str(BASE_DIR / '.cache')),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
         }
     }
 
@@ -98,7 +147,52 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_FILTER_BACKENDS': (
         'django_filters.rest_framework.DjangoFilterBackend',
-        'rest_framework.filters.SearchFilter',
+        'projects.search.FullTextSearchFilter',
         'rest_framework.filters.OrderingFilter',
     ),
+    'DEFAULT_PAGINATION_CLASS': 'projects.pagination.KeysetPagination',
 }
+
+# Seconds to share a user's {project_id: role} map between requests (0 = per request only).
+# Needs a cache shared by all workers (not locmem) when running more than one process.
+PROJECT_ROLE_CACHE_TIMEOUT = int(os.getenv('PROJECT_ROLE_CACHE_TIMEOUT', '0'))
+# Same for each project's list of assignable users (its members); membership changes drop it.
+PROJECT_CANDIDATE_CACHE_TIMEOUT = int(os.getenv('PROJECT_CANDIDATE_CACHE_TIMEOUT', '0'))
+
+# Seconds a rendered board column stays cached; any task/project change invalidates it sooner.
+BOARD_CACHE_TIMEOUT = int(os.getenv('BOARD_CACHE_TIMEOUT', '3600'))
+# Tasks rendered per board column before the "load more" link.
+BOARD_COLUMN_LIMIT = int(os.getenv('BOARD_COLUMN_LIMIT', '50'))
+
+# /api/sync/: change-log entries per response, and how old an entry must be before the
+# returned cursor moves past it (longer than any write transaction; see projects.sync).
+SYNC_PAGE_SIZE = int(os.getenv('SYNC_PAGE_SIZE', '1000'))
+SYNC_SETTLE_SECONDS = int(os.getenv('SYNC_SETTLE_SECONDS', '10'))
+
+# Deleted projects are hidden at once and their rows purged later in batches of this many (see projects.purge),
+# by `manage.py purge_projects` or, with PROJECT_PURGE_IN_PROCESS=1, a background thread of the web process.
+PROJECT_PURGE_BATCH_SIZE = int(os.getenv('PROJECT_PURGE_BATCH_SIZE', '1000'))
+PROJECT_PURGE_IN_PROCESS = os.getenv('PROJECT_PURGE_IN_PROCESS', '0') == '1'
+
+# Admin changelists on Postgres show the planner's row estimate above this many rows instead of COUNT(*).
+ESTIMATED_COUNT_THRESHOLD = int(os.getenv('ESTIMATED_COUNT_THRESHOLD', '10000'))
+
+# Live board events: 'projects.realtime.InProcessBroker' (single process) or
+# 'projects.realtime.RedisBroker' (several workers/nodes, uses REALTIME_REDIS_URL).
+REALTIME_BROKER = os.getenv('REALTIME_BROKER', 'projects.realtime.InProcessBroker')
+REALTIME_REDIS_URL = os.getenv('REALTIME_REDIS_URL', os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+
+# Per-request SQL/template/serializer timings: Server-Timing headers, a JSON log line per
+# request on the 'projects.metrics' logger and Prometheus histograms on /metrics/.
+REQUEST_METRICS = os.getenv('REQUEST_METRICS', '0') == '1'
+METRICS_ALLOWED_IPS = os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1').split(',')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {'console': {'class': 'logging.StreamHandler'}},
+    'loggers': {'projects.metrics': {'handlers': ['console'], 'level': os.getenv('METRICS_LOG_LEVEL', 'INFO'), 'propagate': False}},
+}
+
+# Tests fail when a template runs a query (see projects.testing).
+TEST_RUNNER = 'projects.testing.TemplateQueryGuardRunner'
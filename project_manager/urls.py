@@ -1,5 +1,6 @@
 from django.contrib import admin
 from django.urls import path, include
+from projects.instrumentation import metrics_view
 from projects.views import SignUpView
 
 urlpatterns = [
@@ -7,5 +8,7 @@ urlpatterns = [
     path('accounts/', include('django.contrib.auth.urls')),
     path('accounts/signup/', SignUpView.as_view(), name='signup'),
     path('api/', include('projects.api_urls')),
+    path('metrics/', metrics_view, name='metrics'),
+    path('async/', include(('projects.async_urls', 'async'), namespace='async')),
     path('', include(('projects.urls', 'projects'), namespace='projects')),
 ]
@@ -0,0 +1,152 @@
+"""Append-only activity log: who created, changed or deleted which project, task or membership.
+
+Model signals (see ``projects.signals``) turn every save, delete and bulk
+change into ``Activity`` entries carrying ``{field: [old, new]}`` for the fields
+that changed, diffed against the values the rows were loaded with, so recording
+costs no query. Entries are only kept once their transaction commits (those of
+a rolled back one are dropped with it) and then wait in memory:
+``ActivityMiddleware`` writes everything a request produced with one
+``bulk_create`` when its response is ready (SQLite caps the parameters per
+statement, so Django splits very large requests there). Outside requests (commands, the
+importer, the purge thread) each transaction's entries are written as it commits.
+
+The table only grows; ``manage.py prune_activity --days N`` deletes the oldest
+entries in batches.
+"""
+import logging
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.db import transaction
+
+from .models import Activity, ChangeLog, Project, ProjectMembership, Task
+
+logger = logging.getLogger(__name__)
+
+KINDS = {Project: ChangeLog.Kind.PROJECT, Task: ChangeLog.Kind.TASK, ProjectMembership: ChangeLog.Kind.MEMBERSHIP}
+
+# Bookkeeping columns that change on every save without telling anything about what the user did.
+UNTRACKED = {'id', 'created_at', 'updated_at', 'added_at', 'deleted_at'}
+TRACKED = {model: [f.attname for f in model._meta.concrete_fields if f.attname not in UNTRACKED] for model in KINDS}
+
+_request = ContextVar('activity_request', default=None)
+_buffer = ContextVar('activity_buffer', default=None)
+
+
+def _actor_id():
+    user = getattr(_request.get(), 'user', None)
+    return user.pk if user is not None and user.is_authenticated else None
+
+
+def _changes(instance, action, old):
+    if action == Activity.Action.UPDATED:
+        return {f: [old[f], getattr(instance, f)] for f in TRACKED[type(instance)]
+                if f in old and old[f] != getattr(instance, f)}
+    values = ((f, getattr(instance, f)) for f in TRACKED[type(instance)])
+    return {f: [None, v] if action == Activity.Action.CREATED else [v, None] for f, v in values if v not in (None, '')}
+
+
+def record(instances, action=Activity.Action.UPDATED, previous=None):
+    """Log ``instances``; updates are diffed against ``previous`` ({pk: {attname: old}}) and skipped if nothing changed."""
+    entries = []
+    for instance in instances:
+        changes = _changes(instance, action, (previous or {}).get(instance.pk, {}))
+        if not changes and action == Activity.Action.UPDATED:
+            continue
+        kind = KINDS[type(instance)]
+        entries.append(Activity(
+            kind=kind, action=action, object_id=instance.pk, changes=changes,
+            project_id=instance.pk if kind == ChangeLog.Kind.PROJECT else instance.project_id,
+        ))
+    if entries:
+        actor_id = _actor_id()
+        for entry in entries:
+            entry.actor_id = actor_id
+        transaction.on_commit(lambda: _deliver(entries))
+
+
+def _deliver(entries):
+    buffer = _buffer.get()
+    if buffer is not None:
+        buffer.extend(entries)
+    else:
+        Activity.objects.bulk_create(entries)
+
+
+def flush():
+    """Write the entries buffered for the current request."""
+    buffer = _buffer.get()
+    if buffer:
+        entries = buffer[:]
+        buffer.clear()
+        Activity.objects.bulk_create(entries)
+
+
+def _flush(request):
+    try:
+        flush()
+    except Exception:
+        # The changes themselves are committed; losing their log must not turn the response into an error.
+        logger.exception('Could not write the activity log of %s %s.', request.method, request.path)
+
+
+class ActivityMiddleware:
+    """Buffers the request's activity and writes it with one INSERT; put it after ``AuthenticationMiddleware``.
+
+    Async capable, so async views and event streams stay on the event loop; a
+    thread is only borrowed to write when the request logged something.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        request_token, buffer_token = _request.set(request), _buffer.set([])
+        try:
+            return self.get_response(request)
+        finally:
+            _flush(request)
+            _request.reset(request_token)
+            _buffer.reset(buffer_token)
+
+    async def __acall__(self, request):
+        request_token, buffer_token = _request.set(request), _buffer.set([])
+        try:
+            return await self.get_response(request)
+        finally:
+            if _buffer.get():
+                await sync_to_async(_flush)(request)
+            _request.reset(request_token)
+            _buffer.reset(buffer_token)
+
+
+def for_object(instance):
+    """History of one project, task or membership, newest first."""
+    return Activity.objects.filter(kind=KINDS[type(instance)], object_id=instance.pk).order_by('-id')
+
+
+def for_project(project_id):
+    """Everything that happened in a project, newest first."""
+    return Activity.objects.filter(project_id=project_id).order_by('-id')
+
+
+def prune(before, batch_size=10000):
+    """Delete entries older than ``before``, oldest first, ``batch_size`` rows per DELETE; returns how many went."""
+    # Ids grow with time, so the first entry to keep bounds the ones to delete without an index on created_at.
+    first_kept = Activity.objects.filter(created_at__gte=before).order_by('id').values_list('id', flat=True).first()
+    queryset = Activity.objects.filter(created_at__lt=before)
+    if first_kept is not None:
+        queryset = queryset.filter(id__lt=first_kept)
+    deleted = 0
+    while True:
+        ids = list(queryset.order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += Activity.objects.filter(id__in=ids).delete()[0]
@@ -1,29 +1,172 @@
-from django.contrib import admin
-from .models import Project, Task, ProjectMembership
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.contrib.auth import get_user_model
+from django.db.models import Exists, OuterRef
+from django.urls import reverse
+from . import search
+from .bulk import update_tasks
+from .models import Activity, Project, ProjectPurge, ProjectStats, Task, ProjectMembership
+from .pagination import EstimatedCountPaginator
+from .purge import soft_delete
 
-class TaskInline(admin.TabularInline):
-    model = Task
+User = get_user_model()
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelists whose query count does not grow with the table: no full-table COUNT(*), estimated page counts."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+class FullTextSearchMixin:
+    """Admin search through ``projects.search`` (prefix match on every word) instead of ``icontains`` joins."""
+
+    def get_search_results(self, request, queryset, search_term):
+        tokens = search.tokenize(search_term)
+        if not tokens:
+            return queryset, False
+        return search.get_backend(queryset.db).filter(queryset, tokens), False
+
+class _FirstPageFormSet(forms.BaseInlineFormSet):
+    per_page = 20
+
+    def get_queryset(self):
+        if not hasattr(self, '_first_page'):
+            self._first_page = list(super().get_queryset()[:self.per_page])
+        return self._first_page
+
+class LinkedInline(admin.TabularInline):
+    """Read-only first page of a project's rows with a link to the full, filtered changelist."""
+    template = 'admin/projects/linked_inline.html'
+    formset = _FirstPageFormSet
+    per_page = 20
     extra = 0
+    can_delete = False
+    show_change_link = True
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def get_readonly_fields(self, request, obj=None):
+        return self.fields
+
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super().get_formset(request, obj, **kwargs)
+        formset.per_page = self.per_page
+        opts = self.model._meta
+        formset.changelist_url = obj and '%s?project__id__exact=%s' % (
+            reverse(f'admin:{opts.app_label}_{opts.model_name}_changelist'), obj.pk)
+        return formset
+
+class TaskInline(LinkedInline):
+    model = Task
+    fields = ('title', 'status', 'priority', 'assignee', 'due_date')
+    ordering = ('status', 'order', 'id')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('assignee')
 
-class MembershipInline(admin.TabularInline):
+class MembershipInline(LinkedInline):
     model = ProjectMembership
-    extra = 0
+    fields = ('user', 'role', 'added_at')
+    ordering = ('-role', 'id')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user')
 
 @admin.register(Project)
-class ProjectAdmin(admin.ModelAdmin):
+class ProjectAdmin(FullTextSearchMixin, LargeTableAdmin):
     list_display = ('name', 'owner', 'status', 'start_date', 'end_date', 'updated_at')
     list_filter = ('status', 'created_at')
-    search_fields = ('name', 'description', 'owner__username')
+    list_select_related = ('owner',)
+    search_fields = ('name', 'description')
+    autocomplete_fields = ('owner',)
     inlines = [MembershipInline, TaskInline]
 
+    # Deleting soft-deletes (projects.purge) and the confirmation page does not walk every related row.
+    def get_deleted_objects(self, objs, request):
+        return [str(obj) for obj in objs], {self.opts.verbose_name_plural: len(objs)}, set(), []
+
+    def delete_model(self, request, obj):
+        soft_delete(obj)
+
+    def delete_queryset(self, request, queryset):
+        for project in queryset:
+            soft_delete(project)
+
+class TaskActionForm(ActionForm):
+    assignee = forms.CharField(required=False, label='Username',
+                               help_text='For "Assign to user"; leave empty to unassign.')
+
+def _status_action(status):
+    def action(modeladmin, request, queryset):
+        count = update_tasks(queryset.exclude(status=status), status=status)
+        modeladmin.message_user(request, f'Moved {count} task(s) to {status.label}.', messages.SUCCESS)
+    action.__name__ = f'mark_{status.value.lower()}'
+    return admin.action(description=f'Move selected tasks to {status.label}')(action)
+
 @admin.register(Task)
-class TaskAdmin(admin.ModelAdmin):
+class TaskAdmin(FullTextSearchMixin, LargeTableAdmin):
     list_display = ('title', 'project', 'status', 'priority', 'assignee', 'due_date', 'order', 'updated_at')
     list_filter = ('status', 'priority', 'due_date')
-    search_fields = ('title', 'description', 'assignee__username', 'project__name')
+    list_select_related = ('project', 'assignee')
+    search_fields = ('title', 'description')
+    autocomplete_fields = ('project', 'assignee')
+    ordering = ('-id',)
+    action_form = TaskActionForm
+    actions = [_status_action(status) for status in Task.Status] + ['assign']
+
+    @admin.action(description='Assign selected tasks to user (members of their project only)')
+    def assign(self, request, queryset):
+        username = request.POST.get('assignee', '').strip()
+        user = None
+        if username:
+            user = User.objects.filter(username=username).first()
+            if user is None:
+                self.message_user(request, f'No user named {username!r}.', messages.ERROR)
+                return
+            queryset = queryset.filter(Exists(ProjectMembership.objects.filter(project=OuterRef('project_id'), user=user)))
+        count = update_tasks(queryset.exclude(assignee=user), assignee=user)
+        self.message_user(request, f'Updated {count} task(s).', messages.SUCCESS)
 
 @admin.register(ProjectMembership)
-class ProjectMembershipAdmin(admin.ModelAdmin):
+class ProjectMembershipAdmin(LargeTableAdmin):
     list_display = ('project', 'user', 'role', 'added_at')
-    search_fields = ('project__name', 'user__username')
+    list_select_related = ('project', 'user')
+    search_fields = ('=user__username',)
+    autocomplete_fields = ('project', 'user')
     list_filter = ('role',)
+
+@admin.register(ProjectPurge)
+class ProjectPurgeAdmin(admin.ModelAdmin):
+    list_display = ('project_id', 'deleted_at', 'started_at', 'updated_at', 'finished_at', 'tasks_deleted', 'memberships_deleted')
+    readonly_fields = [f.name for f in ProjectPurge._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+@admin.register(ProjectStats)
+class ProjectStatsAdmin(LargeTableAdmin):
+    list_display = ('project', 'todo', 'in_progress', 'blocked', 'done', 'overdue', 'last_activity_at')
+    list_select_related = ('project',)
+    readonly_fields = [f.name for f in ProjectStats._meta.fields]
+
+@admin.register(Activity)
+class ActivityAdmin(LargeTableAdmin):
+    list_display = ('created_at', 'kind', 'object_id', 'action', 'project_id', 'actor_id')
+    list_filter = ('kind', 'action')
+    ordering = ('-id',)
+    readonly_fields = [f.name for f in Activity._meta.fields]
+
+    # Append-only: entries go through projects.activity and leave through prune_activity.
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
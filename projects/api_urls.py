@@ -1,11 +1,12 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .api_views import ProjectViewSet, TaskViewSet
+from .api_views import ProjectViewSet, SyncView, TaskViewSet
 
 router = DefaultRouter()
 router.register('projects', ProjectViewSet, basename='api-projects')
 router.register('tasks', TaskViewSet, basename='api-tasks')
 
 urlpatterns = [
+    path('sync/', SyncView.as_view(), name='api-sync'),
     path('', include(router.urls)),
 ]
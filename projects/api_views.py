@@ -1,16 +1,25 @@
-from rest_framework import viewsets, permissions
+from rest_framework import viewsets, permissions, serializers
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Max
+from rest_framework.views import APIView
+from django.core.exceptions import ValidationError as DjangoValidationError
+from . import activity, sync
+from .bulk import BulkTaskRequest
+from .conditional import ConditionalViewSetMixin, TaskConcurrencyMixin, finish, task_etag
+from .membership import MembershipResolver
 from .models import Project, Task, ProjectMembership
-from .serializers import ProjectSerializer, TaskSerializer, ProjectMembershipSerializer
+from .ordering import move_task
+from .pagination import KeysetPagination
+from .purge import soft_delete
+from .stats import refresh_overdue
+from .serializers import ActivitySerializer, ProjectSerializer, TaskSerializer, ProjectMembershipSerializer
 
 class IsProjectMember(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         if isinstance(obj, Project):
-            return ProjectMembership.objects.filter(project=obj, user=request.user).exists()
+            return MembershipResolver.for_request(request).is_member(obj.pk)
         if isinstance(obj, Task):
-            return ProjectMembership.objects.filter(project=obj.project, user=request.user).exists()
+            return MembershipResolver.for_request(request).is_member(obj.project_id)
         return False
 
     def has_permission(self, request, view):
@@ -18,19 +27,60 @@ class IsProjectMember(permissions.BasePermission):
 
 class IsProjectOwner(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
-        project = obj if isinstance(obj, Project) else obj.project
-        return ProjectMembership.objects.filter(project=project, user=request.user, role=ProjectMembership.Role.OWNER).exists()
+        project_id = obj.pk if isinstance(obj, Project) else obj.project_id
+        return MembershipResolver.for_request(request).is_owner(project_id)
 
-class ProjectViewSet(viewsets.ModelViewSet):
+class EagerLoadingViewSetMixin:
+    """Apply the serializer's declared select/prefetch plan to every queryset the viewset serializes."""
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        serializer_class = self.get_serializer_class()
+        if hasattr(serializer_class, 'setup_eager_loading'):
+            queryset = serializer_class.setup_eager_loading(queryset)
+        return queryset
+
+def activity_page(request, queryset):
+    """Activity entries newest first, keyset-paginated by id whatever the view's own ordering."""
+    paginator = KeysetPagination()
+    page = paginator.paginate_queryset(queryset, request)
+    return paginator.get_paginated_response(ActivitySerializer(page, many=True).data)
+
+class ProjectViewSet(ConditionalViewSetMixin, EagerLoadingViewSetMixin, viewsets.ModelViewSet):
     serializer_class = ProjectSerializer
+    ordering_fields = ['name', 'status', 'created_at', 'updated_at']
+    keyset_ordering = ('-updated_at', '-id')
 
     def get_queryset(self):
-        return Project.objects.filter(memberships__user=self.request.user).distinct()
+        return Project.objects.visible_to(self.request.user)
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if page is not None:
+            refresh_overdue(page)
+        return page
+
+    def get_object(self):
+        project = super().get_object()
+        refresh_overdue([project])
+        return project
+
+    def etag_project_ids(self, request):
+        project_ids = super().etag_project_ids(request)
+        if self.action == 'retrieve':
+            pk = self.kwargs.get('pk')
+            return {int(pk)} if pk.isdigit() and int(pk) in project_ids else None
+        return project_ids
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(request, super().retrieve, *args, **kwargs)
 
     def perform_create(self, serializer):
         project = serializer.save(owner=self.request.user)
         ProjectMembership.objects.get_or_create(project=project, user=self.request.user, role=ProjectMembership.Role.OWNER)
 
+    def perform_destroy(self, instance):
+        soft_delete(instance)
+
     def get_permissions(self):
         if self.action in ['update', 'partial_update', 'destroy']:
             return [permissions.IsAuthenticated(), IsProjectOwner()]
@@ -51,14 +101,20 @@ class ProjectViewSet(viewsets.ModelViewSet):
         ProjectMembership.objects.filter(project=project, user_id=user_id).exclude(user_id=project.owner_id).delete()
         return Response({'status': 'removed'})
 
-class TaskViewSet(viewsets.ModelViewSet):
+    @action(detail=True)
+    def activity(self, request, pk=None):
+        """What happened in the project: its own changes and those of its tasks and memberships."""
+        return activity_page(request, activity.for_project(self.get_object().pk))
+
+class TaskViewSet(TaskConcurrencyMixin, EagerLoadingViewSetMixin, viewsets.ModelViewSet):
     serializer_class = TaskSerializer
     filterset_fields = ['project', 'status', 'priority', 'assignee']
     search_fields = ['title', 'description']
     ordering_fields = ['due_date', 'updated_at', 'order']
+    keyset_ordering = ('status', 'order', 'id')
 
     def get_queryset(self):
-        return Task.objects.filter(project__memberships__user=self.request.user).distinct()
+        return Task.objects.visible_to(self.request.user)
 
     def get_permissions(self):
         return [permissions.IsAuthenticated(), IsProjectMember()]
@@ -66,10 +122,62 @@ class TaskViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def move(self, request, pk=None):
         task = self.get_object()
-        status = request.data.get('status')
-        if status and status in Task.Status.values:
-            task.status = status
-            max_order = Task.objects.filter(project=task.project, status=status).aggregate(Max('order'))['order__max'] or 0
-            task.order = max_order + 1
-            task.save(update_fields=['status', 'order', 'updated_at'])
-        return Response(TaskSerializer(task).data)
+        try:
+            move_task(task, request.data.get('status'),
+                      before_id=request.data.get('before_id'), after_id=request.data.get('after_id'))
+        except DjangoValidationError as exc:
+            raise serializers.ValidationError(exc.message_dict)
+        return finish(Response(TaskSerializer(task).data), task_etag(task))
+
+    @action(detail=True)
+    def history(self, request, pk=None):
+        return activity_page(request, activity.for_object(self.get_object()))
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Create, update, move and delete many tasks at once; errors are reported per item.
+
+        With ``?atomic=1`` nothing is written if any item is invalid.
+        """
+        operation = BulkTaskRequest(request, request.data)
+        try:
+            operation.validate()
+        except DjangoValidationError as exc:
+            raise serializers.ValidationError({'detail': exc.messages})
+        atomic = request.query_params.get('atomic') in ('1', 'true')
+        if operation.errors and atomic:
+            return Response({'errors': operation.errors}, status=400)
+        result = operation.apply(atomic=atomic)
+        if result is None:
+            return Response({'errors': operation.errors}, status=400)
+        result['errors'] = operation.errors
+        return Response(result)
+
+class SyncView(APIView):
+    """Changes since ``?since=<cursor>`` for clients that mirror their projects locally.
+
+    Without ``since`` only the current cursor is returned: take it, fetch the
+    lists in full, then keep calling with the cursor from each response.
+    ``410 Gone`` means the cursor is older than the retained change log.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        since = request.query_params.get('since')
+        if since in (None, ''):
+            return Response({'cursor': sync.head(), 'has_more': False})
+        if not since.isdigit():
+            raise serializers.ValidationError({'since': 'Must be a cursor returned by this endpoint.'})
+        try:
+            changes = sync.changes_since(request.user, int(since))
+        except sync.CursorExpired:
+            return Response({'detail': 'Cursor expired; fetch everything again.'}, status=410)
+        context = {'request': request}
+        return Response({
+            'cursor': changes['cursor'],
+            'has_more': changes['has_more'],
+            'projects': ProjectSerializer(changes['projects'], many=True, context=context).data,
+            'tasks': TaskSerializer(changes['tasks'], many=True, context=context).data,
+            'memberships': ProjectMembershipSerializer(changes['memberships'], many=True, context=context).data,
+            'deleted': changes['deleted'],
+        })
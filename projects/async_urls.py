@@ -0,0 +1,9 @@
+from django.urls import path
+from . import async_views
+
+urlpatterns = [
+    path('', async_views.AsyncProjectListView.as_view(), name='project_list'),
+    path('<int:pk>/board/', async_views.AsyncBoardView.as_view(), name='board'),
+    path('api/tasks/', async_views.AsyncTaskListView.as_view(), name='api-tasks-list'),
+    path('api/tasks/<int:pk>/', async_views.AsyncTaskDetailView.as_view(), name='api-tasks-detail'),
+]
@@ -0,0 +1,149 @@
+"""Async versions of the read-heavy pages and API endpoints, mounted under ``/async/``.
+
+They answer the same requests as their counterparts in ``views`` and
+``api_views`` with Django's async ORM (``aget``, ``aexists``, ``async for``)
+and async cache calls, so under the ASGI server a request waiting on the
+database or a slow client holds a coroutine rather than a worker thread.
+Rendering and serialization run inline: querysets are fully loaded first, so
+templates and serializers never touch the database from the event loop.
+The task list reuses ``TaskViewSet``'s filters, pagination and ETag rather
+than keeping its own copy of them.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.contrib.auth.views import redirect_to_login
+from django.core.exceptions import PermissionDenied
+from django.db.models import OuterRef, Subquery
+from django.http import Http404, JsonResponse
+from django.middleware.csrf import get_token
+from django.shortcuts import render
+from django.utils.cache import get_conditional_response
+from django.views import View
+from rest_framework.exceptions import APIException
+
+from .api_views import TaskViewSet
+from .board import aboard_columns, aboard_version
+from .conditional import finish, make_etag, task_etag
+from .models import Project, ProjectMembership, Task
+from .pagination import InvalidCursor, KeysetPaginator, default_keyset_ordering
+from .search import search
+from .serializers import TaskSerializer
+from .stats import refresh_overdue
+from .views import BoardView, ProjectListView
+
+
+async def _auser(request):
+    user = await request.auser()
+    request.user = user  # so templates and context processors do not load it again synchronously
+    return user
+
+
+def _api_error(status, detail):
+    return JsonResponse(detail if isinstance(detail, dict) else {'detail': detail}, status=status)
+
+
+def _list_view(viewset, request):
+    """``viewset`` set up for the list action on ``request``, to reuse its filters, pagination and ETag outside DRF's dispatch."""
+    view = viewset(action='list', action_map={'get': 'list'}, format_kwarg=None, args=(), kwargs={})
+    view.request = view.initialize_request(request)
+    return view
+
+
+class AsyncProjectListView(View):
+    paginate_by = ProjectListView.paginate_by
+    keyset_ordering = ProjectListView.keyset_ordering
+
+    async def get(self, request):
+        user = await _auser(request)
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        queryset = Project.objects.visible_to(user)
+        q = request.GET.get('q')
+        if q:
+            queryset = await sync_to_async(search)(user, q, queryset=queryset, ranked=True)
+        status = request.GET.get('status')
+        if status:
+            queryset = queryset.filter(status=status)
+        paginator = KeysetPaginator(queryset.select_related('stats'), default_keyset_ordering(queryset, self.keyset_ordering),
+                                    self.paginate_by)
+        try:
+            page = await paginator.apage(request.GET.get('cursor'))
+        except InvalidCursor:
+            raise Http404('Invalid cursor.')
+        await sync_to_async(refresh_overdue)(page.object_list)
+        params = request.GET.copy()
+        params.pop('cursor', None)
+        return render(request, ProjectListView.template_name, {
+            'projects': page.object_list,
+            'object_list': page.object_list,
+            'page_obj': page,
+            'is_paginated': page.has_other_pages(),
+            'page_query': params.urlencode(),
+            'status_choices': Project.Status.choices,
+        })
+
+
+class AsyncBoardView(View):
+    async def get(self, request, pk):
+        user = await _auser(request)
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        role = ProjectMembership.objects.filter(project=OuterRef('pk'), user=user.pk).values('role')[:1]
+        try:
+            project = await Project.objects.annotate(_access_role=Subquery(role)).aget(pk=pk)
+        except Project.DoesNotExist:
+            raise Http404('No project found.')
+        if project._access_role is None:
+            raise PermissionDenied
+        get_token(request)
+        etag = None if len(messages.get_messages(request)) else make_etag(
+            'board', user.pk, request.META['CSRF_COOKIE'], await aboard_version(project.pk))
+        response = get_conditional_response(request, etag=etag) if etag else None
+        if response is None:
+            columns = await aboard_columns(request, project)
+            response = render(request, BoardView.template_name, {'project': project, 'columns': columns})
+        return finish(response, etag)
+
+
+class AsyncTaskListView(View):
+    """``/api/tasks/`` with ``TaskViewSet``'s own filters, search, ordering and ETag; the page is fetched asynchronously."""
+
+    async def get(self, request):
+        user = await _auser(request)
+        if not user.is_authenticated:
+            return _api_error(403, 'Authentication credentials were not provided.')
+        view = _list_view(TaskViewSet, request)
+        try:
+            etag, response, queryset = await sync_to_async(self.prepare)(request, view)
+            if response is None:
+                page = await view.paginator.apaginate_queryset(queryset, view.request, view)
+                data = view.get_serializer(page, many=True).data
+                response = JsonResponse(view.paginator.get_paginated_data(data))
+        except APIException as exc:
+            return _api_error(exc.status_code, exc.detail)
+        return finish(response, etag)
+
+    @staticmethod
+    def prepare(request, view):
+        """The ETag and either a 304 or the filtered queryset (both may query: the membership map, filter choices)."""
+        etag = view.collection_etag(view.request)
+        response = get_conditional_response(request, etag=etag) if etag else None
+        if response is not None:
+            return etag, response, None
+        return etag, None, view.filter_queryset(view.get_queryset())
+
+
+class AsyncTaskDetailView(View):
+    async def get(self, request, pk):
+        user = await _auser(request)
+        if not user.is_authenticated:
+            return _api_error(403, 'Authentication credentials were not provided.')
+        try:
+            task = await TaskSerializer.setup_eager_loading(Task.objects.visible_to(user)).aget(pk=pk)
+        except Task.DoesNotExist:
+            return _api_error(404, 'No Task matches the given query.')
+        etag = task_etag(task)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = JsonResponse(TaskSerializer(task, context={'request': request}).data)
+        return finish(response, etag)
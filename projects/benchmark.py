@@ -0,0 +1,262 @@
+"""Synthetic data and a latency / query-budget benchmark for every page and API endpoint.
+
+``generate`` fills the database with ``users`` users, ``projects`` projects of
+``tasks_per_project`` tasks and ``fanout`` members each; the first user is a
+member of every project, so list pages see the whole dataset. ``run`` requests
+each entry of ``ENDPOINTS`` as that user and reports latency percentiles,
+requests per second and the number of queries against the endpoint's budget.
+Budgets do not depend on the data size: an endpoint whose query count grows
+with its rows has an N+1 and fails them. ``manage.py benchmark`` runs it on a
+throwaway database and writes the results as JSON; ``--asgi`` sends the requests
+through the ASGI handler, to compare the ``async_*`` endpoints with their sync
+counterparts under the server they are meant for.
+
+The live board stream (``board_events``) never ends and is not benchmarked.
+Writes that cannot simply be repeated (``ROLLED_BACK``) run each request in a
+transaction that is rolled back, so work deferred to the commit (board
+version bumps, activity entries) is not part of their numbers.
+"""
+import random
+import statistics
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.test import AsyncClient, Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Project, ProjectMembership, Task
+from .ordering import ORDER_GAP
+from .pagination import KeysetPaginator
+from .signals import rows_bulk_created, tasks_bulk_changed
+from .views import ProjectDetailView, ProjectMembersView
+
+User = get_user_model()
+
+PASSWORD = 'bench12345'
+
+# (name, method, url name, url kwargs, request data, query budget); ``{key}`` in kwargs and data is filled from the
+# context, a lone ``{key}`` with the value itself. API writes are sent as JSON.
+ENDPOINTS = [
+    ('project_list', 'get', 'projects:project_list', {}, None, 4),
+    ('project_search', 'get', 'projects:project_list', {}, {'q': 'project'}, 4),
+    ('project_create', 'get', 'projects:project_create', {}, None, 3),
+    ('project_detail', 'get', 'projects:project_detail', {'pk': '{project}'}, None, 5),
+    ('project_edit', 'get', 'projects:project_edit', {'pk': '{project}'}, None, 4),
+    ('project_delete', 'get', 'projects:project_delete', {'pk': '{project}'}, None, 4),
+    ('project_members', 'get', 'projects:project_members', {'pk': '{project}'}, None, 5),
+    ('project_members_more', 'get', 'projects:project_members_more', {'pk': '{project}'}, {'cursor': '{members_cursor}'}, 4),
+    ('project_tasks_more', 'get', 'projects:project_tasks_more', {'pk': '{project}'}, {'cursor': '{tasks_cursor}'}, 4),
+    ('project_users', 'get', 'projects:project_users', {'pk': '{project}'}, {'q': 'bench'}, 4),
+    ('project_users_invite', 'get', 'projects:project_users', {'pk': '{project}'}, {'q': 'bench', 'invite': '1'}, 4),
+    ('board', 'get', 'projects:board', {'pk': '{project}'}, None, 4),
+    ('board_column', 'get', 'projects:board_column', {'pk': '{project}', 'status': 'TODO'}, None, 5),
+    ('task_create', 'get', 'projects:task_create', {'project_pk': '{project}'}, None, 5),
+    ('task_detail', 'get', 'projects:task_detail', {'pk': '{task}'}, None, 4),
+    ('task_edit', 'get', 'projects:task_edit', {'pk': '{task}'}, None, 5),
+    ('task_delete', 'get', 'projects:task_delete', {'pk': '{task}'}, None, 4),
+    ('export_tasks', 'get', 'projects:export', {'kind': 'tasks'}, {'project': '{project}'}, 4),
+    ('export_projects', 'get', 'projects:export', {'kind': 'projects'}, None, 4),
+    ('api_projects', 'get', 'api-projects-list', {}, None, 6),
+    ('api_project', 'get', 'api-projects-detail', {'pk': '{project}'}, None, 6),
+    ('api_project_activity', 'get', 'api-projects-activity', {'pk': '{project}'}, None, 6),
+    ('api_add_member', 'post', 'api-projects-add-member', {'pk': '{project}'},
+     {'project': '{project}', 'user_id': '{outsider}'}, 10),
+    ('api_remove_member', 'post', 'api-projects-remove-member', {'pk': '{project}'}, {'user_id': '{member}'}, 8),
+    ('api_tasks', 'get', 'api-tasks-list', {}, None, 5),
+    ('api_tasks_by_project', 'get', 'api-tasks-list', {}, {'project': '{project}'}, 6),
+    ('api_task', 'get', 'api-tasks-detail', {'pk': '{task}'}, None, 6),
+    ('api_task_move', 'post', 'api-tasks-move', {'pk': '{task}'}, {'status': '{status}'}, 15),
+    ('api_task_history', 'get', 'api-tasks-history', {'pk': '{task}'}, None, 5),
+    ('api_tasks_bulk', 'post', 'api-tasks-bulk', {}, {
+        'create': [{'project': '{project}', 'title': 'Benchmark bulk task'}],
+        'update': [{'id': '{task}', 'priority': 3}],
+        'move': [{'id': '{task}', 'status': '{status}'}],
+        'delete': ['{last_task}'],
+    }, 15),
+    ('api_sync_head', 'get', 'api-sync', {}, None, 4),
+    ('api_sync', 'get', 'api-sync', {}, {'since': '0'}, 10),
+    ('async_project_list', 'get', 'async:project_list', {}, None, 4),
+    ('async_board', 'get', 'async:board', {'pk': '{project}'}, None, 3),
+    ('async_api_tasks', 'get', 'async:api-tasks-list', {}, None, 4),
+    ('async_api_tasks_by_project', 'get', 'async:api-tasks-list', {}, {'project': '{project}'}, 5),
+    ('async_api_task', 'get', 'async:api-tasks-detail', {'pk': '{task}'}, None, 3),
+]
+
+ROLLED_BACK = {'api_add_member', 'api_remove_member', 'api_tasks_bulk'}
+
+
+def generate(users=50, projects=100, tasks_per_project=50, fanout=5, seed=0, batch_size=2000):
+    """Create the dataset and return the benchmark context (user and sample object ids)."""
+    rng = random.Random(seed)
+    fanout = max(1, min(fanout, users))
+    password = make_password(PASSWORD)
+    prefix = f'bench_{uuid.uuid4().hex[:8]}_'
+    today = timezone.localdate()
+    with transaction.atomic():
+        people = User.objects.bulk_create(
+            [User(username=f'{prefix}{i}', password=password) for i in range(users)], batch_size=batch_size,
+        )
+        if people[0].pk is None:  # backends without RETURNING
+            people = list(User.objects.filter(username__startswith=prefix).order_by('pk'))
+        rows = Project.objects.bulk_create([
+            Project(owner=people[i % users], name=f'Project {i}', description=f'Benchmark project {i}',
+                    status=rng.choice(Project.Status.values))
+            for i in range(projects)
+        ], batch_size=batch_size)
+        memberships = []
+        for project in rows:
+            members = {project.owner_id, people[0].pk}
+            members.update(person.pk for person in rng.sample(people, fanout - 1))
+            memberships += [
+                ProjectMembership(project=project, user_id=user_id, role=ProjectMembership.Role.OWNER
+                                  if user_id == project.owner_id else ProjectMembership.Role.MEMBER)
+                for user_id in members
+            ]
+        rows_bulk_created.send(sender=Project, objs=rows)
+        memberships = ProjectMembership.objects.bulk_create(memberships, batch_size=batch_size)
+        rows_bulk_created.send(sender=ProjectMembership, objs=memberships)
+
+        member_ids = {}
+        for membership in memberships:
+            member_ids.setdefault(membership.project_id, []).append(membership.user_id)
+        order = {}
+        tasks = []
+        for project in rows:
+            for i in range(tasks_per_project):
+                status = rng.choice(Task.Status.values)
+                order[project.pk, status] = order.get((project.pk, status), 0) + ORDER_GAP
+                tasks.append(Task(
+                    project=project, title=f'Task {i} of project {project.pk}', description='Benchmark task',
+                    status=status, priority=rng.choice(Task.Priority.values), order=order[project.pk, status],
+                    assignee_id=rng.choice(member_ids[project.pk] + [None]),
+                    due_date=today + timedelta(days=rng.randint(-30, 60)),
+                ))
+        for start in range(0, len(tasks), batch_size):
+            chunk = Task.objects.bulk_create(tasks[start:start + batch_size])
+            tasks_bulk_changed.send(sender=Task, created=chunk, updated=[], previous={})
+    sample = rows[0]
+    tasks = Task.objects.filter(project=sample).order_by('pk')
+    task, last_task = tasks.first(), tasks.last()
+    members = set(member_ids[sample.pk])
+    return {
+        'user': people[0],
+        'project': sample.pk,
+        'task': task.pk if task else None,
+        'last_task': last_task.pk if last_task else None,
+        'status': Task.Status.DONE,
+        'member': next((pk for pk in member_ids[sample.pk] if pk != sample.owner_id), None),
+        'outsider': next((person.pk for person in people if person.pk not in members), None),
+        # "load more" pages start after the first row
+        'tasks_cursor': _cursor_after_first(sample.tasks.all(), ProjectDetailView.task_ordering),
+        'members_cursor': _cursor_after_first(sample.memberships.all(), ProjectMembersView.member_ordering),
+    }
+
+
+def _cursor_after_first(queryset, ordering):
+    return KeysetPaginator(queryset, ordering, 1).page().next_cursor or ''
+
+
+def _fill(value, context):
+    if isinstance(value, dict):
+        return {key: _fill(item, context) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_fill(item, context) for item in value]
+    if isinstance(value, str) and value.startswith('{') and value.endswith('}') and value[1:-1] in context:
+        return context[value[1:-1]]
+    return value.format(**context) if isinstance(value, str) else value
+
+
+def _request(client, method, path, data):
+    headers = {'Accept': 'application/json' if '/api/' in path else '*/*'}
+    kwargs = {'content_type': 'application/json'} if method != 'get' and '/api/' in path else {}
+    if isinstance(client, AsyncClient):
+        return async_to_sync(_arequest)(client, method, path, data, headers, kwargs)
+    response = getattr(client, method)(path, data or {}, headers=headers, **kwargs)
+    if response.streaming:
+        b''.join(response.streaming_content)
+    return response
+
+
+async def _arequest(client, method, path, data, headers, kwargs):
+    response = await getattr(client, method)(path, data or {}, headers=headers, **kwargs)
+    if response.streaming:
+        if response.is_async:
+            [chunk async for chunk in response.streaming_content]
+        else:
+            await sync_to_async(b''.join)(response.streaming_content)
+    return response
+
+
+@contextmanager
+def _rolled_back():
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def measure(client, context, endpoint, repeat=10, warmup=1):
+    name, method, url_name, kwargs, data, budget = endpoint
+    path = reverse(url_name, kwargs={key: str(value).format(**context) for key, value in kwargs.items()})
+    data = _fill(data or {}, context)
+    rolled_back = name in ROLLED_BACK
+    for _ in range(warmup):
+        with _rolled_back() if rolled_back else nullcontext():
+            _request(client, method, path, data)
+    timings, queries, status = [], 0, None
+    for _ in range(repeat):
+        with _rolled_back() if rolled_back else nullcontext():
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = _request(client, method, path, data)
+                timings.append(time.perf_counter() - started)
+        queries = max(queries, len(captured.captured_queries))
+        status = response.status_code
+    total = sum(timings)
+    return {
+        'name': name,
+        'method': method.upper(),
+        'path': path,
+        'status': status,
+        'queries': queries,
+        'budget': budget,
+        'over_budget': queries > budget,
+        'p50_ms': round(statistics.median(timings) * 1000, 2),
+        'p95_ms': round(_percentile(timings, 0.95) * 1000, 2),
+        'max_ms': round(max(timings) * 1000, 2),
+        'rps': round(repeat / total, 1) if total else None,
+    }
+
+
+def run(context, endpoints=None, repeat=10, warmup=1, asgi=False):
+    """Benchmark ``endpoints`` (default: all) as ``context['user']``; one result dict per endpoint.
+
+    Requests go through the WSGI handler, or the ASGI handler with ``asgi=True``.
+    """
+    client = AsyncClient() if asgi else Client()
+    client.force_login(context['user'])
+    return [measure(client, context, endpoint, repeat, warmup) for endpoint in endpoints or ENDPOINTS]
+
+
+def compare(results, baseline):
+    """Per-endpoint ``(name, p50 ratio, query delta)`` of ``results`` against an earlier run."""
+    before = {result['name']: result for result in baseline}
+    rows = []
+    for result in results:
+        old = before.get(result['name'])
+        if old:
+            ratio = result['p50_ms'] / old['p50_ms'] if old['p50_ms'] else None
+            rows.append((result['name'], ratio, result['queries'] - old['queries']))
+    return rows
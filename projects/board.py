@@ -0,0 +1,169 @@
+"""Cached rendering of Kanban board columns.
+
+Each project has a version counter in the cache that model signals bump after
+every committed change to the project, its tasks or its memberships (it also
+backs the ETags in projects.conditional). Rendered column fragments
+are cached under that version, so a repeat board load is a couple of cache
+reads and never touches the task table or the column template.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+
+from .models import Task
+from .pagination import encode_cursor
+
+BOARD_COLUMNS = [
+    (Task.Status.TODO, 'To Do'),
+    (Task.Status.IN_PROGRESS, 'In Progress'),
+    (Task.Status.BLOCKED, 'Blocked'),
+    (Task.Status.DONE, 'Done'),
+]
+
+# Fragments are shared between users, so the per-user CSRF input is spliced in on the way out.
+CSRF_PLACEHOLDER = '<!--csrf-input-->'
+
+VERSION_KEY = 'projects:board-version:{project_id}'
+COLUMN_KEY = 'projects:board:{project_id}:{version}:{status}'
+
+
+def _timeout():
+    return getattr(settings, 'BOARD_CACHE_TIMEOUT', 3600)
+
+
+def board_version(project_id):
+    key = VERSION_KEY.format(project_id=project_id)
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so a lost counter never reuses an old version's fragments.
+        version = time.time_ns()
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+async def aboard_version(project_id):
+    key = VERSION_KEY.format(project_id=project_id)
+    version = await cache.aget(key)
+    if version is None:
+        version = time.time_ns()
+        if not await cache.aadd(key, version, None):
+            version = await cache.aget(key, version)
+    return version
+
+
+def board_versions(project_ids):
+    """``{project_id: version}`` with one cache round trip for the versions already set."""
+    keys = {project_id: VERSION_KEY.format(project_id=project_id) for project_id in project_ids}
+    found = cache.get_many(keys.values())
+    return {project_id: found[key] if key in found else board_version(project_id) for project_id, key in keys.items()}
+
+
+def bump_board_version(project_id):
+    key = VERSION_KEY.format(project_id=project_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+def csrf_input(request):
+    return format_html('<input type="hidden" name="csrfmiddlewaretoken" value="{}">', get_token(request))
+
+
+def board_column_limit():
+    return getattr(settings, 'BOARD_COLUMN_LIMIT', 50)
+
+
+def _slice_queryset(project, limit):
+    partition = {'partition_by': [F('status')]}
+    return project.tasks.annotate(
+        column_position=Window(RowNumber(), order_by=[F('order').asc(), F('id').asc()], **partition),
+        column_count=Window(Count('id'), **partition),
+    ).filter(column_position__lte=limit or board_column_limit()).order_by('status', 'order', 'id')
+
+
+def _group_slices(rows):
+    tasks = {status: [] for status, _ in BOARD_COLUMNS}
+    counts = dict.fromkeys(tasks, 0)
+    for task in rows:
+        tasks.setdefault(task.status, []).append(task)
+        counts[task.status] = task.column_count
+    return tasks, counts
+
+
+def column_slices(project, limit=None):
+    """First ``limit`` tasks of every column plus exact per-column counts, in one query.
+
+    Uses ``ROW_NUMBER() OVER (PARTITION BY status ORDER BY order, id)`` and a
+    partitioned ``COUNT`` so board cost is bounded by the limit, not project size.
+    """
+    return _group_slices(_slice_queryset(project, limit))
+
+
+async def acolumn_slices(project, limit=None):
+    return _group_slices([task async for task in _slice_queryset(project, limit)])
+
+
+def more_cursor(tasks, total):
+    """Keyset cursor for the slice after ``tasks``, or ``None`` when the column is exhausted."""
+    if not tasks or len(tasks) >= total:
+        return None
+    return encode_cursor('n', [tasks[-1].order, tasks[-1].id])
+
+
+def render_column(project, status, label, tasks, total):
+    return render_to_string('projects/board_column.html', {
+        'project': project,
+        'code': status,
+        'label': label,
+        'tasks': tasks,
+        'total': total,
+        'more_cursor': more_cursor(tasks, total),
+        'status_choices': Task.Status.choices,
+        'csrf_input': mark_safe(CSRF_PLACEHOLDER),
+    })
+
+
+def build_columns(project, slices=None):
+    tasks, counts = slices or column_slices(project)
+    return {status: render_column(project, status, label, tasks[status], counts[status]) for status, label in BOARD_COLUMNS}
+
+
+def _column_keys(project, version):
+    return {status: COLUMN_KEY.format(project_id=project.pk, version=version, status=status) for status, _ in BOARD_COLUMNS}
+
+
+def _with_csrf(request, fragments):
+    token_input = csrf_input(request)
+    return [mark_safe(fragments[status].replace(CSRF_PLACEHOLDER, token_input)) for status, _ in BOARD_COLUMNS]
+
+
+def board_columns(request, project):
+    """Rendered column fragments for ``project``, from the cache when the board has not changed."""
+    keys = _column_keys(project, board_version(project.pk))
+    cached = cache.get_many(keys.values())
+    if len(cached) == len(keys):
+        fragments = {status: cached[key] for status, key in keys.items()}
+    else:
+        fragments = build_columns(project)
+        cache.set_many({keys[status]: html for status, html in fragments.items()}, _timeout())
+    return _with_csrf(request, fragments)
+
+
+async def aboard_columns(request, project):
+    keys = _column_keys(project, await aboard_version(project.pk))
+    cached = await cache.aget_many(keys.values())
+    if len(cached) == len(keys):
+        fragments = {status: cached[key] for status, key in keys.items()}
+    else:
+        fragments = build_columns(project, await acolumn_slices(project))
+        await cache.aset_many({keys[status]: html for status, html in fragments.items()}, _timeout())
+    return _with_csrf(request, fragments)
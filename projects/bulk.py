@@ -0,0 +1,245 @@
+"""Batch create/update/move/delete of tasks behind ``/api/tasks/bulk/``.
+
+Items are validated without touching the database, then membership, target
+tasks and assignees are resolved with one query each for the whole batch and
+the writes go out as ``bulk_create``/``bulk_update`` in a single transaction.
+``update_tasks`` sets the same values on a whole queryset (admin actions).
+"""
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .membership import MembershipResolver
+from .models import ProjectMembership, Task
+from .ordering import ORDER_GAP, move_task
+from .serializers import BulkTaskMoveSerializer, BulkTaskSerializer
+from .signals import tasks_bulk_changed
+
+OPERATIONS = ('create', 'update', 'move', 'delete')
+
+
+def update_tasks(queryset, batch_size=1000, **values):
+    """Set ``values`` on every task of ``queryset`` and return the number of tasks changed.
+
+    Tasks go in pk order, ``batch_size`` per short transaction: their old values
+    are read and locked, one UPDATE changes them and ``tasks_bulk_changed``
+    brings stats, board events and the sync log along. However many tasks are
+    selected, locks and memory stay bounded by one batch.
+    """
+    attnames = [Task._meta.get_field(name).attname for name in values]
+    queryset = queryset.order_by('pk')
+    total = last = 0
+    while True:
+        ids = list(queryset.filter(pk__gt=last).values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return total
+        last = ids[-1]
+        with transaction.atomic():
+            previous = {pk: dict(zip(attnames, old)) for pk, *old in
+                        Task.objects.filter(pk__in=ids).select_for_update().values_list('pk', *attnames)}
+            Task.objects.filter(pk__in=previous).update(**values, updated_at=timezone.now())
+            tasks_bulk_changed.send(sender=Task, created=[], updated=list(Task.objects.filter(pk__in=previous)),
+                                    previous=previous)
+        total += len(previous)
+
+
+def _delete_tasks(ids):
+    """One ``DELETE ... WHERE id IN (...)``: no per-row post_delete, ``tasks_bulk_changed`` covers the derived data."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {Task._meta.db_table} WHERE id IN ({", ".join(["%s"] * len(ids))})', ids)
+
+
+def _max_items():
+    return getattr(settings, 'TASK_BULK_MAX_ITEMS', 10000)
+
+
+class BulkTaskRequest:
+    def __init__(self, request, payload):
+        self.resolver = MembershipResolver.for_request(request)
+        self.payload = payload
+        self.errors = []
+        self.creates = []
+        self.updates = []
+        self.moves = []
+        self.deletes = []
+        self._next_orders = None
+
+    def error(self, op, index, errors):
+        self.errors.append({'op': op, 'index': index, 'errors': errors})
+
+    def check_shape(self):
+        if not isinstance(self.payload, dict) or not set(self.payload) <= set(OPERATIONS):
+            raise ValidationError(f'Expected an object with any of: {", ".join(OPERATIONS)}.')
+        total = 0
+        for op in OPERATIONS:
+            items = self.payload.get(op, [])
+            if not isinstance(items, list):
+                raise ValidationError(f'"{op}" must be a list.')
+            total += len(items)
+        if total > _max_items():
+            raise ValidationError(f'At most {_max_items()} items per request.')
+
+    # validation -----------------------------------------------------------
+
+    def validate(self):
+        self.check_shape()
+        for index, item in enumerate(self.payload.get('create', [])):
+            serializer = BulkTaskSerializer(data=item)
+            if not serializer.is_valid():
+                self.error('create', index, serializer.errors)
+            elif not self.resolver.is_member(serializer.validated_data['project']):
+                self.error('create', index, {'project': ['You are not a member of this project.']})
+            else:
+                self.creates.append((index, serializer.validated_data))
+        for index, item in enumerate(self.payload.get('update', [])):
+            serializer = BulkTaskSerializer(data=item, partial=True)
+            if not serializer.is_valid():
+                self.error('update', index, serializer.errors)
+            elif 'id' not in serializer.validated_data:
+                self.error('update', index, {'id': ['This field is required.']})
+            elif 'project' in serializer.validated_data and not self.resolver.is_member(serializer.validated_data['project']):
+                self.error('update', index, {'project': ['You are not a member of this project.']})
+            else:
+                self.updates.append((index, serializer.validated_data))
+        for index, item in enumerate(self.payload.get('move', [])):
+            serializer = BulkTaskMoveSerializer(data=item)
+            if serializer.is_valid():
+                self.moves.append((index, serializer.validated_data))
+            else:
+                self.error('move', index, serializer.errors)
+        for index, pk in enumerate(self.payload.get('delete', [])):
+            if isinstance(pk, int) and not isinstance(pk, bool):
+                self.deletes.append((index, pk))
+            else:
+                self.error('delete', index, {'id': ['A valid integer is required.']})
+        self._resolve_targets()
+        self._resolve_assignees()
+
+    def _resolve_targets(self):
+        ids = {data['id'] for _, data in self.updates + self.moves} | {pk for _, pk in self.deletes}
+        visible = self.resolver.project_ids()
+        self.tasks = Task.objects.filter(pk__in=ids, project_id__in=visible).in_bulk() if ids else {}
+
+        def keep(op, entries, key):
+            kept = []
+            for index, entry in entries:
+                if key(entry) in self.tasks:
+                    kept.append((index, entry))
+                else:
+                    self.error(op, index, {'id': ['Not found.']})
+            return kept
+
+        self.updates = keep('update', self.updates, lambda data: data['id'])
+        self.moves = keep('move', self.moves, lambda data: data['id'])
+        self.deletes = keep('delete', self.deletes, lambda pk: pk)
+
+    def _project_of(self, op, data):
+        if op == 'create' or 'project' in data:
+            return data['project']
+        return self.tasks[data['id']].project_id
+
+    def _resolve_assignees(self):
+        """Assignees must be members of the task's (new) project, as in ``TaskSerializer``; one query for the batch."""
+        wanted = {(self._project_of(op, data), data['assignee_id'])
+                  for op in ('create', 'update') for _, data in getattr(self, f'{op}s') if data.get('assignee_id')}
+        members = set()
+        if wanted:
+            members = set(ProjectMembership.objects.filter(
+                project_id__in={p for p, _ in wanted}, user_id__in={u for _, u in wanted},
+            ).values_list('project_id', 'user_id'))
+        for op in ('create', 'update'):
+            kept = []
+            for index, data in getattr(self, f'{op}s'):
+                if data.get('assignee_id') and (self._project_of(op, data), data['assignee_id']) not in members:
+                    self.error(op, index, {'assignee_id': ['Not a member of this project.']})
+                else:
+                    kept.append((index, data))
+            setattr(self, f'{op}s', kept)
+
+    # writes ---------------------------------------------------------------
+
+    def next_order(self, project_id, status):
+        if self._next_orders is None:
+            project_ids = {data['project'] for _, data in self.creates} | {self.tasks[d['id']].project_id for _, d in self.moves}
+            rows = Task.objects.filter(project_id__in=project_ids).values('project_id', 'status').annotate(m=Max('order'))
+            self._next_orders = {(row['project_id'], row['status']): row['m'] for row in rows}
+        key = (project_id, status)
+        self._next_orders[key] = (self._next_orders.get(key) or 0) + ORDER_GAP
+        return self._next_orders[key]
+
+    def apply(self, atomic=False):
+        """Write the valid items; with ``atomic``, an item failing here rolls everything back and ``None`` is returned."""
+        now = timezone.now()
+        result = {'created': [], 'updated': [], 'moved': [], 'deleted': []}
+        with transaction.atomic():
+            created = []
+            for _, data in self.creates:
+                fields = {key: value for key, value in data.items() if key not in ('id', 'project')}
+                task = Task(project_id=data['project'], **fields)
+                if 'order' not in data:
+                    task.order = self.next_order(task.project_id, task.status)
+                created.append(task)
+            created = Task.objects.bulk_create(created, batch_size=1000)
+            result['created'] = [task.pk for task in created]
+
+            previous = {}
+            changed_fields = set()
+            updated = {}
+            for _, data in self.updates:
+                task = self.tasks[data['id']]
+                before = previous.setdefault(task.pk, {})
+                for field, value in data.items():
+                    attname = 'project_id' if field == 'project' else field
+                    if field == 'id' or getattr(task, attname) == value:
+                        continue
+                    before.setdefault(attname, getattr(task, attname))
+                    setattr(task, attname, value)
+                    changed_fields.add(attname)
+                updated[task.pk] = task
+            for _, data in self.moves:
+                task = self.tasks[data['id']]
+                if data.get('before_id') or data.get('after_id'):
+                    continue
+                status = data.get('status') or task.status
+                before = previous.setdefault(task.pk, {})
+                before.setdefault('status', task.status)
+                before.setdefault('order', task.order)
+                task.status = status
+                task.order = self.next_order(task.project_id, status)
+                changed_fields.update(('status', 'order'))
+                updated[task.pk] = task
+                result['moved'].append(task.pk)
+            if changed_fields:
+                for task in updated.values():
+                    task.updated_at = now
+                Task.objects.bulk_update(list(updated.values()), sorted(changed_fields | {'updated_at'}), batch_size=1000)
+            result['updated'] = [data['id'] for _, data in self.updates]
+
+            for index, data in self.moves:
+                task = self.tasks[data['id']]
+                if not (data.get('before_id') or data.get('after_id')):
+                    continue
+                try:
+                    with transaction.atomic():
+                        move_task(task, data.get('status'), before_id=data.get('before_id'), after_id=data.get('after_id'))
+                except ValidationError as exc:
+                    self.error('move', index, exc.message_dict)
+                else:
+                    result['moved'].append(task.pk)
+            if atomic and self.errors:
+                transaction.set_rollback(True)
+                return None
+
+            deleted = []
+            if self.deletes:
+                deleted = [self.tasks[pk] for pk in dict.fromkeys(pk for _, pk in self.deletes)]
+                _delete_tasks([task.pk for task in deleted])
+                result['deleted'] = [task.pk for task in deleted]
+
+            tasks_bulk_changed.send(
+                sender=Task, created=created, updated=list(updated.values()), deleted=deleted,
+                previous={pk: values for pk, values in previous.items() if values},
+            )
+        return result
@@ -0,0 +1,124 @@
+"""ETags and conditional requests.
+
+Collection and board ETags hash the version counters of the projects behind
+the response (``board.board_versions``; bumped after every committed change
+to a project, its tasks or its memberships), so an unchanged poll is answered
+``304 Not Modified`` from a membership lookup and a cache read, without
+running the queryset, serializer or template. A single task's ETag comes from
+its ``updated_at`` and is what ``If-Match`` is checked against on writes.
+"""
+import hashlib
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import quote_etag
+from rest_framework.exceptions import APIException
+
+from .board import board_versions
+from .membership import MembershipResolver
+from .models import Task
+
+
+class PreconditionFailed(APIException):
+    status_code = 412
+    default_detail = 'The task has changed since it was fetched.'
+    default_code = 'precondition_failed'
+
+
+def make_etag(*parts):
+    return quote_etag(hashlib.sha1(repr(parts).encode()).hexdigest())
+
+
+def task_etag(task):
+    return make_etag('task', task.pk, task.updated_at.isoformat())
+
+
+def versions_etag(request, project_ids, *parts):
+    versions = board_versions(sorted(project_ids))
+    return make_etag(request.user.pk, request.get_full_path(), sorted(versions.items()), *parts)
+
+
+def finish(response, etag):
+    """Mark ``response`` as per-user and always revalidated, with ``etag`` if it succeeded."""
+    if etag and response.status_code in (200, 304):
+        response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ('Cookie', 'Authorization'))
+    return response
+
+
+class ConditionalViewSetMixin:
+    """``If-None-Match`` support for the list (and any reads routed through ``conditional``).
+
+    ``etag_project_ids`` says which projects a response depends on; ``None``
+    skips the conditional handling (e.g. the object may not exist).
+    """
+
+    def etag_project_ids(self, request):
+        return MembershipResolver.for_request(request).project_ids()
+
+    def collection_etag(self, request):
+        project_ids = self.etag_project_ids(request)
+        return None if project_ids is None else versions_etag(request, project_ids, timezone.localdate())
+
+    def conditional(self, request, handler, *args, **kwargs):
+        etag = self.collection_etag(request)
+        response = get_conditional_response(request, etag=etag) if etag else None
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        return finish(response, etag)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(request, super().list, *args, **kwargs)
+
+
+class TaskConcurrencyMixin(ConditionalViewSetMixin):
+    """Task collections are versioned by project; single tasks by ``updated_at``.
+
+    Writes lock the task and answer ``412 Precondition Failed`` when an
+    ``If-Match`` header no longer matches it, so clients cannot overwrite
+    changes they have not seen.
+    """
+    write_actions = ('update', 'partial_update', 'destroy', 'move')
+
+    def etag_project_ids(self, request):
+        project_ids = super().etag_project_ids(request)
+        project = request.query_params.get('project')
+        if project:
+            return {int(project)} & set(project_ids) if project.isdigit() else None
+        return project_ids
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in self.write_actions:
+            queryset = queryset.select_for_update(of=('self',))
+        return queryset
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = str(kwargs.get('pk'))
+        task = Task.objects.visible_to(request.user).only('id', 'updated_at').filter(pk=pk).first() if pk.isdigit() else None
+        etag = task_etag(task) if task else None
+        response = get_conditional_response(request, etag=etag) if etag else None
+        if response is None:
+            response = super().retrieve(request, *args, **kwargs)
+        return finish(response, etag)
+
+    def update(self, request, *args, **kwargs):
+        response = super().update(request, *args, **kwargs)
+        return finish(response, task_etag(self.saved_task))
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        self.saved_task = serializer.instance
+
+    def check_object_permissions(self, request, obj):
+        super().check_object_permissions(request, obj)
+        if self.action in self.write_actions and get_conditional_response(request, etag=task_etag(obj)) is not None:
+            raise PreconditionFailed()
+
+    def dispatch(self, request, *args, **kwargs):
+        if getattr(self, 'action_map', {}).get(request.method.lower()) in self.write_actions:
+            with transaction.atomic():
+                return super().dispatch(request, *args, **kwargs)
+        return super().dispatch(request, *args, **kwargs)
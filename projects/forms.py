@@ -1,9 +1,7 @@
 from django import forms
-from django.contrib.auth import get_user_model
+from . import users
 from .models import Project, Task, ProjectMembership
 
-User = get_user_model()
-
 class ProjectForm(forms.ModelForm):
     class Meta:
         model = Project
@@ -14,19 +12,37 @@ class ProjectForm(forms.ModelForm):
         }
 
 class TaskForm(forms.ModelForm):
+    # Choices are the project's members (``users.candidates``), not the whole user table.
+    assignee = forms.TypedChoiceField(coerce=int, required=False, empty_value=None)
+
     class Meta:
         model = Task
-        fields = ['title', 'description', 'status', 'priority', 'due_date', 'assignee']
+        fields = ['title', 'description', 'status', 'priority', 'due_date']
         widgets = {
             'due_date': forms.DateInput(attrs={'type': 'date'}),
         }
 
+    def __init__(self, *args, project, **kwargs):
+        super().__init__(*args, **kwargs)
+        rows = users.candidates(project.pk)
+        current = self.instance.assignee_id
+        if current is not None and all(pk != current for pk, _ in rows):
+            rows = [(current, self.instance.assignee.username), *rows]  # keep a former member assigned
+        self.fields['assignee'].choices = [('', '---------'), *rows]
+        self.initial.setdefault('assignee', current)
+
+    def clean_assignee(self):
+        self.instance.assignee_id = self.cleaned_data['assignee']
+        return self.cleaned_data['assignee']
+
 class AddCollaboratorForm(forms.Form):
-    username = forms.CharField(max_length=150, help_text='Existing username to add as collaborator')
+    username = forms.CharField(max_length=150, help_text='Existing username to add as collaborator',
+                               widget=forms.TextInput(attrs={'autocomplete': 'off', 'list': 'user-suggestions'}))
     role = forms.ChoiceField(choices=ProjectMembership.Role.choices, initial=ProjectMembership.Role.MEMBER)
 
     def clean_username(self):
         uname = self.cleaned_data['username']
-        if not User.objects.filter(username=uname).exists():
+        self.user = users.get_by_username(uname)
+        if self.user is None:
             raise forms.ValidationError('No such user.')
         return uname
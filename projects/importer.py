@@ -0,0 +1,316 @@
+"""Bulk import of projects, memberships and tasks from CSV or NDJSON.
+
+Records are read as a stream and handled in batches: each batch is validated
+in Python (field rules, ``Project.clean``, the one-name-per-owner constraint),
+usernames and project references are resolved with one query per batch through
+caches that persist across batches, and the rows are written with
+``bulk_create`` (or ``COPY`` for tasks on Postgres) in one transaction per
+batch. The usual side effects (stats, search, change log, live boards) run
+through ``tasks_bulk_changed`` and ``rows_bulk_created``.
+
+Every record has a ``type`` of ``project``, ``membership`` or ``task`` (or the
+command's ``--type``). Projects are named by ``owner`` + ``name``; memberships
+and tasks point at them with ``project_id`` or ``project`` + ``project_owner``,
+so a file must list projects before their tasks. Users are usernames.
+"""
+import csv
+import json
+from collections import defaultdict
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Project, ProjectMembership, Task
+from .ordering import ORDER_GAP
+from .signals import rows_bulk_created, tasks_bulk_changed
+
+User = get_user_model()
+
+TYPES = ('project', 'membership', 'task')
+
+
+def read_records(stream, fmt):
+    """Yield ``(line_number, dict)`` from a CSV (with header) or NDJSON text stream."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    elif fmt == 'ndjson':
+        for number, line in enumerate(stream, start=1):
+            if line.strip():
+                try:
+                    record = json.loads(line)
+                except ValueError as exc:
+                    yield number, {'_error': f'Invalid JSON: {exc}'}
+                    continue
+                yield number, record if isinstance(record, dict) else {'_error': 'Must be a JSON object.'}
+    else:
+        raise ValueError('format must be csv or ndjson.')
+
+
+def _text(record, field, max_length=None, required=False):
+    value = record.get(field)
+    value = '' if value is None else str(value).strip()
+    if required and not value:
+        raise ValidationError({field: 'This field is required.'})
+    if max_length and len(value) > max_length:
+        raise ValidationError({field: f'At most {max_length} characters.'})
+    return value
+
+
+def _choice(record, field, choices, default):
+    value = record.get(field)
+    if value in (None, ''):
+        return default
+    if isinstance(default, int):
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            pass
+    if value not in choices:
+        raise ValidationError({field: f'Must be one of: {", ".join(map(str, choices))}.'})
+    return value
+
+
+def _date(record, field):
+    value = record.get(field)
+    if value in (None, ''):
+        return None
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        raise ValidationError({field: 'Use YYYY-MM-DD.'})
+
+
+def _int(record, field):
+    value = record.get(field)
+    if value in (None, ''):
+        return None
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValidationError({field: 'Must be a whole number.'})
+    if number < 0:
+        raise ValidationError({field: 'Must not be negative.'})
+    return number
+
+
+class Importer:
+    def __init__(self, batch_size=5000, use_copy=False, default_type=None):
+        self.batch_size = batch_size
+        self.use_copy = use_copy and connection.vendor == 'postgresql'
+        self.default_type = default_type
+        self.users = {}      # username -> id (None when unknown)
+        self.projects = {}   # (owner username, name) -> id
+        self.project_ids = set()
+        self.counts = defaultdict(int)
+        self.errors = []
+
+    # lookups --------------------------------------------------------------
+
+    def load_users(self, usernames):
+        missing = {name for name in usernames if name and name not in self.users}
+        if missing:
+            found = dict(User.objects.filter(username__in=missing).values_list('username', 'id'))
+            self.users.update({name: found.get(name) for name in missing})
+
+    def user_id(self, record, field, required=True):
+        name = _text(record, field, required=required)
+        if not name:
+            return None
+        if self.users.get(name) is None:
+            raise ValidationError({field: f'Unknown user "{name}".'})
+        return self.users[name]
+
+    def load_projects(self, records):
+        ids = {int(r['project_id']) for r in records if str(r.get('project_id') or '').isdigit()} - self.project_ids
+        if ids:
+            self.project_ids |= set(Project.objects.filter(pk__in=ids).values_list('pk', flat=True))
+        keys = {(str(r.get('project_owner') or '').strip(), str(r.get('project') or '').strip()) for r in records
+                if not r.get('project_id') and r.get('project')}
+        keys = {key for key in keys if key not in self.projects and self.users.get(key[0])}
+        if keys:
+            rows = Project.objects.filter(owner_id__in={self.users[owner] for owner, _ in keys}, name__in={n for _, n in keys}) \
+                .values_list('owner__username', 'name', 'pk')
+            self.projects.update({(owner, name): pk for owner, name, pk in rows})
+
+    def project_id(self, record):
+        if record.get('project_id') not in (None, ''):
+            pk = _int(record, 'project_id')
+            if pk not in self.project_ids:
+                raise ValidationError({'project_id': 'Unknown project.'})
+            return pk
+        key = (_text(record, 'project_owner', required=True), _text(record, 'project', required=True))
+        if key not in self.projects:
+            raise ValidationError({'project': f'Unknown project "{key[1]}" of "{key[0]}".'})
+        return self.projects[key]
+
+    # per-type validation ---------------------------------------------------
+
+    def build_project(self, record):
+        project = Project(
+            owner_id=self.user_id(record, 'owner'),
+            name=_text(record, 'name', max_length=200, required=True),
+            description=_text(record, 'description'),
+            status=_choice(record, 'status', Project.Status.values, Project.Status.PLANNED),
+            start_date=_date(record, 'start_date'),
+            end_date=_date(record, 'end_date'),
+        )
+        project.clean()
+        return project
+
+    def build_membership(self, record):
+        return ProjectMembership(
+            project_id=self.project_id(record),
+            user_id=self.user_id(record, 'user'),
+            role=_choice(record, 'role', ProjectMembership.Role.values, ProjectMembership.Role.MEMBER),
+        )
+
+    def build_task(self, record):
+        return Task(
+            project_id=self.project_id(record),
+            title=_text(record, 'title', max_length=200, required=True),
+            description=_text(record, 'description'),
+            status=_choice(record, 'status', Task.Status.values, Task.Status.TODO),
+            priority=_choice(record, 'priority', Task.Priority.values, Task.Priority.MEDIUM),
+            due_date=_date(record, 'due_date'),
+            assignee_id=self.user_id(record, 'assignee', required=False),
+            order=_int(record, 'order'),
+        )
+
+    # batches ----------------------------------------------------------------
+
+    def error(self, line, errors):
+        self.errors.append((line, {field: msgs if isinstance(msgs, list) else [msgs] for field, msgs in errors.items()}))
+        self.counts['errors'] += 1
+
+    def run(self, records, progress=None):
+        batch = []
+        for line, record in records:
+            batch.append((line, record))
+            if len(batch) >= self.batch_size:
+                self.import_batch(batch)
+                batch = []
+                if progress:
+                    progress(self)
+        if batch:
+            self.import_batch(batch)
+            if progress:
+                progress(self)
+        return self.counts
+
+    def import_batch(self, batch):
+        by_type = defaultdict(list)
+        for line, record in batch:
+            record_type = record.get('type') or self.default_type
+            if '_error' in record:
+                self.error(line, {'record': record['_error']})
+            elif record_type not in TYPES:
+                self.error(line, {'type': f'Must be one of: {", ".join(TYPES)}.'})
+            else:
+                by_type[record_type].append((line, record))
+        records = [record for _, record in batch]
+        self.load_users({str(r.get(f) or '').strip() for r in records for f in ('owner', 'user', 'assignee', 'project_owner')})
+        with transaction.atomic():
+            self.import_projects(by_type['project'])
+            self.load_projects([record for _, record in by_type['membership'] + by_type['task']])
+            self.import_memberships(by_type['membership'])
+            self.import_tasks(by_type['task'])
+
+    def _build(self, entries, build):
+        built = []
+        for line, record in entries:
+            try:
+                built.append((line, build(record)))
+            except ValidationError as exc:
+                self.error(line, exc.message_dict if hasattr(exc, 'error_dict') else {'record': exc.messages})
+        return built
+
+    def import_projects(self, entries):
+        built = self._build(entries, self.build_project)
+        if not built:
+            return
+        names = {(p.owner_id, p.name) for _, p in built}
+        taken = set(Project.objects.filter(owner_id__in={o for o, _ in names}, name__in={n for _, n in names})
+                    .values_list('owner_id', 'name'))
+        projects = []
+        for line, project in built:
+            key = (project.owner_id, project.name)
+            if key in taken:
+                self.error(line, {'name': 'This owner already has a project with this name.'})
+                continue
+            taken.add(key)
+            projects.append(project)
+        now = timezone.now()
+        for project in projects:
+            project.created_at = project.updated_at = now
+        projects = Project.objects.bulk_create(projects, batch_size=1000)
+        owners = {user_id: name for name, user_id in self.users.items() if user_id}
+        for project in projects:
+            self.projects[owners[project.owner_id], project.name] = project.pk
+            self.project_ids.add(project.pk)
+        rows_bulk_created.send(sender=Project, objs=projects)
+        memberships = ProjectMembership.objects.bulk_create(
+            [ProjectMembership(project=p, user_id=p.owner_id, role=ProjectMembership.Role.OWNER) for p in projects],
+            batch_size=1000,
+        )
+        rows_bulk_created.send(sender=ProjectMembership, objs=memberships)
+        self.counts['projects'] += len(projects)
+
+    def import_memberships(self, entries):
+        memberships = {}
+        for _, membership in self._build(entries, self.build_membership):
+            memberships[membership.project_id, membership.user_id] = membership
+        if memberships:
+            memberships = ProjectMembership.objects.bulk_create(
+                list(memberships.values()), batch_size=1000,
+                update_conflicts=True, unique_fields=['project', 'user'], update_fields=['role'],
+            )
+            rows_bulk_created.send(sender=ProjectMembership, objs=memberships)
+            self.counts['memberships'] += len(memberships)
+
+    def import_tasks(self, entries):
+        tasks = [task for _, task in self._build(entries, self.build_task)]
+        if not tasks:
+            return
+        unordered = [task for task in tasks if task.order is None]
+        if unordered:
+            rows = Task.objects.filter(project_id__in={t.project_id for t in unordered}).values('project_id', 'status') \
+                .annotate(m=Max('order'))
+            last = {(row['project_id'], row['status']): row['m'] or 0 for row in rows}
+            for task in unordered:
+                key = (task.project_id, task.status)
+                last[key] = last.get(key, 0) + ORDER_GAP
+                task.order = last[key]
+        now = timezone.now()
+        for task in tasks:
+            task.created_at = task.updated_at = now
+        if self.use_copy:
+            self.copy_tasks(tasks)
+        else:
+            tasks = Task.objects.bulk_create(tasks, batch_size=1000)
+        tasks_bulk_changed.send(sender=Task, created=tasks, updated=[], previous={})
+        self.counts['tasks'] += len(tasks)
+
+    def copy_tasks(self, tasks):
+        """Insert through Postgres ``COPY``, with ids reserved from the sequence so signals still get them."""
+        fields = [f for f in Task._meta.concrete_fields]
+        table = Task._meta.db_table
+        columns = ', '.join(connection.ops.quote_name(f.column) for f in fields)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)',
+                [table, Task._meta.pk.column, len(tasks)],
+            )
+            for task, (pk,) in zip(tasks, cursor.fetchall()):
+                task.pk = pk
+            with cursor.copy(f'COPY {connection.ops.quote_name(table)} ({columns}) FROM STDIN') as copy:
+                for task in tasks:
+                    copy.write_row([getattr(task, f.attname) for f in fields])
+        for task in tasks:
+            task._state.adding = False
+            task._state.db = connection.alias
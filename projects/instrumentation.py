@@ -0,0 +1,309 @@
+"""Per-request SQL, template and serializer timing (opt-in with ``REQUEST_METRICS=1``).
+
+``RequestMetricsMiddleware`` keeps the request's metrics in a context variable,
+which follows the request into ``sync_to_async`` threads and streamed bodies;
+an ``execute_wrapper`` on every database connection counts the queries run
+while it is set, and the outermost template render and serializer ``.data``
+call are timed the same way. Each response gets a
+``Server-Timing`` header, each request a JSON line on the ``projects.metrics``
+logger, and per-view histograms are kept in process and served in the
+Prometheus text format on ``/metrics/``. The per-query cost is two
+``perf_counter`` calls and a dict increment, so it can stay on under load.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed, PermissionDenied
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+
+logger = logging.getLogger('projects.metrics')
+
+_current = ContextVar('request_metrics', default=None)
+_done = object()
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+# (metric, type, series key, help) served on /metrics/, labelled by view and method.
+EXPOSED = (
+    ('http_request_duration_seconds', 'histogram', 'duration', 'Time until the response is returned.'),
+    ('http_request_db_seconds', 'histogram', 'db', 'Time spent in database queries per request.'),
+    ('http_request_queries', 'histogram', 'queries', 'Database queries per request.'),
+    ('http_request_template_seconds_total', 'counter', 'template', 'Time spent rendering templates.'),
+    ('http_request_serializer_seconds_total', 'counter', 'serializer', 'Time spent serializing API data.'),
+    ('http_request_duplicate_queries_total', 'counter', 'duplicates', 'Queries repeating an earlier statement of the request.'),
+    ('http_requests_total', 'counter', 'status', 'Requests by response status.'),
+)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_time = 0.0
+        self.queries = Counter()
+        self.timers = {'template': 0.0, 'serializer': 0.0}
+        self._depth = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries[sql] += 1
+
+    @property
+    def query_count(self):
+        return sum(self.queries.values())
+
+    def duplicates(self):
+        """``{fingerprint: (count, sql)}`` for statements run more than once (same SQL, any parameters)."""
+        return {hashlib.sha1(sql.encode()).hexdigest()[:12]: (count, sql)
+                for sql, count in self.queries.items() if count > 1}
+
+
+def _timed(bucket, func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        metrics = _current.get()
+        if metrics is None or metrics._depth[bucket]:
+            return func(*args, **kwargs)
+        metrics._depth[bucket] += 1
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            metrics.timers[bucket] += time.perf_counter() - started
+            metrics._depth[bucket] -= 1
+    wrapper.instrumented = True
+    return wrapper
+
+
+def _execute(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+def _wrap_connection(sender=None, connection=None, **kwargs):
+    if _execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute)
+
+
+def install_timers():
+    """Time queries, ``Template.render`` and ``BaseSerializer.data``; nested calls count toward the outermost one."""
+    # Connections are per thread and opened lazily: wrap this thread's now and every other one as it connects.
+    connection_created.connect(_wrap_connection, dispatch_uid='projects.instrumentation')
+    for connection in connections.all():
+        _wrap_connection(connection=connection)
+    from django.template.base import Template
+    from rest_framework.serializers import BaseSerializer, ListSerializer, Serializer
+
+    if not getattr(Template.render, 'instrumented', False):
+        Template.render = _timed('template', Template.render)
+    for cls in (BaseSerializer, Serializer, ListSerializer):
+        prop = cls.__dict__.get('data')
+        if prop is not None and not getattr(prop.fget, 'instrumented', False):
+            setattr(cls, 'data', property(_timed('serializer', prop.fget)))
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += 1
+        self.sum += value
+
+    def lines(self, name, labels):
+        for bound, count in zip(self.buckets, self.counts):
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {count}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.total}'
+        yield f'{name}_sum{{{labels}}} {self.sum:.6f}'
+        yield f'{name}_count{{{labels}}} {self.total}'
+
+
+class Registry:
+    """Aggregated metrics of this process, keyed by (view name, method)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.views = {}
+
+    def observe(self, view, method, status, metrics, duration):
+        with self._lock:
+            series = self.views.get((view, method))
+            if series is None:
+                series = self.views[view, method] = {
+                    'duration': Histogram(DURATION_BUCKETS), 'db': Histogram(DURATION_BUCKETS),
+                    'queries': Histogram(QUERY_BUCKETS), 'template': 0.0, 'serializer': 0.0,
+                    'duplicates': 0, 'status': Counter(),
+                }
+            series['duration'].observe(duration)
+            series['db'].observe(metrics.db_time)
+            series['queries'].observe(metrics.query_count)
+            series['template'] += metrics.timers['template']
+            series['serializer'] += metrics.timers['serializer']
+            series['duplicates'] += sum(count - 1 for count in metrics.queries.values() if count > 1)
+            series['status'][status] += 1
+
+    def render(self):
+        lines = []
+        with self._lock:
+            views = sorted(self.views.items())
+            for name, kind, key, help_text in EXPOSED:
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+                for (view, method), series in views:
+                    labels = f'view="{view}",method="{method}"'
+                    value = series[key]
+                    if isinstance(value, Histogram):
+                        lines += value.lines(name, labels)
+                    elif isinstance(value, Counter):
+                        lines += [f'{name}{{{labels},status="{status}"}} {count}' for status, count in sorted(value.items())]
+                    else:
+                        lines.append(f'{name}{{{labels}}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def metrics_enabled():
+    return getattr(settings, 'REQUEST_METRICS', False)
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return (match.view_name or match._func_path) if match else 'unresolved'
+
+
+@contextmanager
+def _measuring(metrics):
+    token = _current.set(metrics)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+class RequestMetricsMiddleware:
+    """Put it first in ``MIDDLEWARE`` so the timings cover the whole stack.
+
+    Sync and async capable. Queries run while a streaming body is produced are
+    counted too: the log line and histograms are written once the stream is
+    done, while ``Server-Timing`` (a header) only covers the time until then.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not metrics_enabled():
+            raise MiddlewareNotUsed()
+        install_timers()
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        with _measuring(metrics):
+            response = self.get_response(request)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        with _measuring(metrics):
+            response = await self.get_response(request)
+        return self.finish(request, response, metrics)
+
+    def finish(self, request, response, metrics):
+        duration = time.perf_counter() - metrics.started
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.query_count} queries"',
+            f'tpl;dur={metrics.timers["template"] * 1000:.1f}',
+            f'ser;dur={metrics.timers["serializer"] * 1000:.1f}',
+            f'total;dur={duration * 1000:.1f}',
+        ])
+        if not response.streaming:
+            self.observe(request, response, metrics, duration)
+        elif response.is_async:
+            response.streaming_content = self._astream(response.streaming_content, request, response, metrics, duration)
+        else:
+            response.streaming_content = self._stream(response.streaming_content, request, response, metrics, duration)
+        return response
+
+    def _stream(self, content, request, response, metrics, duration):
+        iterator = iter(content)
+        try:
+            while True:
+                with _measuring(metrics):
+                    chunk = next(iterator, _done)
+                if chunk is _done:
+                    return
+                yield chunk
+        finally:
+            self.observe(request, response, metrics, duration)
+
+    async def _astream(self, content, request, response, metrics, duration):
+        iterator = aiter(content)
+        try:
+            while True:
+                with _measuring(metrics):
+                    chunk = await anext(iterator, _done)
+                if chunk is _done:
+                    return
+                yield chunk
+        finally:
+            self.observe(request, response, metrics, duration)
+
+    def observe(self, request, response, metrics, duration):
+        view = _view_name(request)
+        registry.observe(view, request.method, response.status_code, metrics, duration)
+        if logger.isEnabledFor(logging.INFO):
+            self.log(request, response, view, metrics, duration)
+
+    def log(self, request, response, view, metrics, duration):
+        duplicates = metrics.duplicates()
+        logger.info(json.dumps({
+            'view': view, 'method': request.method, 'path': request.path, 'status': response.status_code,
+            'duration_ms': round(duration * 1000, 2), 'db_ms': round(metrics.db_time * 1000, 2),
+            'queries': metrics.query_count, 'template_ms': round(metrics.timers['template'] * 1000, 2),
+            'serializer_ms': round(metrics.timers['serializer'] * 1000, 2),
+            'duplicates': {fingerprint: count for fingerprint, (count, _) in duplicates.items()},
+        }))
+        if duplicates and logger.isEnabledFor(logging.DEBUG):
+            for fingerprint, (count, sql) in duplicates.items():
+                logger.debug('%s ran %d times in %s: %s', fingerprint, count, view, sql)
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint; open to staff and to ``METRICS_ALLOWED_IPS``."""
+    if not metrics_enabled():
+        return HttpResponse(status=404)
+    if not (request.user.is_staff or request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICS_ALLOWED_IPS', ())):
+        raise PermissionDenied
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,77 @@
+import json
+import platform
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from projects import benchmark
+
+
+class Command(BaseCommand):
+    help = ('Generate a synthetic dataset in a throwaway database, then measure latency, throughput and query '
+            'counts of every page and API endpoint against their query budgets.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--projects', type=int, default=100)
+        parser.add_argument('--tasks', type=int, default=50, help='Tasks per project.')
+        parser.add_argument('--fanout', type=int, default=5, help='Members per project.')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed requests per endpoint.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--only', action='append', help='Benchmark only this endpoint (repeatable).')
+        parser.add_argument('--asgi', action='store_true', help='Send the requests through the ASGI handler.')
+        parser.add_argument('-o', '--output', help='Write the results to this JSON file.')
+        parser.add_argument('--compare', help='Print the change against an earlier JSON result file.')
+        parser.add_argument('--keepdb', action='store_true', help='Keep the benchmark database afterwards.')
+
+    def handle(self, *args, **options):
+        endpoints = benchmark.ENDPOINTS
+        if options['only']:
+            endpoints = [endpoint for endpoint in endpoints if endpoint[0] in options['only']]
+            unknown = set(options['only']) - {endpoint[0] for endpoint in endpoints}
+            if unknown:
+                raise CommandError(f'Unknown endpoint(s): {", ".join(sorted(unknown))}.')
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as handle:
+                    baseline = json.load(handle)['results']
+            except (OSError, ValueError, KeyError) as exc:
+                raise CommandError(f'Cannot read {options["compare"]}: {exc}')
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            context = benchmark.generate(
+                users=options['users'], projects=options['projects'], tasks_per_project=options['tasks'],
+                fanout=options['fanout'], seed=options['seed'],
+            )
+            results = benchmark.run(context, endpoints, repeat=options['repeat'], asgi=options['asgi'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        for r in results:
+            flag = self.style.ERROR(' OVER BUDGET') if r['over_budget'] else ''
+            self.stdout.write(f'{r["name"]:<28} {r["status"]} {r["p50_ms"]:>8.2f}ms p50 {r["p95_ms"]:>8.2f}ms p95 '
+                              f'{r["rps"]:>7} req/s {r["queries"]:>3}/{r["budget"]} queries{flag}')
+        if baseline is not None:
+            self.stdout.write(f'\nAgainst {options["compare"]}:')
+            for name, ratio, delta in benchmark.compare(results, baseline):
+                self.stdout.write(f'{name:<28} p50 x{ratio:.2f} queries {delta:+d}' if ratio else f'{name:<28} queries {delta:+d}')
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump({
+                    'created_at': timezone.now().isoformat(),
+                    'vendor': connection.vendor,
+                    'python': platform.python_version(),
+                    'dataset': {key: options[key] for key in ('users', 'projects', 'tasks', 'fanout', 'seed')},
+                    'handler': 'asgi' if options['asgi'] else 'wsgi',
+                    'repeat': options['repeat'],
+                    'results': results,
+                }, handle, indent=2)
+        over = [r['name'] for r in results if r['over_budget']]
+        if over:
+            raise CommandError(f'Query budget exceeded by: {", ".join(over)}.')
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from projects import export
+from projects.models import Project, Task
+
+
+class Command(BaseCommand):
+    help = 'Stream tasks (or projects) as CSV or NDJSON to a file or stdout, in constant memory.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(export.CONTENT_TYPES), default='csv')
+        parser.add_argument('--projects', action='store_true', help='Export projects instead of tasks.')
+        parser.add_argument('--project', help='Project id.')
+        parser.add_argument('--status')
+        parser.add_argument('--assignee', help='User id or username (tasks only).')
+        parser.add_argument('--output', '-o', help='File to write (default: stdout).')
+        parser.add_argument('--chunk-size', type=int, default=export.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        if options['projects']:
+            queryset, apply_filters = Project.objects.all(), export.filter_projects
+        else:
+            # Like the projects themselves, tasks of soft-deleted projects are gone as far as users can tell.
+            queryset, apply_filters = Task.objects.filter(project__deleted_at__isnull=True), export.filter_tasks
+        try:
+            queryset = apply_filters(queryset, options['project'], options['status'], options['assignee'])
+            chunks = export.encode(queryset, options['format'], chunk_size=options['chunk_size'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        if not options['output']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+        with open(options['output'], 'w', newline='', encoding='utf-8') as out:
+            for chunk in chunks:
+                out.write(chunk)
@@ -0,0 +1,50 @@
+import io
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from projects.importer import TYPES, Importer, read_records
+
+
+class Command(BaseCommand):
+    help = 'Import projects, memberships and tasks from a CSV or NDJSON file (or - for stdin) in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to read, or - for stdin.')
+        parser.add_argument('--format', choices=['csv', 'ndjson'], help='Default: from the file extension.')
+        parser.add_argument('--type', choices=TYPES, help='Record type for rows without a "type" field.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--copy', action='store_true', help='Insert tasks with COPY (Postgres only).')
+        parser.add_argument('--max-errors', type=int, default=20, help='How many invalid rows to print.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+        importer = Importer(batch_size=options['batch_size'], use_copy=options['copy'], default_type=options['type'])
+        if options['copy'] and not importer.use_copy:
+            self.stderr.write('COPY needs Postgres; using bulk_create.')
+        started = time.monotonic()
+
+        def progress(importer):
+            rows = sum(importer.counts[key] for key in ('projects', 'memberships', 'tasks', 'errors'))
+            rate = rows / max(time.monotonic() - started, 1e-9)
+            self.stderr.write(f'{rows} rows ({self.summary(importer)}), {rate:,.0f} rows/s')
+
+        try:
+            stream = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', newline='') if path == '-' else \
+                open(path, encoding='utf-8', newline='')
+            with stream:
+                importer.run(read_records(stream, fmt), progress=progress)
+        except OSError as exc:
+            raise CommandError(str(exc))
+        for line, errors in importer.errors[:options['max_errors']]:
+            self.stderr.write(f'line {line}: ' + '; '.join(f'{field}: {" ".join(msgs)}' for field, msgs in errors.items()))
+        if len(importer.errors) > options['max_errors']:
+            self.stderr.write(f'... and {len(importer.errors) - options["max_errors"]} more invalid rows.')
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'Imported {self.summary(importer)} in {elapsed:.1f}s.'))
+
+    def summary(self, importer):
+        counts = importer.counts
+        return ', '.join(f'{counts[key]} {key}' for key in ('projects', 'memberships', 'tasks', 'errors'))
@@ -0,0 +1,19 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from projects import sync
+
+
+class Command(BaseCommand):
+    help = 'Delete sync change-log entries older than --days; clients with older cursors must resync in full.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            deleted = sync.prune(timezone.now() - timedelta(days=options['days']))
+        self.stdout.write(self.style.SUCCESS(f'Pruned {deleted} change-log entries.'))
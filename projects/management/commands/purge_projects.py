@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from projects import purge
+
+
+class Command(BaseCommand):
+    help = ('Delete the rows of soft-deleted projects in small batches. Safe to interrupt: '
+            'the next run resumes where this one stopped.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Rows per DELETE (default PROJECT_PURGE_BATCH_SIZE).')
+        parser.add_argument('--max-seconds', type=float, default=None, help='Start no new project after this long.')
+
+    def handle(self, *args, **options):
+        done = purge.purge(batch_size=options['batch_size'], max_seconds=options['max_seconds'])
+        for progress in done:
+            if progress is not None:
+                self.stdout.write(f'Project {progress.project_id}: {progress.tasks_deleted} tasks, '
+                                  f'{progress.memberships_deleted} memberships.')
+        left = len(purge.pending())
+        self.stdout.write(self.style.SUCCESS(f'Purged {len(done)} project(s); {left} left.'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+
+from projects import search
+
+
+class Command(BaseCommand):
+    help = 'Recreate the project/task full-text search index from the current rows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        with transaction.atomic(using=connection.alias):
+            search.install(connection)
+            search.rebuild(connection)
+        self.stdout.write(self.style.SUCCESS(f'Search index rebuilt ({type(search.get_backend(connection.alias)).__name__}).'))
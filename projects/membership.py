@@ -0,0 +1,91 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import ProjectMembership
+
+ROLE_CACHE_KEY = 'projects:roles:{user_id}'
+
+
+def _role_cache_timeout():
+    return getattr(settings, 'PROJECT_ROLE_CACHE_TIMEOUT', 0)
+
+
+def load_roles(user):
+    """Return ``{project_id: role}`` for every project the user belongs to.
+
+    When ``PROJECT_ROLE_CACHE_TIMEOUT`` is set the map is shared between
+    requests through the cache framework and dropped whenever one of the
+    user's memberships changes (see ``projects.signals``).
+    """
+    timeout = _role_cache_timeout()
+    key = ROLE_CACHE_KEY.format(user_id=user.pk)
+    if timeout:
+        roles = cache.get(key)
+        if roles is not None:
+            return roles
+    roles = dict(ProjectMembership.objects.filter(user=user, project__deleted_at__isnull=True).values_list('project_id', 'role'))
+    if timeout:
+        cache.set(key, roles, timeout)
+    return roles
+
+
+def invalidate_roles(user_id):
+    if _role_cache_timeout():
+        cache.delete(ROLE_CACHE_KEY.format(user_id=user_id))
+
+
+class MembershipResolver:
+    """Answers "what is this user's role in project X" for the lifetime of a request.
+
+    The full role map is loaded lazily with a single query; views that already
+    know a role (e.g. from a joined query) can ``prime`` it to skip that query.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self._roles = None
+        self._known = {}
+
+    @classmethod
+    def for_request(cls, request):
+        # DRF wraps the HttpRequest; keep one resolver on the underlying object
+        # so mixins, permissions and views all share it.
+        request = getattr(request, '_request', request)
+        resolver = getattr(request, '_membership_resolver', None)
+        if resolver is None or resolver.user is not request.user:
+            resolver = cls(request.user)
+            request._membership_resolver = resolver
+        return resolver
+
+    @property
+    def roles(self):
+        if self._roles is None:
+            if self.user is None or not self.user.is_authenticated:
+                self._roles = {}
+            else:
+                self._roles = load_roles(self.user)
+        return self._roles
+
+    def prime(self, project_id, role):
+        self._known[int(project_id)] = role
+
+    def forget(self):
+        self._roles = None
+        self._known.clear()
+
+    def role(self, project_id):
+        if project_id is None:
+            return None
+        project_id = int(project_id)
+        if project_id in self._known:
+            return self._known[project_id]
+        return self.roles.get(project_id)
+
+    def is_member(self, project_id):
+        return self.role(project_id) is not None
+
+    def is_owner(self, project_id):
+        return self.role(project_id) == ProjectMembership.Role.OWNER
+
+    def project_ids(self):
+        return list(self.roles)
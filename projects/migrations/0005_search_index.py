@@ -0,0 +1,30 @@
+from django.db import migrations
+
+
+def install_search_index(apps, schema_editor):
+    from projects import search
+    search.install(schema_editor.connection)
+    if schema_editor.connection.vendor == 'sqlite':
+        search.rebuild(schema_editor.connection)
+
+
+def remove_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        for table in ('projects_project', 'projects_task'):
+            if connection.vendor == 'postgresql':
+                cursor.execute(f'DROP INDEX IF EXISTS {table}_search_idx')
+                cursor.execute(f'ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector')
+            elif connection.vendor == 'sqlite':
+                cursor.execute(f'DROP TABLE IF EXISTS {table}_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0004_keyset_pagination_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_index, remove_search_index),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+
+# Frozen copies of projects.stats' counters: the backfill must use the models as of this migration.
+STATUS_FIELDS = {'TODO': 'todo', 'IN_PROGRESS': 'in_progress', 'BLOCKED': 'blocked', 'DONE': 'done'}
+PRIORITY_FIELDS = {1: 'low_priority', 2: 'medium_priority', 3: 'high_priority'}
+
+
+def fill_project_stats(apps, schema_editor):
+    Project = apps.get_model('projects', 'Project')
+    ProjectStats = apps.get_model('projects', 'ProjectStats')
+    today = timezone.localdate()
+    counters = {field: Count('tasks', filter=Q(tasks__status=status)) for status, field in STATUS_FIELDS.items()}
+    counters.update({field: Count('tasks', filter=Q(tasks__priority=priority)) for priority, field in PRIORITY_FIELDS.items()})
+    rows = Project.objects.order_by('pk').values('pk').annotate(
+        **counters,
+        overdue=Count('tasks', filter=Q(tasks__due_date__lt=today) & ~Q(tasks__status='DONE')),
+        last_activity_at=Max('tasks__updated_at'),
+    )
+    batch = []
+    for row in rows.iterator(chunk_size=1000):
+        batch.append(ProjectStats(project_id=row.pop('pk'), overdue_on=today, **row))
+        if len(batch) >= 1000:
+            ProjectStats.objects.bulk_create(batch)
+            batch = []
+    ProjectStats.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0005_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectStats',
+            fields=[
+                ('project', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='projects.project')),
+                ('todo', models.PositiveIntegerField(default=0)),
+                ('in_progress', models.PositiveIntegerField(default=0)),
+                ('blocked', models.PositiveIntegerField(default=0)),
+                ('done', models.PositiveIntegerField(default=0)),
+                ('low_priority', models.PositiveIntegerField(default=0)),
+                ('medium_priority', models.PositiveIntegerField(default=0)),
+                ('high_priority', models.PositiveIntegerField(default=0)),
+                ('overdue', models.PositiveIntegerField(default=0)),
+                ('overdue_on', models.DateField(blank=True, help_text='Day the overdue count was computed for', null=True)),
+                ('last_activity_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'project stats',
+            },
+        ),
+        migrations.RunPython(fill_project_stats, migrations.RunPython.noop),
+    ]
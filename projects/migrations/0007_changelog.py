@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0006_project_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(blank=True, choices=[('project', 'Project'), ('task', 'Task'), ('membership', 'Membership')], max_length=20)),
+                ('op', models.CharField(choices=[('upsert', 'Created or updated'), ('delete', 'Deleted'), ('pruned', 'Older entries pruned')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('project_id', models.BigIntegerField(blank=True, null=True)),
+                ('user_id', models.BigIntegerField(blank=True, help_text='Member, for membership entries', null=True)),
+                ('changed_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['project_id', 'id'], name='changelog_project_id_idx'), models.Index(fields=['user_id', 'id'], name='changelog_user_id_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def install_prefix_index(apps, schema_editor):
+    from projects import users
+    users.install_prefix_index(schema_editor.connection)
+
+
+def remove_prefix_index(apps, schema_editor):
+    from projects import users
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'DROP INDEX IF EXISTS {users.User._meta.db_table}_username_prefix_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('projects', '0007_changelog'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_prefix_index, remove_prefix_index),
+    ]
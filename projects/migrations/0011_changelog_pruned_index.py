@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0010_activity'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='changelog',
+            index=models.Index(condition=models.Q(('op', 'pruned')), fields=['object_id'], name='changelog_pruned_idx'),
+        ),
+    ]
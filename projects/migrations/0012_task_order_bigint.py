@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0011_changelog_pruned_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='task',
+            name='order',
+            field=models.PositiveBigIntegerField(default=0, help_text='Position within its status column'),
+        ),
+    ]
@@ -1,11 +1,43 @@
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.db.models import Exists, OuterRef, Q
 from django.urls import reverse
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 
 User = settings.AUTH_USER_MODEL
 
-class Project(models.Model):
+class LoadedValuesMixin:
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Values as loaded, so save signals can tell what changed (see projects.stats and projects.activity).
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+class ProjectQuerySet(models.QuerySet):
+    def visible_to(self, user):
+        """Projects the user is a member of, as an EXISTS filter (no join, no DISTINCT)."""
+        if not user.is_authenticated:
+            return self.none()
+        return self.filter(Exists(ProjectMembership.objects.filter(project=OuterRef('pk'), user=user.pk)))
+
+class ProjectManager(models.Manager.from_queryset(ProjectQuerySet)):
+    """Leaves out soft-deleted projects (see projects.purge); ``Project.all_objects`` keeps them."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+class TaskQuerySet(models.QuerySet):
+    def visible_to(self, user):
+        if not user.is_authenticated:
+            return self.none()
+        return self.filter(Exists(ProjectMembership.objects.filter(
+            project=OuterRef('project_id'), user=user.pk, project__deleted_at__isnull=True,
+        )))
+
+class Project(LoadedValuesMixin, models.Model):
     class Status(models.TextChoices):
         PLANNED = 'PLANNED', 'Planned'
         IN_PROGRESS = 'IN_PROGRESS', 'In Progress'
@@ -22,10 +54,19 @@ class Project(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False, help_text='Set when deleted; purged later')
+
+    objects = ProjectManager()
+    all_objects = ProjectQuerySet.as_manager()
 
     class Meta:
         constraints = [
-            models.UniqueConstraint(fields=['owner', 'name'], name='unique_project_name_per_owner'),
+            models.UniqueConstraint(fields=['owner', 'name'], condition=Q(deleted_at__isnull=True),
+                                    name='unique_project_name_per_owner'),
+        ]
+        indexes = [
+            models.Index(fields=['-updated_at', '-id'], name='project_updated_id_idx'),
+            models.Index(fields=['deleted_at'], condition=Q(deleted_at__isnull=False), name='project_deleted_idx'),
         ]
         ordering = ['-updated_at']
 
@@ -39,7 +80,7 @@ class Project(models.Model):
     def get_absolute_url(self):
         return reverse('projects:project_detail', args=[self.pk])
 
-class ProjectMembership(models.Model):
+class ProjectMembership(LoadedValuesMixin, models.Model):
     class Role(models.TextChoices):
         OWNER = 'OWNER', 'Owner'
         MEMBER = 'MEMBER', 'Member'
@@ -51,11 +92,14 @@ class ProjectMembership(models.Model):
 
     class Meta:
         unique_together = ('project', 'user')
+        indexes = [
+            models.Index(fields=['user', 'project'], name='membership_user_project_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user} @ {self.project} ({self.role})"
 
-class Task(models.Model):
+class Task(LoadedValuesMixin, models.Model):
     class Status(models.TextChoices):
         TODO = 'TODO', 'To Do'
         IN_PROGRESS = 'IN_PROGRESS', 'In Progress'
@@ -74,12 +118,17 @@ class Task(models.Model):
     priority = models.IntegerField(choices=Priority.choices, default=Priority.MEDIUM)
     due_date = models.DateField(null=True, blank=True)
     assignee = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='tasks')
-    order = models.PositiveIntegerField(default=0, help_text='Position within its status column')
+    order = models.PositiveBigIntegerField(default=0, help_text='Position within its status column')
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = TaskQuerySet.as_manager()
+
     class Meta:
+        indexes = [
+            models.Index(fields=['project', 'status', 'order'], name='task_project_status_order_idx'),
+        ]
         ordering = ['status', 'order', '-updated_at']
 
     def __str__(self):
@@ -87,3 +136,106 @@ class Task(models.Model):
 
     def get_absolute_url(self):
         return reverse('projects:task_detail', args=[self.pk])
+
+class ProjectStats(models.Model):
+    """Denormalized task counters for a project, kept current by projects.stats."""
+    project = models.OneToOneField(Project, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    todo = models.PositiveIntegerField(default=0)
+    in_progress = models.PositiveIntegerField(default=0)
+    blocked = models.PositiveIntegerField(default=0)
+    done = models.PositiveIntegerField(default=0)
+    low_priority = models.PositiveIntegerField(default=0)
+    medium_priority = models.PositiveIntegerField(default=0)
+    high_priority = models.PositiveIntegerField(default=0)
+    overdue = models.PositiveIntegerField(default=0)
+    overdue_on = models.DateField(null=True, blank=True, help_text='Day the overdue count was computed for')
+    last_activity_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = 'project stats'
+
+    def __str__(self):
+        return f"Stats for {self.project_id}"
+
+    @property
+    def total(self):
+        return self.todo + self.in_progress + self.blocked + self.done
+
+    @property
+    def open(self):
+        return self.total - self.done
+
+    @property
+    def progress(self):
+        """Percentage of tasks done."""
+        return round(100 * self.done / self.total) if self.total else 0
+
+class ChangeLog(models.Model):
+    """One row per created/updated/deleted project, task or membership; the id is the sync cursor."""
+    class Kind(models.TextChoices):
+        PROJECT = 'project', 'Project'
+        TASK = 'task', 'Task'
+        MEMBERSHIP = 'membership', 'Membership'
+
+    class Op(models.TextChoices):
+        UPSERT = 'upsert', 'Created or updated'
+        DELETE = 'delete', 'Deleted'
+        PRUNED = 'pruned', 'Older entries pruned'
+
+    kind = models.CharField(max_length=20, choices=Kind.choices, blank=True)
+    op = models.CharField(max_length=10, choices=Op.choices)
+    object_id = models.BigIntegerField()
+    # Plain ids rather than foreign keys: entries outlive the rows they describe.
+    project_id = models.BigIntegerField(null=True, blank=True)
+    user_id = models.BigIntegerField(null=True, blank=True, help_text='Member, for membership entries')
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['project_id', 'id'], name='changelog_project_id_idx'),
+            models.Index(fields=['user_id', 'id'], name='changelog_user_id_idx'),
+            # The few prune markers, checked on every sync call.
+            models.Index(fields=['object_id'], condition=Q(op='pruned'), name='changelog_pruned_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.pk} {self.op} {self.kind} {self.object_id}"
+
+class ProjectPurge(models.Model):
+    """Progress of purging a soft-deleted project's rows (see projects.purge)."""
+    project_id = models.BigIntegerField(unique=True)  # plain id: the entry outlives the project
+    deleted_at = models.DateTimeField()
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    tasks_deleted = models.PositiveIntegerField(default=0)
+    memberships_deleted = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Purge of project {self.project_id}"
+
+class Activity(models.Model):
+    """Append-only audit entry: who created, changed or deleted a project, task or membership (see projects.activity)."""
+    class Action(models.TextChoices):
+        CREATED = 'created', 'Created'
+        UPDATED = 'updated', 'Updated'
+        DELETED = 'deleted', 'Deleted'
+
+    kind = models.CharField(max_length=20, choices=ChangeLog.Kind.choices)
+    action = models.CharField(max_length=10, choices=Action.choices)
+    # Plain ids rather than foreign keys: entries outlive the rows and users they describe.
+    object_id = models.BigIntegerField()
+    project_id = models.BigIntegerField()
+    actor_id = models.BigIntegerField(null=True, blank=True)
+    changes = models.JSONField(default=dict, encoder=DjangoJSONEncoder, help_text='{field: [old, new]}')
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name_plural = 'activity'
+        indexes = [
+            models.Index(fields=['kind', 'object_id', '-id'], name='activity_object_idx'),
+            models.Index(fields=['project_id', '-id'], name='activity_project_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.action} {self.kind} {self.object_id}"
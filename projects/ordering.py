@@ -0,0 +1,120 @@
+"""Gap-based ordering of tasks inside a board column.
+
+Tasks in a column are sorted by ``(order, id)``. Orders are spaced ``ORDER_GAP``
+apart, so moving a task between two neighbours is a single UPDATE to the
+midpoint of their keys. When two neighbours have no room left between them
+(or share a key after concurrent moves) the column is renumbered once in bulk.
+"""
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Max, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Task
+from .signals import tasks_bulk_changed
+
+ORDER_GAP = 1024
+
+
+def _column(project_id, status, exclude_pk=None):
+    qs = Task.objects.filter(project_id=project_id, status=status)
+    if exclude_pk is not None:
+        qs = qs.exclude(pk=exclude_pk)
+    return qs.order_by('order', 'id')
+
+
+def _anchor(column, pk, field):
+    try:
+        return column.select_for_update().values_list('id', 'order').get(pk=pk)
+    except (Task.DoesNotExist, ValueError, TypeError):
+        raise ValidationError({field: 'Must be another task in the target column.'})
+
+
+def _after(column, anchor):
+    pk, order = anchor
+    return column.filter(Q(order__gt=order) | Q(order=order, id__gt=pk)).values_list('id', 'order').first()
+
+
+def _before(column, anchor):
+    pk, order = anchor
+    return column.filter(Q(order__lt=order) | Q(order=order, id__lt=pk)).order_by('-order', '-id') \
+        .values_list('id', 'order').first()
+
+
+def _between(lower, upper):
+    """A free key strictly between two neighbour keys, or ``None`` when the column needs rebalancing."""
+    if upper is None:
+        return (lower or 0) + ORDER_GAP
+    if lower is None:
+        return upper // 2 if upper > 0 else None
+    middle = (lower + upper) // 2
+    return middle if lower < middle < upper else None
+
+
+def next_order_expression(project_id, status, exclude_pk=None):
+    """``MAX(order) + ORDER_GAP`` of a column as a subquery, for use inside an UPDATE."""
+    max_order = _column(project_id, status, exclude_pk).order_by().values('project_id').annotate(m=Max('order')).values('m')
+    return Coalesce(Subquery(max_order), Value(0)) + ORDER_GAP
+
+
+def rebalance_column(project_id, status, insert=None, after_pk=None, before_pk=None):
+    """Renumber a column ``ORDER_GAP`` apart, optionally placing ``insert`` after/before a neighbour.
+
+    Returns the order given to ``insert``; the caller persists that row itself.
+    """
+    rows = list(_column(project_id, status, exclude_pk=insert.pk if insert else None).select_for_update().only('id', 'order'))
+    if insert is not None:
+        keys = [row.pk for row in rows]
+        if after_pk is not None:
+            position = keys.index(after_pk) + 1
+        elif before_pk is not None:
+            position = keys.index(before_pk)
+        else:
+            position = len(rows)
+        rows.insert(position, insert)
+    changed = []
+    for index, row in enumerate(rows, start=1):
+        if row.order != index * ORDER_GAP:
+            row.order = index * ORDER_GAP
+            changed.append(row)
+    Task.objects.bulk_update([row for row in changed if row is not insert], ['order'], batch_size=500)
+    return insert.order if insert is not None else None
+
+
+def move_task(task, status=None, before_id=None, after_id=None):
+    """Move ``task`` into ``status`` before/after a neighbour, or to the end of the column.
+
+    Updates ``task`` in place and returns it.
+    """
+    status = status or task.status
+    if status not in Task.Status.values:
+        raise ValidationError({'status': 'Unknown status.'})
+    now = timezone.now()
+    previous = {'status': task.status, 'order': task.order}
+    column = _column(task.project_id, status, exclude_pk=task.pk)
+    with transaction.atomic():
+        if before_id in (None, '') and after_id in (None, ''):
+            Task.objects.filter(pk=task.pk).update(
+                status=status, order=next_order_expression(task.project_id, status, task.pk), updated_at=now,
+            )
+            task.refresh_from_db(fields=['order'])
+        else:
+            if after_id not in (None, ''):
+                lower = _anchor(column, after_id, 'after_id')
+                upper = _anchor(column, before_id, 'before_id') if before_id not in (None, '') else _after(column, lower)
+            else:
+                upper = _anchor(column, before_id, 'before_id')
+                lower = _before(column, upper)
+            order = _between(lower and lower[1], upper and upper[1])
+            if order is None:
+                order = rebalance_column(
+                    task.project_id, status, insert=task,
+                    after_pk=lower[0] if lower else None, before_pk=None if lower else upper[0],
+                )
+            Task.objects.filter(pk=task.pk).update(status=status, order=order, updated_at=now)
+            task.order = order
+        task.status = status
+        task.updated_at = now
+        tasks_bulk_changed.send(sender=Task, created=[], updated=[task], previous={task.pk: previous})
+    return task
@@ -0,0 +1,312 @@
+import base64
+import json
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, FieldError, ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import F, Q
+from django.http import Http404
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(direction, values):
+    raw = json.dumps([direction, values], default=lambda v: v.isoformat(), separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        direction, values = json.loads(raw)
+    except (TypeError, ValueError):
+        raise InvalidCursor(cursor)
+    if direction not in ('n', 'p') or not isinstance(values, list):
+        raise InvalidCursor(cursor)
+    return direction, values
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """Cursor pagination over a unique composite ordering such as ``('-updated_at', '-id')``.
+
+    Pages are fetched with a ``WHERE (key) > (cursor)`` style filter instead of
+    OFFSET, so page N costs the same as page 1 and no ``COUNT(*)`` is needed.
+    Nullable keys sort last in both directions. Cursor values are converted with
+    the key fields' ``to_python``, so a tampered cursor raises ``InvalidCursor``.
+    """
+
+    def __init__(self, queryset, ordering, per_page):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.keys = []
+        self.fields = []
+        for name in ordering:
+            descending = name.startswith('-')
+            name = name.lstrip('-')
+            field = self._field(queryset, name)
+            self.keys.append((name, descending, field is not None and field.null))
+            self.fields.append(field)
+
+    @staticmethod
+    def _field(queryset, name):
+        """The model field or annotation output field behind an ordering key, if it can be told."""
+        try:
+            return queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            pass
+        try:
+            return queryset.query.annotations[name].output_field
+        except (KeyError, FieldError):
+            return None
+
+    def _to_python(self, values, cursor):
+        try:
+            return [value if value is None or field is None else field.to_python(value)
+                    for field, value in zip(self.fields, values)]
+        except (ValidationError, TypeError, ValueError):
+            raise InvalidCursor(cursor)
+
+    def _order_by(self, reverse=False):
+        ordering = []
+        for name, descending, nullable in self.keys:
+            if reverse:
+                descending = not descending
+            if nullable:
+                nulls = {'nulls_first': True} if reverse else {'nulls_last': True}
+                ordering.append(F(name).desc(**nulls) if descending else F(name).asc(**nulls))
+            else:
+                ordering.append(f'-{name}' if descending else name)
+        return ordering
+
+    def _beyond(self, name, descending, nullable, value, forward):
+        """Rows strictly past ``value`` on a single key in the requested direction."""
+        if value is None:
+            # NULLs sort last: nothing comes after them, every non-null comes before.
+            return Q(pk__in=[]) if forward else Q(**{f'{name}__isnull': False})
+        lookup = 'lt' if descending == forward else 'gt'
+        q = Q(**{f'{name}__{lookup}': value})
+        if nullable and forward:
+            q |= Q(**{f'{name}__isnull': True})
+        return q
+
+    def _filter(self, values, forward):
+        condition = Q(pk__in=[])
+        equal = Q()
+        for (name, descending, nullable), value in zip(self.keys, values):
+            condition |= equal & self._beyond(name, descending, nullable, value, forward)
+            equal &= Q(**{f'{name}__isnull': True}) if value is None else Q(**{name: value})
+        return condition
+
+    def key_for(self, obj):
+        return [getattr(obj, name) for name, _, _ in self.keys]
+
+    def _query(self, cursor):
+        direction, values = decode_cursor(cursor) if cursor else ('n', None)
+        if values is not None:
+            if len(values) != len(self.keys):
+                raise InvalidCursor(cursor)
+            values = self._to_python(values, cursor)
+        forward = direction == 'n'
+        qs = self.queryset.order_by(*self._order_by(reverse=not forward))
+        if values is not None:
+            qs = qs.filter(self._filter(values, forward))
+        return qs[:self.per_page + 1], values, forward
+
+    def _page(self, rows, values, forward):
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not forward:
+            rows.reverse()
+        has_next = has_more if forward else True
+        has_previous = values is not None if forward else has_more
+        return KeysetPage(
+            rows,
+            next_cursor=encode_cursor('n', self.key_for(rows[-1])) if rows and has_next else None,
+            previous_cursor=encode_cursor('p', self.key_for(rows[0])) if rows and has_previous else None,
+        )
+
+    def page(self, cursor=None):
+        qs, values, forward = self._query(cursor)
+        rows = list(qs)
+        if not forward and not rows:
+            return self.page()
+        return self._page(rows, values, forward)
+
+    async def apage(self, cursor=None):
+        qs, values, forward = self._query(cursor)
+        rows = [row async for row in qs]
+        if not forward and not rows:
+            return await self.apage()
+        return self._page(rows, values, forward)
+
+
+def keyset_ordering_for(ordering):
+    """Append an ``id`` tie-breaker so the ordering is unique."""
+    ordering = tuple(ordering)
+    if ordering and ordering[-1].lstrip('-') in ('id', 'pk'):
+        return ordering
+    return ordering + (('-id',) if ordering and ordering[0].startswith('-') else ('id',))
+
+
+def default_keyset_ordering(queryset, ordering):
+    """``ordering`` with a tie-breaker, or relevance for ranked search results (see ``projects.search``)."""
+    if 'search_rank' in queryset.query.annotations:
+        return ('-search_rank', '-id')
+    return keyset_ordering_for(ordering)
+
+
+class KeysetPaginationMixin:
+    """ListView counterpart of ``KeysetPagination``; set ``keyset_ordering`` on the view."""
+    keyset_ordering = ('-id',)
+    cursor_kwarg = 'cursor'
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, default_keyset_ordering(queryset, self.keyset_ordering), page_size)
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        except InvalidCursor:
+            raise Http404('Invalid cursor.')
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        params = self.request.GET.copy()
+        params.pop(self.cursor_kwarg, None)
+        ctx['page_query'] = params.urlencode()
+        return ctx
+
+
+class KeysetPagination(BasePagination):
+    """DRF pagination backed by ``KeysetPaginator``.
+
+    Views declare their default key with ``keyset_ordering``; an ``?ordering=``
+    accepted by ``OrderingFilter`` takes precedence and gets an ``id`` tie-breaker.
+    Ranked search results without an explicit ordering go by relevance.
+    """
+    page_size = 50
+    max_page_size = 500
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    ordering = ('-id',)
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_ordering(self, request, queryset, view):
+        for backend in getattr(view, 'filter_backends', ()):
+            if issubclass(backend, OrderingFilter) and request.query_params.get(backend.ordering_param):
+                ordering = backend().get_ordering(request, queryset, view)
+                if ordering:
+                    return keyset_ordering_for(ordering)
+        return default_keyset_ordering(queryset, getattr(view, 'keyset_ordering', self.ordering))
+
+    def get_paginator(self, queryset, request, view=None):
+        self.request = request
+        return KeysetPaginator(queryset, self.get_ordering(request, queryset, view), self.get_page_size(request))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        paginator = self.get_paginator(queryset, request, view)
+        try:
+            self.page = paginator.page(request.query_params.get(self.cursor_query_param))
+        except InvalidCursor:
+            raise NotFound('Invalid cursor.')
+        return self.page.object_list
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """``paginate_queryset`` for async views: the page is fetched with the async ORM."""
+        paginator = self.get_paginator(queryset, request, view)
+        try:
+            self.page = await paginator.apage(request.query_params.get(self.cursor_query_param))
+        except InvalidCursor:
+            raise NotFound('Invalid cursor.')
+        return self.page.object_list
+
+    def _link(self, cursor):
+        if cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        return self._link(self.page.next_cursor)
+
+    def get_previous_link(self):
+        return self._link(self.page.previous_cursor)
+
+    def get_paginated_data(self, data):
+        return {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+def estimated_count(queryset):
+    """Row count of ``queryset``, from the query planner on Postgres when it expects many rows.
+
+    Estimates under ``ESTIMATED_COUNT_THRESHOLD`` (and every other database)
+    fall back to an exact ``COUNT(*)``, so small results stay exact.
+    """
+    if connections[queryset.db].vendor != 'postgresql':
+        return queryset.count()
+    plan = json.loads(queryset.order_by().values('pk').explain(format='json'))
+    estimate = int(plan[0]['Plan']['Plan Rows'])
+    if estimate < getattr(settings, 'ESTIMATED_COUNT_THRESHOLD', 10000):
+        return queryset.count()
+    return estimate
+
+
+class EstimatedCountPaginator(Paginator):
+    """Page-number paginator that counts with ``estimated_count``; the last pages may come up short."""
+
+    @cached_property
+    def count(self):
+        return estimated_count(self.object_list)
@@ -1,37 +1,72 @@
 from django.contrib.auth.mixins import UserPassesTestMixin
-from django.shortcuts import get_object_or_404
+from django.db.models import OuterRef, Subquery
+from django.shortcuts import get_object_or_404, redirect
+from .membership import MembershipResolver
 from .models import Project, ProjectMembership, Task
 
 class _BaseProjectAccessMixin(UserPassesTestMixin):
+    """Resolve the view's target object, its project and the caller's role in one query.
+
+    Views say what ``pk`` means through ``model`` (a ``Project`` or a ``Task``);
+    a ``project_pk`` URL kwarg always names the project directly. The loaded
+    object is handed back from ``get_object()`` so the generic view does not
+    fetch it again.
+    """
+    project_url_kwarg = 'project_pk'
+    deny_redirect = None
+    access_object = None
+    project = None
+
+    def _role_subquery(self, project_ref):
+        return Subquery(
+            ProjectMembership.objects.filter(project=OuterRef(project_ref), user=self.request.user.pk)
+            .values('role')[:1]
+        )
+
+    def get_access_queryset(self):
+        if self.model is Task:
+            return Task.objects.filter(project__deleted_at__isnull=True).select_related('project') \
+                .annotate(_access_role=self._role_subquery('project_id'))
+        return Project.objects.annotate(_access_role=self._role_subquery('pk'))
+
     def resolve_project(self):
-        obj = getattr(self, 'object', None)
-        if obj is not None:
-            if hasattr(obj, 'project') and obj.project:
-                return obj.project
-            if isinstance(obj, Project):
-                return obj
-        project_pk = self.kwargs.get('project_pk')
-        if project_pk:
-            return get_object_or_404(Project, pk=project_pk)
-        pk = self.kwargs.get('pk')
-        if pk is not None:
-            try:
-                task = Task.objects.select_related('project').get(pk=pk)
-                return task.project
-            except Task.DoesNotExist:
-                return get_object_or_404(Project, pk=pk)
-        return None
+        if self.project is not None:
+            return self.project
+        project_pk = self.kwargs.get(self.project_url_kwarg)
+        if project_pk is not None:
+            self.project = get_object_or_404(Project.objects.annotate(_access_role=self._role_subquery('pk')), pk=project_pk)
+            role = self.project._access_role
+        else:
+            pk = self.kwargs.get('pk')
+            if pk is None:
+                return None
+            obj = get_object_or_404(self.get_access_queryset(), pk=pk)
+            self.access_object = obj
+            self.project = obj.project if isinstance(obj, Task) else obj
+            role = obj._access_role
+        MembershipResolver.for_request(self.request).prime(self.project.pk, role)
+        return self.project
+
+    def get_object(self, queryset=None):
+        if queryset is None and self.access_object is not None:
+            return self.access_object
+        return super().get_object(queryset)
 
-class OwnerRequiredMixin(_BaseProjectAccessMixin):
     def test_func(self):
+        if not self.request.user.is_authenticated:
+            return False
         project = self.resolve_project()
-        return project is not None and ProjectMembership.objects.filter(
-            project=project, user=self.request.user, role=ProjectMembership.Role.OWNER
-        ).exists()
+        return project is not None and self.has_project_access(MembershipResolver.for_request(self.request), project)
+
+    def handle_no_permission(self):
+        if self.deny_redirect and self.request.user.is_authenticated:
+            return redirect(self.deny_redirect)
+        return super().handle_no_permission()
+
+class OwnerRequiredMixin(_BaseProjectAccessMixin):
+    def has_project_access(self, resolver, project):
+        return resolver.is_owner(project.pk)
 
 class MemberRequiredMixin(_BaseProjectAccessMixin):
-    def test_func(self):
-        project = self.resolve_project()
-        return project is not None and ProjectMembership.objects.filter(
-            project=project, user=self.request.user
-        ).exists()
+    def has_project_access(self, resolver, project):
+        return resolver.is_member(project.pk)
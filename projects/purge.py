@@ -0,0 +1,131 @@
+"""Soft deletion of projects and the purge that removes their rows for good.
+
+``soft_delete`` hides a project with a single UPDATE of ``deleted_at``: the
+default ``Project`` manager, ``visible_to`` and the role map leave it out from
+then on, and members' sync clients get tombstones through membership delete
+entries, as with a cascading delete. ``purge`` later removes the project's tasks
+and memberships with raw ``DELETE ... WHERE id IN (...)`` statements of
+``batch_size`` rows, each batch in its own short transaction, and counts its
+progress in ``ProjectPurge``. Each batch reads the ids still left, so a purge
+that crashed just starts again where it stopped.
+
+It runs from ``manage.py purge_projects`` (e.g. from cron) or, with
+``PROJECT_PURGE_IN_PROCESS``, on a background thread started after each deletion.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import activity, realtime, search, sync, users
+from .board import bump_board_version
+from .membership import invalidate_roles
+from .models import Activity, ChangeLog, Project, ProjectMembership, ProjectPurge, ProjectStats, Task
+
+logger = logging.getLogger(__name__)
+
+
+def _batch_size():
+    return getattr(settings, 'PROJECT_PURGE_BATCH_SIZE', 1000)
+
+
+def soft_delete(project):
+    now = timezone.now()
+    with transaction.atomic():
+        Project.all_objects.filter(pk=project.pk).update(deleted_at=now)
+        memberships = list(project.memberships.only('id', 'project_id', 'user_id'))
+        sync.record([project, *memberships], ChangeLog.Op.DELETE)
+        activity.record([project], Activity.Action.DELETED)
+        for user_id in {m.user_id for m in memberships}:
+            invalidate_roles(user_id)
+        users.invalidate_candidates([project.pk])
+        realtime.publish_on_commit([(project.pk, {'op': 'reload'})])
+        transaction.on_commit(lambda: bump_board_version(project.pk))
+        transaction.on_commit(schedule)
+    project.deleted_at = now
+
+
+def _delete_rows(model, ids):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {model._meta.db_table} WHERE {model._meta.pk.column} IN ({", ".join(["%s"] * len(ids))})', ids,
+        )
+        return cursor.rowcount
+
+
+def purge_project(project_id, batch_size=None):
+    """Delete a soft-deleted project and its rows in batches; returns its ``ProjectPurge`` entry."""
+    batch_size = batch_size or _batch_size()
+    deleted_at = Project.all_objects.filter(pk=project_id, deleted_at__isnull=False).values_list('deleted_at', flat=True).first()
+    if deleted_at is None:  # live project, or already purged
+        return ProjectPurge.objects.filter(project_id=project_id).first()
+    progress, _ = ProjectPurge.objects.get_or_create(project_id=project_id, defaults={'deleted_at': deleted_at})
+    for model, counter in ((Task, 'tasks_deleted'), (ProjectMembership, 'memberships_deleted')):
+        while True:
+            with transaction.atomic():
+                ids = list(model.objects.filter(project_id=project_id).order_by('pk').values_list('pk', flat=True)[:batch_size])
+                if not ids:
+                    break
+                deleted = _delete_rows(model, ids)
+                search.remove_objects(model, ids)
+                ProjectPurge.objects.filter(pk=progress.pk).update(**{counter: F(counter) + deleted}, updated_at=timezone.now())
+    with transaction.atomic():
+        ProjectStats.objects.filter(pk=project_id).delete()
+        _delete_rows(Project, [project_id])
+        search.remove_objects(Project, [project_id])
+        ProjectPurge.objects.filter(pk=progress.pk).update(finished_at=timezone.now(), updated_at=timezone.now())
+    progress.refresh_from_db()
+    return progress
+
+
+def pending():
+    """Ids of soft-deleted projects still to purge, oldest deletion first."""
+    return list(Project.all_objects.filter(deleted_at__isnull=False).order_by('deleted_at', 'pk').values_list('pk', flat=True))
+
+
+def purge(batch_size=None, max_seconds=None):
+    """Purge every soft-deleted project, stopping between projects after ``max_seconds``."""
+    started = time.monotonic()
+    done = []
+    for project_id in pending():
+        if max_seconds is not None and time.monotonic() - started > max_seconds:
+            break
+        done.append(purge_project(project_id, batch_size))
+    return done
+
+
+_worker = None
+_worker_lock = threading.Lock()
+_wake = threading.Event()
+
+
+def schedule():
+    """Purge in a background thread of this process if ``PROJECT_PURGE_IN_PROCESS`` is set."""
+    global _worker
+    if not getattr(settings, 'PROJECT_PURGE_IN_PROCESS', False):
+        return
+    with _worker_lock:
+        _wake.set()
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run, name='project-purge', daemon=True)
+            _worker.start()
+
+
+def _run():
+    global _worker
+    try:
+        while True:
+            with _worker_lock:
+                if not _wake.is_set():
+                    _worker = None
+                    return
+                _wake.clear()
+            purge()
+    except Exception:
+        logger.exception('Project purge failed; the next deletion or purge_projects run resumes it.')
+    finally:
+        connections.close_all()
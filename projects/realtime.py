@@ -0,0 +1,247 @@
+"""Live board updates pushed to browsers over server-sent events.
+
+Task writes publish a compact event per changed task once their transaction
+commits; ``/projects/<id>/board/events/`` streams the events of one project to
+every open board. Events go through a broker chosen by ``REALTIME_BROKER``:
+``InProcessBroker`` fans out to the streams of this process only, while
+``RedisBroker`` relays through Redis pub/sub so every worker sees every event.
+
+Event payloads (JSON):
+
+``{"op": "upsert", "id", "status", "previous_status", "order", "html"}``
+    a task was created (``previous_status`` is null) or changed; ``html`` is the
+    card with ``CSRF_PLACEHOLDER`` where the viewer's CSRF input goes.
+``{"op": "delete", "id", "status"}``
+``{"op": "reload"}``
+    too much changed at once (bulk writes); clients re-render the board.
+"""
+import asyncio
+import json
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils.functional import SimpleLazyObject
+from django.utils.module_loading import import_string
+from django.utils.safestring import mark_safe
+
+from .board import CSRF_PLACEHOLDER
+from .models import Task
+
+# Bulk writes touching more tasks than this publish one "reload" event instead.
+MAX_TASK_EVENTS = 100
+
+
+class Subscription:
+    """Events of one project for one stream, delivered on the stream's event loop."""
+
+    def __init__(self, broker, project_id, maxsize=256):
+        self.broker = broker
+        self.project_id = project_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+        self.overflowed = False
+
+    def deliver(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A stream that cannot keep up is told to resync rather than buffering without bound.
+            self.overflowed = True
+
+    async def get(self, timeout=None):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+
+    def subscribe(self, project_id):
+        """Start receiving ``project_id``'s events; must be called from the stream's event loop."""
+        subscription = Subscription(self, project_id)
+        with self._lock:
+            self._subscriptions[project_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.project_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.project_id]
+
+    def has_subscribers(self, project_id):
+        return bool(self._subscriptions.get(project_id))
+
+    def publish(self, project_id, event):
+        """Hand ``event`` to every local stream of ``project_id``; safe to call from any thread."""
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(project_id, ()))
+        for subscription in subscriptions:
+            subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+
+
+class RedisBroker(InProcessBroker):
+    """Relays events through Redis pub/sub (``REALTIME_REDIS_URL``) so all workers receive them.
+
+    Workers with open streams keep a ``watched`` key per project alive in Redis
+    (expiring after ``presence_ttl`` seconds unless refreshed), so writers only
+    render and publish events for boards someone is looking at.
+    """
+    channel_prefix = 'projects:board:'
+    presence_prefix = 'projects:board-watched:'
+    presence_ttl = 45
+
+    def __init__(self):
+        super().__init__()
+        import redis
+        self.url = settings.REALTIME_REDIS_URL
+        self.client = redis.Redis.from_url(self.url)
+        self._listeners = {}
+        self._async_clients = {}
+
+    def subscribe(self, project_id):
+        subscription = super().subscribe(project_id)
+        loop = subscription.loop
+        if loop not in self._listeners or self._listeners[loop].done():
+            self._listeners[loop] = loop.create_task(self._listen())
+            loop.create_task(self._heartbeat())
+        loop.create_task(self._announce([project_id]))
+        return subscription
+
+    def has_subscribers(self, project_id):
+        return super().has_subscribers(project_id) or bool(self.client.exists(f'{self.presence_prefix}{project_id}'))
+
+    def publish(self, project_id, event):
+        self.client.publish(f'{self.channel_prefix}{project_id}', json.dumps(event))
+
+    def _async_client(self):
+        import redis.asyncio
+        loop = asyncio.get_running_loop()
+        if loop not in self._async_clients:
+            self._async_clients[loop] = redis.asyncio.Redis.from_url(self.url)
+        return self._async_clients[loop]
+
+    async def _announce(self, project_ids):
+        async with self._async_client().pipeline(transaction=False) as pipe:
+            for project_id in project_ids:
+                pipe.set(f'{self.presence_prefix}{project_id}', 1, ex=self.presence_ttl)
+            await pipe.execute()
+
+    async def _heartbeat(self):
+        """Refresh the presence keys of this process's watched projects while its listener runs."""
+        while not self._listeners[asyncio.get_running_loop()].done():
+            with self._lock:
+                project_ids = list(self._subscriptions)
+            if project_ids:
+                await self._announce(project_ids)
+            await asyncio.sleep(self.presence_ttl / 3)
+
+    async def _listen(self):
+        client = self._async_client()
+        async with client.pubsub() as pubsub:
+            await pubsub.psubscribe(f'{self.channel_prefix}*')
+            async for message in pubsub.listen():
+                if message['type'] == 'pmessage':
+                    project_id = int(message['channel'].decode().rsplit(':', 1)[1])
+                    super().publish(project_id, json.loads(message['data']))
+
+
+def _load_broker():
+    return import_string(getattr(settings, 'REALTIME_BROKER', 'projects.realtime.InProcessBroker'))()
+
+
+broker = SimpleLazyObject(_load_broker)
+
+
+def render_card(task):
+    return render_to_string('projects/board_task.html', {
+        't': task,
+        'status_choices': Task.Status.choices,
+        'csrf_input': mark_safe(CSRF_PLACEHOLDER),
+    })
+
+
+def _upsert(task, previous_status):
+    return task.project_id, {
+        'op': 'upsert', 'id': task.pk, 'status': task.status, 'previous_status': previous_status,
+        'order': task.order, 'html': render_card(task),
+    }
+
+
+def task_events(created=(), updated=(), deleted=(), previous=None):
+    """``(project_id, event)`` pairs for the given task changes.
+
+    ``previous`` maps task ids to old field values, as sent with ``tasks_bulk_changed``.
+    """
+    previous = previous or {}
+    if len(created) + len(updated) + len(deleted) > MAX_TASK_EVENTS:
+        project_ids = {task.project_id for task in [*created, *updated, *deleted]}
+        project_ids |= {values['project_id'] for values in previous.values() if 'project_id' in values}
+        return [(project_id, {'op': 'reload'}) for project_id in project_ids]
+    events = [(task.project_id, {'op': 'delete', 'id': task.pk, 'status': task.status}) for task in deleted]
+    watched = {}
+
+    def has_subscribers(project_id):
+        if project_id not in watched:
+            watched[project_id] = broker.has_subscribers(project_id)
+        return watched[project_id]
+
+    for task in created:
+        if has_subscribers(task.project_id):
+            events.append(_upsert(task, None))
+    for task in updated:
+        old = previous.get(task.pk, {})
+        previous_status = old.get('status', task.status)
+        if old.get('project_id', task.project_id) != task.project_id:
+            events.append((old['project_id'], {'op': 'delete', 'id': task.pk, 'status': previous_status}))
+            previous_status = None
+        if has_subscribers(task.project_id):
+            events.append(_upsert(task, previous_status))
+    return events
+
+
+def publish_on_commit(events):
+    """Publish ``(project_id, event)`` pairs once the current transaction commits."""
+    if events:
+        transaction.on_commit(lambda: [broker.publish(project_id, event) for project_id, event in events])
+
+
+async def event_stream(project_id, keepalive=15, allowed=None):
+    """Server-sent events for ``project_id``: a ``hello`` first, then task events and keepalives.
+
+    ``allowed``, an async callable, is awaited at most every ``keepalive``
+    seconds; once it returns false the stream sends a ``close`` event and ends.
+    """
+    loop = asyncio.get_running_loop()
+    subscription = broker.subscribe(project_id)
+    try:
+        yield 'retry: 3000\nevent: hello\ndata: {}\n\n'
+        checked = loop.time()
+        while True:
+            try:
+                event = await subscription.get(timeout=keepalive)
+            except asyncio.TimeoutError:
+                event = None
+            if allowed is not None and loop.time() - checked >= keepalive:
+                if not await allowed():
+                    yield 'event: close\ndata: {}\n\n'
+                    return
+                checked = loop.time()
+            if event is None:
+                yield ': keepalive\n\n'
+                continue
+            if subscription.overflowed:
+                yield f'data: {json.dumps({"op": "reload"})}\n\n'
+                return
+            yield f'data: {json.dumps(event)}\n\n'
+    finally:
+        subscription.close()
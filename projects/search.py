@@ -0,0 +1,216 @@
+"""Full-text search over projects and tasks.
+
+Postgres keeps a generated ``search_vector`` tsvector column with a GIN index on
+each table; SQLite keeps an FTS5 shadow table per model, synced from the model
+signals in ``projects.signals``. Other databases fall back to ``icontains``.
+Everything goes through ``search()``.
+"""
+import re
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import SearchFilter
+
+from .models import Project, Task
+
+SEARCH_FIELDS = {
+    Project: ('name', 'description'),
+    Task: ('title', 'description'),
+}
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+MAX_TOKENS = 16
+
+
+def tokenize(q):
+    return _TOKEN_RE.findall(q or '')[:MAX_TOKENS]
+
+
+class FallbackSearchBackend:
+    def install(self, connection):
+        pass
+
+    def rebuild(self, connection, model):
+        pass
+
+    def index(self, model, objs, replace=True):
+        pass
+
+    def remove(self, model, pks, using='default'):
+        pass
+
+    def filter(self, queryset, tokens, ranked=False):
+        condition = Q()
+        for token in tokens:
+            condition &= Q(*[Q(**{f'{field}__icontains': token}) for field in SEARCH_FIELDS[queryset.model]], _connector=Q.OR)
+        queryset = queryset.filter(condition)
+        if ranked:
+            queryset = queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+        return queryset
+
+
+class PostgresSearchBackend(FallbackSearchBackend):
+    @property
+    def config(self):
+        return getattr(settings, 'PROJECTS_SEARCH_CONFIG', 'english')
+
+    def install(self, connection):
+        config = self.config
+        with connection.cursor() as cursor:
+            for model, (title, _) in SEARCH_FIELDS.items():
+                table = model._meta.db_table
+                cursor.execute(
+                    f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+                    f"setweight(to_tsvector('{config}', coalesce({title}, '')), 'A') || "
+                    f"setweight(to_tsvector('{config}', coalesce(description, '')), 'B')) STORED"
+                )
+                cursor.execute(f'CREATE INDEX IF NOT EXISTS {table}_search_idx ON {table} USING gin (search_vector)')
+
+    def filter(self, queryset, tokens, ranked=False):
+        table = queryset.model._meta.db_table
+        tsquery = ' & '.join(f'{token}:*' for token in tokens)
+        params = (self.config, tsquery)
+        queryset = queryset.filter(RawSQL(
+            f'{table}.search_vector @@ to_tsquery(%s::regconfig, %s)', params, output_field=BooleanField(),
+        ))
+        if ranked:
+            queryset = queryset.annotate(search_rank=RawSQL(
+                f'ts_rank({table}.search_vector, to_tsquery(%s::regconfig, %s))', params, output_field=FloatField(),
+            )).order_by('-search_rank', '-pk')
+        return queryset
+
+
+class SQLiteSearchBackend(FallbackSearchBackend):
+    @staticmethod
+    def fts_table(model):
+        return f'{model._meta.db_table}_fts'
+
+    def install(self, connection):
+        with connection.cursor() as cursor:
+            for model, fields in SEARCH_FIELDS.items():
+                cursor.execute(
+                    f'CREATE VIRTUAL TABLE IF NOT EXISTS {self.fts_table(model)} '
+                    f"USING fts5({', '.join(fields)}, tokenize='unicode61 remove_diacritics 2')"
+                )
+
+    def rebuild(self, connection, model):
+        fields = ', '.join(SEARCH_FIELDS[model])
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.fts_table(model)}')
+            cursor.execute(
+                f'INSERT INTO {self.fts_table(model)} (rowid, {fields}) '
+                f'SELECT id, {fields} FROM {model._meta.db_table}'
+            )
+
+    def index(self, model, objs, replace=True):
+        fields = SEARCH_FIELDS[model]
+        rows = [(obj.pk, *[getattr(obj, field) for field in fields]) for obj in objs]
+        if not rows:
+            return
+        using = objs[0]._state.db or 'default'
+        if replace:
+            self.remove(model, [row[0] for row in rows], using=using)
+        with connections[using].cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {self.fts_table(model)} (rowid, {', '.join(fields)}) "
+                f"VALUES ({', '.join(['%s'] * (len(fields) + 1))})",
+                rows,
+            )
+
+    def remove(self, model, pks, using='default'):
+        pks = list(pks)
+        with connections[using].cursor() as cursor:
+            for start in range(0, len(pks), 500):
+                chunk = pks[start:start + 500]
+                cursor.execute(
+                    f"DELETE FROM {self.fts_table(model)} WHERE rowid IN ({', '.join(['%s'] * len(chunk))})", chunk,
+                )
+
+    def filter(self, queryset, tokens, ranked=False):
+        fts = self.fts_table(queryset.model)
+        table = queryset.model._meta.db_table
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        queryset = queryset.filter(pk__in=RawSQL(f'SELECT rowid FROM {fts} WHERE {fts} MATCH %s', (match,)))
+        if ranked:
+            queryset = queryset.annotate(search_rank=RawSQL(
+                f'(SELECT -rank FROM {fts} WHERE {fts} MATCH %s AND rowid = {table}.id)', (match,),
+                output_field=FloatField(),
+            )).order_by('-search_rank', '-pk')
+        return queryset
+
+
+_backends = {}
+
+
+def get_backend(using='default'):
+    backend = _backends.get(using)
+    if backend is None:
+        connection = connections[using]
+        if connection.vendor == 'postgresql':
+            backend = PostgresSearchBackend()
+        elif connection.vendor == 'sqlite' and _has_fts5(connection):
+            backend = SQLiteSearchBackend()
+        else:
+            backend = FallbackSearchBackend()
+        _backends[using] = backend
+    return backend
+
+
+def _has_fts5(connection):
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA compile_options')
+            return any('FTS5' in row[0] for row in cursor.fetchall())
+    except DatabaseError:
+        return False
+
+
+def install(connection):
+    get_backend(connection.alias).install(connection)
+
+
+def rebuild(connection, models=None):
+    backend = get_backend(connection.alias)
+    for model in models or SEARCH_FIELDS:
+        backend.rebuild(connection, model)
+
+
+def index_objects(model, objs, replace=True):
+    """Add or refresh rows in the index; ``replace=False`` skips the delete for freshly inserted rows."""
+    objs = list(objs)
+    if model in SEARCH_FIELDS and objs:
+        get_backend(objs[0]._state.db or 'default').index(model, objs, replace=replace)
+
+
+def remove_objects(model, pks, using='default'):
+    if model in SEARCH_FIELDS:
+        get_backend(using).remove(model, pks, using=using)
+
+
+def search(user, q, model=Project, queryset=None, ranked=False):
+    """Projects or tasks visible to ``user`` that match every word of ``q`` (prefix match).
+
+    ``queryset`` narrows an already-scoped queryset instead of starting from
+    ``model.objects.visible_to(user)``; ``ranked`` orders by relevance and adds
+    a ``search_rank`` annotation.
+    """
+    if queryset is None:
+        queryset = model._default_manager.visible_to(user)
+    tokens = tokenize(q)
+    if not tokens:
+        return queryset.none()
+    return get_backend(queryset.db).filter(queryset, tokens, ranked=ranked)
+
+
+class FullTextSearchFilter(SearchFilter):
+    """DRF ``?search=`` backed by ``search()`` for projects and tasks, best matches first unless ``?ordering=`` is given."""
+
+    def filter_queryset(self, request, queryset, view):
+        if queryset.model not in SEARCH_FIELDS:
+            return super().filter_queryset(request, queryset, view)
+        q = request.query_params.get(self.search_param, '')
+        if not q.strip():
+            return queryset
+        return search(request.user, q, queryset=queryset, ranked=True)
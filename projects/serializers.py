@@ -1,15 +1,32 @@
 from django.contrib.auth import get_user_model
+from django.db.models import Prefetch
 from rest_framework import serializers
-from .models import Project, Task, ProjectMembership
+from . import users
+from .models import Activity, Project, ProjectStats, Task, ProjectMembership
 
 User = get_user_model()
 
+class EagerLoadingMixin:
+    """Serializers declare the relations they render; viewsets apply the plan to their queryset."""
+    select_related_fields = ()
+    prefetch_related_fields = ()
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        if cls.select_related_fields:
+            queryset = queryset.select_related(*cls.select_related_fields)
+        if cls.prefetch_related_fields:
+            queryset = queryset.prefetch_related(*cls.prefetch_related_fields)
+        return queryset
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username']
 
-class ProjectMembershipSerializer(serializers.ModelSerializer):
+class ProjectMembershipSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    select_related_fields = ('user',)
+
     user = UserSerializer(read_only=True)
     user_id = serializers.PrimaryKeyRelatedField(queryset=User.objects.all(), source='user', write_only=True)
 
@@ -18,20 +35,72 @@ class ProjectMembershipSerializer(serializers.ModelSerializer):
         fields = ['id', 'project', 'user', 'user_id', 'role', 'added_at']
         read_only_fields = ['id', 'added_at']
 
-class ProjectSerializer(serializers.ModelSerializer):
+class ProjectStatsSerializer(serializers.ModelSerializer):
+    total = serializers.IntegerField(read_only=True)
+    progress = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = ProjectStats
+        fields = ['total', 'todo', 'in_progress', 'blocked', 'done', 'low_priority', 'medium_priority', 'high_priority',
+                  'overdue', 'progress', 'last_activity_at']
+        read_only_fields = fields
+
+class ProjectSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    select_related_fields = ('owner', 'stats')
+    prefetch_related_fields = (
+        Prefetch('memberships', queryset=ProjectMembershipSerializer.setup_eager_loading(ProjectMembership.objects.all())),
+    )
+
     owner = UserSerializer(read_only=True)
     memberships = ProjectMembershipSerializer(many=True, read_only=True)
+    stats = ProjectStatsSerializer(read_only=True)
 
     class Meta:
         model = Project
-        fields = ['id', 'name', 'description', 'status', 'start_date', 'end_date', 'owner', 'memberships', 'created_at', 'updated_at']
+        fields = ['id', 'name', 'description', 'status', 'start_date', 'end_date', 'owner', 'memberships', 'stats', 'created_at', 'updated_at']
         read_only_fields = ['id', 'owner', 'created_at', 'updated_at']
 
-class TaskSerializer(serializers.ModelSerializer):
+class TaskSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    select_related_fields = ('assignee',)
+
     assignee = UserSerializer(read_only=True)
-    assignee_id = serializers.PrimaryKeyRelatedField(queryset=User.objects.all(), source='assignee', write_only=True, allow_null=True, required=False)
+    assignee_id = serializers.IntegerField(write_only=True, allow_null=True, required=False)
 
     class Meta:
         model = Task
         fields = ['id', 'project', 'title', 'description', 'status', 'priority', 'due_date', 'assignee', 'assignee_id', 'order', 'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at']
+
+    def validate(self, attrs):
+        assignee_id = attrs.get('assignee_id')
+        if assignee_id is not None:
+            project_id = attrs['project'].pk if 'project' in attrs else self.instance.project_id
+            if not users.is_candidate(project_id, assignee_id):
+                raise serializers.ValidationError({'assignee_id': ['Not a member of this project.']})
+        return attrs
+
+class ActivitySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Activity
+        fields = ['id', 'kind', 'action', 'object_id', 'project_id', 'actor_id', 'changes', 'created_at']
+        read_only_fields = fields
+
+class BulkTaskSerializer(serializers.ModelSerializer):
+    """Per-item validation for /api/tasks/bulk/.
+
+    Relations are plain ids so validating thousands of items runs no queries;
+    the bulk endpoint checks projects and assignees once for the whole batch.
+    """
+    id = serializers.IntegerField(required=False)
+    project = serializers.IntegerField()
+    assignee_id = serializers.IntegerField(allow_null=True, required=False)
+
+    class Meta:
+        model = Task
+        fields = ['id', 'project', 'title', 'description', 'status', 'priority', 'due_date', 'assignee_id', 'order']
+
+class BulkTaskMoveSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    status = serializers.ChoiceField(choices=Task.Status.choices, required=False)
+    before_id = serializers.IntegerField(required=False, allow_null=True)
+    after_id = serializers.IntegerField(required=False, allow_null=True)
@@ -0,0 +1,176 @@
+from django.db import connections, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from . import activity, realtime, search, stats, sync, users
+from .board import bump_board_version
+from .membership import invalidate_roles
+from .models import Activity, ChangeLog, Project, ProjectMembership, ProjectStats, Task
+
+# Sent (sender=Task) after writes that bypass post_save/post_delete: bulk_create/
+# bulk_update, queryset.update() moves and raw batch deletes. Arguments:
+# ``created``, ``updated`` and ``deleted`` task lists and ``previous``, a
+# {task_id: {attname: old_value}} map of changed fields.
+tasks_bulk_changed = Signal()
+
+# Sent (sender=Project or ProjectMembership) with ``objs`` after a bulk_create of
+# those models, which skips post_save; tasks use tasks_bulk_changed.
+rows_bulk_created = Signal()
+
+
+@receiver([post_save, post_delete], sender=ProjectMembership)
+def membership_changed(sender, instance, **kwargs):
+    invalidate_roles(instance.user_id)
+    users.invalidate_candidates([instance.project_id])
+    _bump_boards_on_commit([instance.project_id])
+
+
+@receiver(post_save, sender=users.User)
+def user_renamed(sender, instance, created=False, update_fields=None, raw=False, **kwargs):
+    # Cached candidate lists carry usernames; last_login updates on every login leave them alone.
+    if not (created or raw) and (update_fields is None or 'username' in update_fields):
+        users.invalidate_user(instance)
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_save, sender=ProjectMembership)
+def log_saved(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    sync.record([instance])
+    if created:
+        activity.record([instance], Activity.Action.CREATED)
+    else:
+        activity.record([instance], previous={instance.pk: getattr(instance, '_loaded_values', {})})
+    _remember_loaded([instance])
+
+
+@receiver(post_delete, sender=Project)
+@receiver(post_delete, sender=ProjectMembership)
+def log_deleted(sender, instance, origin=None, **kwargs):
+    # Memberships removed with their project are logged too: they tell members the project is gone.
+    sync.record([instance], ChangeLog.Op.DELETE)
+    if not (isinstance(origin, Project) and sender is ProjectMembership):
+        activity.record([instance], Activity.Action.DELETED)
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_save, sender=Task)
+def index_for_search(sender, instance, created=False, update_fields=None, raw=False, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and not set(update_fields) & set(search.SEARCH_FIELDS[sender]):
+        return
+    search.index_objects(sender, [instance], replace=not created)
+
+
+@receiver(tasks_bulk_changed, sender=Task)
+def index_bulk_for_search(sender, created=(), updated=(), deleted=(), previous=None, **kwargs):
+    indexed = set(search.SEARCH_FIELDS[Task])
+    search.index_objects(Task, created, replace=False)
+    search.index_objects(Task, [task for task in updated if indexed & set((previous or {}).get(task.pk, ()))])
+    if deleted:
+        search.remove_objects(Task, [task.pk for task in deleted])
+
+
+@receiver(post_delete, sender=Project)
+@receiver(post_delete, sender=Task)
+def remove_from_search(sender, instance, using, **kwargs):
+    search.remove_objects(sender, [instance.pk], using=using)
+
+
+def install_search(sender, using='default', **kwargs):
+    """Make sure the search index exists, also for databases built without migrations."""
+    search.install(connections[using])
+
+
+def _bump_boards_on_commit(project_ids):
+    project_ids = {pk for pk in project_ids if pk is not None}
+    if project_ids:
+        transaction.on_commit(lambda: [bump_board_version(pk) for pk in project_ids])
+
+
+@receiver([post_save, post_delete], sender=Task)
+def task_changed_board(sender, instance, **kwargs):
+    _bump_boards_on_commit([instance.project_id])
+
+
+@receiver([post_save, post_delete], sender=Project)
+def project_changed_board(sender, instance, **kwargs):
+    _bump_boards_on_commit([instance.pk])
+
+
+@receiver(tasks_bulk_changed, sender=Task)
+def tasks_bulk_changed_board(sender, created=(), updated=(), deleted=(), previous=None, **kwargs):
+    project_ids = {task.project_id for task in [*created, *updated, *deleted]}
+    project_ids |= {values['project_id'] for values in (previous or {}).values() if 'project_id' in values}
+    _bump_boards_on_commit(project_ids)
+
+
+def _remember_loaded(instances):
+    for instance in instances:
+        instance._loaded_values = {field.attname: getattr(instance, field.attname) for field in instance._meta.concrete_fields}
+
+
+@receiver(post_save, sender=Project)
+def create_project_stats(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw:
+        ProjectStats.objects.create(project=instance, overdue_on=timezone.localdate())
+
+
+@receiver(post_save, sender=Task)
+def task_saved(sender, instance, created=False, raw=False, **kwargs):
+    """Stats deltas and live board events, diffed against the values the task was loaded with."""
+    if raw:
+        return
+    if created:
+        changes = {'created': [instance]}
+    else:
+        changes = {'updated': [instance], 'previous': {instance.pk: getattr(instance, '_loaded_values', {})}}
+    stats.apply_deltas(stats.task_deltas(**changes))
+    realtime.publish_on_commit(realtime.task_events(**changes))
+    sync.record([instance], previous=changes.get('previous'))
+    activity.record([instance], Activity.Action.CREATED if created else Activity.Action.UPDATED, changes.get('previous'))
+    _remember_loaded([instance])
+
+
+@receiver(post_delete, sender=Task)
+def task_deleted(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Project):
+        return  # the stats row and the board go with the project
+    stats.apply_deltas(stats.task_deltas(deleted=[instance]), rebuild_missing=False)
+    realtime.publish_on_commit(realtime.task_events(deleted=[instance]))
+    sync.record([instance], ChangeLog.Op.DELETE)
+    activity.record([instance], Activity.Action.DELETED)
+
+
+@receiver(tasks_bulk_changed, sender=Task)
+def tasks_bulk_changed_derived(sender, created=(), updated=(), deleted=(), previous=None, **kwargs):
+    stats.apply_deltas(stats.task_deltas(created=created, updated=updated, deleted=deleted, previous=previous))
+    realtime.publish_on_commit(realtime.task_events(created=created, updated=updated, deleted=deleted, previous=previous))
+    sync.record([*created, *updated], previous=previous)
+    sync.record(deleted, ChangeLog.Op.DELETE)
+    activity.record(created, Activity.Action.CREATED)
+    activity.record(updated, previous=previous)
+    activity.record(deleted, Activity.Action.DELETED)
+    _remember_loaded(updated)
+
+
+@receiver(rows_bulk_created, sender=Project)
+def projects_bulk_created(sender, objs, **kwargs):
+    today = timezone.localdate()
+    ProjectStats.objects.bulk_create([ProjectStats(project=p, overdue_on=today) for p in objs], ignore_conflicts=True)
+    search.index_objects(Project, objs, replace=False)
+    sync.record(objs)
+    activity.record(objs, Activity.Action.CREATED)
+
+
+@receiver(rows_bulk_created, sender=ProjectMembership)
+def memberships_bulk_created(sender, objs, **kwargs):
+    for user_id in {m.user_id for m in objs}:
+        invalidate_roles(user_id)
+    users.invalidate_candidates({m.project_id for m in objs})
+    _bump_boards_on_commit({m.project_id for m in objs})
+    sync.record(objs)
+    activity.record(objs, Activity.Action.CREATED)
@@ -0,0 +1,137 @@
+"""Per-project task counters in ``ProjectStats``.
+
+Task writes turn into ``+n``/``-n`` deltas on the counter columns, applied as
+one ``UPDATE ... SET col = col + n`` per project inside the writer's
+transaction. The overdue count depends on the calendar rather than on writes,
+so it is stored together with the day it was computed for and recomputed (in
+one grouped query for a whole page of projects) once that day has passed or a
+task of the project has changed. ``rebuild()`` recomputes everything from the
+task table and backs the ``rebuild_project_stats`` command.
+"""
+from collections import Counter, defaultdict
+
+from django.db.models import Count, F, IntegerField, Max, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Project, ProjectStats, Task
+
+STATUS_FIELDS = {
+    Task.Status.TODO: 'todo',
+    Task.Status.IN_PROGRESS: 'in_progress',
+    Task.Status.BLOCKED: 'blocked',
+    Task.Status.DONE: 'done',
+}
+PRIORITY_FIELDS = {
+    Task.Priority.LOW: 'low_priority',
+    Task.Priority.MEDIUM: 'medium_priority',
+    Task.Priority.HIGH: 'high_priority',
+}
+COUNTER_FIELDS = list(STATUS_FIELDS.values()) + list(PRIORITY_FIELDS.values())
+TRACKED_FIELDS = ('project_id', 'status', 'priority')
+
+
+def snapshot(task):
+    return {field: getattr(task, field) for field in TRACKED_FIELDS}
+
+
+def _count(deltas, values, sign):
+    counter = deltas[values['project_id']]
+    if values['status'] in STATUS_FIELDS:
+        counter[STATUS_FIELDS[values['status']]] += sign
+    if values['priority'] in PRIORITY_FIELDS:
+        counter[PRIORITY_FIELDS[values['priority']]] += sign
+
+
+def task_deltas(created=(), updated=(), deleted=(), previous=None):
+    """``{project_id: Counter(field=delta)}`` for the given task changes.
+
+    ``previous`` maps task ids to the old values of changed fields; updated
+    tasks without an entry only count as activity.
+    """
+    deltas = defaultdict(Counter)
+    for task in created:
+        _count(deltas, snapshot(task), 1)
+    for task in deleted:
+        _count(deltas, snapshot(task), -1)
+    for task in updated:
+        current = snapshot(task)
+        old = {**current, **{k: v for k, v in (previous or {}).get(task.pk, {}).items() if k in TRACKED_FIELDS}}
+        if old != current:
+            _count(deltas, old, -1)
+            _count(deltas, current, 1)
+        deltas[current['project_id']]
+    return deltas
+
+
+def apply_deltas(deltas, rebuild_missing=True):
+    """Add ``deltas`` to the stored counters and mark the overdue counts stale.
+
+    Projects without a stats row are counted from scratch instead, unless
+    ``rebuild_missing`` is off (deletes, where the project may be going too).
+    """
+    now = timezone.now()
+    missing = []
+    for project_id, counter in deltas.items():
+        changes = {field: F(field) + n for field, n in counter.items() if n}
+        if not ProjectStats.objects.filter(pk=project_id).update(**changes, overdue_on=None, last_activity_at=now):
+            missing.append(project_id)
+    if missing and rebuild_missing:
+        rebuild(missing)
+
+
+def rebuild(project_ids=None, batch_size=1000):
+    """Recompute the stats rows of ``project_ids`` (all projects by default) from the task table."""
+    today = timezone.localdate()
+    projects = Project.objects.order_by('pk')
+    if project_ids is not None:
+        projects = projects.filter(pk__in=project_ids)
+    counters = {field: Count('tasks', filter=Q(tasks__status=status)) for status, field in STATUS_FIELDS.items()}
+    counters.update({field: Count('tasks', filter=Q(tasks__priority=priority)) for priority, field in PRIORITY_FIELDS.items()})
+    rows = projects.values('pk').annotate(
+        **counters,
+        overdue=Count('tasks', filter=Q(tasks__due_date__lt=today) & ~Q(tasks__status=Task.Status.DONE)),
+        last_activity_at=Max('tasks__updated_at'),
+    )
+    fields = COUNTER_FIELDS + ['overdue', 'overdue_on', 'last_activity_at']
+    batch = []
+    total = 0
+    for row in rows.iterator(chunk_size=batch_size):
+        batch.append(ProjectStats(project_id=row.pop('pk'), overdue_on=today, **row))
+        if len(batch) >= batch_size:
+            total += _save(batch, fields)
+            batch = []
+    return total + _save(batch, fields)
+
+
+def _save(batch, fields):
+    if batch:
+        ProjectStats.objects.bulk_create(batch, update_conflicts=True, unique_fields=['project'], update_fields=fields)
+    return len(batch)
+
+
+def refresh_overdue(projects):
+    """Bring the overdue counts of ``projects`` (with ``stats`` loaded) up to date in place.
+
+    Stale rows are recomputed by a single UPDATE with a grouped subquery, then
+    read back with one SELECT; nothing runs when every row is current.
+    """
+    today = timezone.localdate()
+    stale = {}
+    for project in projects:
+        try:
+            stats = project.stats
+        except ProjectStats.DoesNotExist:
+            continue
+        if stats.overdue_on != today:
+            stale[project.pk] = stats
+    if not stale:
+        return
+    overdue = Task.objects.filter(project_id=OuterRef('pk'), due_date__lt=today).exclude(status=Task.Status.DONE) \
+        .order_by().values('project_id').annotate(n=Count('id')).values('n')
+    rows = ProjectStats.objects.filter(pk__in=stale)
+    rows.update(overdue=Coalesce(Subquery(overdue, output_field=IntegerField()), Value(0)), overdue_on=today)
+    for pk, count in rows.values_list('pk', 'overdue'):
+        stale[pk].overdue = count
+        stale[pk].overdue_on = today
+
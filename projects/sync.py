@@ -0,0 +1,137 @@
+"""Delta sync for offline clients, fed by the ``ChangeLog`` table.
+
+Model signals append a ``ChangeLog`` row for every created, updated or deleted
+project, task and membership, in the same transaction as the change. The
+``/api/sync/?since=<cursor>`` endpoint reads the rows after the cursor that the
+caller may see, collapses them to one final state per object and returns the
+current rows plus tombstones, so a sync costs O(changes) rather than O(data).
+
+Ids are handed out when a row is inserted but become visible when its
+transaction commits, so a slow transaction can commit an id below one a client
+has already seen. The returned cursor therefore only moves past entries older
+than ``SYNC_SETTLE_SECONDS``; newer ones are sent again on the next sync, which
+is harmless because applying a change twice is a no-op.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .models import ChangeLog, Project, ProjectMembership, Task
+from .serializers import ProjectMembershipSerializer, ProjectSerializer, TaskSerializer
+from .stats import refresh_overdue
+
+KINDS = {Project: ChangeLog.Kind.PROJECT, Task: ChangeLog.Kind.TASK, ProjectMembership: ChangeLog.Kind.MEMBERSHIP}
+
+
+class CursorExpired(Exception):
+    """The entries after the cursor were pruned; the client has to fetch everything again."""
+
+
+def _entry(instance, op, project_id=None):
+    kind = KINDS[type(instance)]
+    if kind == ChangeLog.Kind.PROJECT:
+        project_id = instance.pk
+    return ChangeLog(
+        kind=kind, op=op, object_id=instance.pk,
+        project_id=project_id if project_id is not None else instance.project_id,
+        user_id=instance.user_id if kind == ChangeLog.Kind.MEMBERSHIP else None,
+    )
+
+
+def record(instances, op=ChangeLog.Op.UPSERT, previous=None):
+    """Log ``instances`` as changed. ``previous`` ({pk: {attname: old}}) turns project moves into a delete + upsert."""
+    entries = []
+    for instance in instances:
+        old_project = (previous or {}).get(instance.pk, {}).get('project_id')
+        if old_project is not None and old_project != instance.project_id:
+            entries.append(_entry(instance, ChangeLog.Op.DELETE, project_id=old_project))
+        entries.append(_entry(instance, op))
+    if entries:
+        ChangeLog.objects.bulk_create(entries, batch_size=1000)
+
+
+def _settle_seconds():
+    return getattr(settings, 'SYNC_SETTLE_SECONDS', 10)
+
+
+def head():
+    """Cursor to start syncing from; take it *before* fetching the full dataset."""
+    settled = timezone.now() - timedelta(seconds=_settle_seconds())
+    return ChangeLog.objects.filter(changed_at__lte=settled).aggregate(head=Max('id'))['head'] or 0
+
+
+def _page_size():
+    return getattr(settings, 'SYNC_PAGE_SIZE', 1000)
+
+
+def prune(before):
+    """Delete entries older than ``before``; clients with an older cursor get ``CursorExpired``."""
+    last = ChangeLog.objects.filter(changed_at__lt=before).exclude(op=ChangeLog.Op.PRUNED).aggregate(m=Max('id'))['m']
+    if last is None:
+        return 0
+    deleted, _ = ChangeLog.objects.filter(id__lte=last).delete()
+    ChangeLog.objects.create(op=ChangeLog.Op.PRUNED, object_id=last)
+    return deleted
+
+
+def changes_since(user, since, limit=None):
+    """Everything ``user`` needs to apply after ``since``, as serializer-ready data."""
+    limit = limit or _page_size()
+    if ChangeLog.objects.filter(op=ChangeLog.Op.PRUNED, object_id__gt=since).exists():
+        raise CursorExpired()
+    visible = Project.objects.visible_to(user).values('pk')
+    entries = list(
+        ChangeLog.objects.filter(id__gt=since).exclude(op=ChangeLog.Op.PRUNED)
+        .filter(Q(project_id__in=visible) | Q(user_id=user.pk)).order_by('id')[:limit + 1]
+    )
+    more = len(entries) > limit
+    entries = entries[:limit]
+
+    settled = timezone.now() - timedelta(seconds=_settle_seconds())
+    cursor = since
+    for entry in entries:
+        if entry.changed_at > settled:
+            break
+        cursor = entry.id
+    # Only worth asking again right away when the whole page settled.
+    has_more = more and cursor == entries[-1].id
+
+    final = {}
+    for entry in entries:
+        final[entry.kind, entry.object_id] = entry
+    upserts = {kind: set() for kind in ChangeLog.Kind.values}
+    deleted = {kind: set() for kind in ChangeLog.Kind.values}
+    joined, left = set(), set()
+    for (kind, object_id), entry in final.items():
+        (upserts if entry.op == ChangeLog.Op.UPSERT else deleted)[kind].add(object_id)
+        if kind == ChangeLog.Kind.MEMBERSHIP and entry.user_id == user.pk:
+            (joined if entry.op == ChangeLog.Op.UPSERT else left).add(entry.project_id)
+    # Losing access looks like the whole project going away; gaining it brings the whole project.
+    deleted[ChangeLog.Kind.PROJECT] |= left - joined
+    upserts[ChangeLog.Kind.PROJECT] |= joined
+
+    projects = list(ProjectSerializer.setup_eager_loading(
+        Project.objects.visible_to(user).filter(pk__in=upserts[ChangeLog.Kind.PROJECT])
+    ))
+    refresh_overdue(projects)
+    tasks = TaskSerializer.setup_eager_loading(Task.objects.visible_to(user).filter(
+        Q(pk__in=upserts[ChangeLog.Kind.TASK]) | Q(project_id__in=joined)
+    ))
+    memberships = ProjectMembershipSerializer.setup_eager_loading(ProjectMembership.objects.filter(
+        Q(pk__in=upserts[ChangeLog.Kind.MEMBERSHIP]) | Q(project_id__in=joined), project__in=visible,
+    ))
+    tasks, memberships = list(tasks), list(memberships)
+
+    # Upserts whose row is gone or out of reach by now are tombstones too.
+    for kind, rows in ((ChangeLog.Kind.PROJECT, projects), (ChangeLog.Kind.TASK, tasks), (ChangeLog.Kind.MEMBERSHIP, memberships)):
+        deleted[kind] |= upserts[kind] - {row.pk for row in rows}
+    return {
+        'cursor': cursor,
+        'has_more': has_more,
+        'projects': projects,
+        'tasks': tasks,
+        'memberships': memberships,
+        'deleted': {f'{kind}s': sorted(ids) for kind, ids in deleted.items()},
+    }
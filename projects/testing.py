@@ -0,0 +1,77 @@
+"""Test runner that fails any test whose templates run a database query.
+
+Views are expected to hand templates fully loaded (select_related /
+prefetch_related / paginated) data; a query issued while a template renders is
+almost always an N+1 waiting to happen. ``TemplateQueryGuardRunner`` wraps the
+outermost ``Template.render`` so any query inside it raises
+``TemplateQueryError`` naming the template and the SQL.
+"""
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+from threading import local
+
+from django.db import connections
+from django.test.runner import DiscoverRunner
+
+_state = local()
+
+
+class TemplateQueryError(AssertionError):
+    pass
+
+
+def _block(template_name):
+    def wrapper(execute, sql, params, many, context):
+        if getattr(_state, 'allowed', 0):
+            return execute(sql, params, many, context)
+        raise TemplateQueryError(f'Template {template_name!r} ran a query; load it in the view instead: {sql}')
+    return wrapper
+
+
+@contextmanager
+def allow_template_queries():
+    """For the rare template that is meant to query (e.g. third-party admin pages)."""
+    _state.allowed = getattr(_state, 'allowed', 0) + 1
+    try:
+        yield
+    finally:
+        _state.allowed -= 1
+
+
+def _guarded(render):
+    @wraps(render)
+    def wrapper(self, context):
+        if getattr(_state, 'rendering', False):
+            return render(self, context)
+        _state.rendering = True
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(_block(self.origin.template_name or self.origin.name)))
+                return render(self, context)
+        finally:
+            _state.rendering = False
+    wrapper.guarded = render
+    return wrapper
+
+
+def install_template_guard():
+    from django.template.base import Template
+    if not hasattr(Template.render, 'guarded'):
+        Template.render = _guarded(Template.render)
+
+
+def uninstall_template_guard():
+    from django.template.base import Template
+    if hasattr(Template.render, 'guarded'):
+        Template.render = Template.render.guarded
+
+
+class TemplateQueryGuardRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        install_template_guard()
+
+    def teardown_test_environment(self, **kwargs):
+        uninstall_template_guard()
+        super().teardown_test_environment(**kwargs)
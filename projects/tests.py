@@ -1,7 +1,24 @@
+import asyncio
+import csv
+import io
+import json
+import os
+import tempfile
+from datetime import date, timedelta
+from unittest import mock
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, RequestFactory, override_settings
 from django.urls import reverse
-from .models import Project, Task, ProjectMembership
+from django.utils import timezone
+from . import activity, benchmark, instrumentation, realtime, stats, sync
+from .board import CSRF_PLACEHOLDER
+from .membership import MembershipResolver
+from .search import search
+from .models import Activity, Project, ProjectPurge, ProjectStats, Task, ProjectMembership
+from .ordering import ORDER_GAP, move_task
 
 User = get_user_model()
 
@@ -24,3 +41,1071 @@ class AccessTest(TestCase):
         self.client.login(username='other', password='pass12345')
         resp = self.client.get(reverse('projects:project_list'))
         self.assertNotContains(resp, 'Proj')
+
+class MembershipResolverTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='u', password='pass12345')
+        self.owned = Project.objects.create(owner=self.user, name='Owned')
+        self.joined = Project.objects.create(owner=self.user, name='Joined')
+        ProjectMembership.objects.create(project=self.owned, user=self.user, role=ProjectMembership.Role.OWNER)
+        ProjectMembership.objects.create(project=self.joined, user=self.user, role=ProjectMembership.Role.MEMBER)
+        self.request = RequestFactory().get('/')
+        self.request.user = self.user
+
+    def test_single_query_per_request(self):
+        with self.assertNumQueries(1):
+            resolver = MembershipResolver.for_request(self.request)
+            self.assertTrue(resolver.is_owner(self.owned.pk))
+            self.assertTrue(resolver.is_member(self.joined.pk))
+            self.assertFalse(resolver.is_owner(self.joined.pk))
+            self.assertFalse(MembershipResolver.for_request(self.request).is_member(0))
+
+    @override_settings(PROJECT_ROLE_CACHE_TIMEOUT=60)
+    def test_cross_request_cache_invalidated_on_membership_change(self):
+        cache.clear()
+        self.assertTrue(MembershipResolver(self.user).is_member(self.joined.pk))
+        with self.assertNumQueries(0):
+            self.assertTrue(MembershipResolver(self.user).is_member(self.joined.pk))
+        ProjectMembership.objects.filter(project=self.joined).get().delete()
+        self.assertFalse(MembershipResolver(self.user).is_member(self.joined.pk))
+
+class ProjectAccessMixinTest(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', password='pass12345')
+        self.other = User.objects.create_user(username='other', password='pass12345')
+        self.project = Project.objects.create(owner=self.owner, name='Proj')
+        ProjectMembership.objects.create(project=self.project, user=self.owner, role=ProjectMembership.Role.OWNER)
+        self.task = Task.objects.create(project=self.project, title='T1')
+
+    def test_task_detail_resolves_task_project_and_role_in_one_query(self):
+        self.client.login(username='owner', password='pass12345')
+        # session + user + the joined task/project/membership lookup
+        with self.assertNumQueries(3):
+            resp = self.client.get(reverse('projects:task_detail', args=[self.task.pk]))
+        self.assertContains(resp, 'T1')
+
+    def test_pk_is_resolved_against_the_view_model(self):
+        self.client.login(username='owner', password='pass12345')
+        other_project = Project.objects.create(owner=self.owner, name='Other')
+        # a task id that happens to match a project pk must not leak into project views
+        resp = self.client.get(reverse('projects:project_edit', args=[other_project.pk]))
+        self.assertEqual(resp.status_code, 403)
+        resp = self.client.get(reverse('projects:task_edit', args=[self.task.pk + 100]))
+        self.assertEqual(resp.status_code, 404)
+
+    def test_non_member_is_denied(self):
+        self.client.login(username='other', password='pass12345')
+        resp = self.client.get(reverse('projects:task_edit', args=[self.task.pk]))
+        self.assertEqual(resp.status_code, 403)
+        resp = self.client.get(reverse('projects:project_detail', args=[self.project.pk]))
+        self.assertRedirects(resp, reverse('login'), fetch_redirect_response=False)
+
+class ApiQueryCountTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='u', password='pass12345')
+        self.client.login(username='u', password='pass12345')
+
+    def _add_projects(self, n):
+        for i in range(n):
+            project = Project.objects.create(owner=self.user, name=f'P{Project.objects.count()}')
+            ProjectMembership.objects.create(project=project, user=self.user, role=ProjectMembership.Role.OWNER)
+            other = User.objects.create_user(username=f'm{project.pk}')
+            ProjectMembership.objects.create(project=project, user=other)
+            Task.objects.create(project=project, title='T', assignee=other)
+
+    def _count(self, url):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_list_query_count_does_not_grow_with_rows(self):
+        for url in ('/api/projects/', '/api/tasks/'):
+            self._add_projects(2)
+            small = self._count(url)
+            self._add_projects(8)
+            self.assertEqual(self._count(url), small, url)
+
+class VisibilityQuerySetTest(TestCase):
+    def test_visible_to_uses_exists_without_duplicates(self):
+        owner = User.objects.create_user(username='owner')
+        member = User.objects.create_user(username='member')
+        outsider = User.objects.create_user(username='outsider')
+        project = Project.objects.create(owner=owner, name='Proj')
+        ProjectMembership.objects.create(project=project, user=owner, role=ProjectMembership.Role.OWNER)
+        ProjectMembership.objects.create(project=project, user=member)
+        Task.objects.create(project=project, title='T1')
+        qs = Project.objects.visible_to(member)
+        self.assertNotIn('DISTINCT', str(qs.query))
+        self.assertEqual(list(qs), [project])
+        self.assertEqual(Task.objects.visible_to(owner).count(), 1)
+        self.assertFalse(Task.objects.visible_to(outsider).exists())
+
+class KeysetPaginationTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='u', password='pass12345')
+        self.project = Project.objects.create(owner=self.user, name='Proj')
+        ProjectMembership.objects.create(project=self.project, user=self.user, role=ProjectMembership.Role.OWNER)
+        statuses = [Task.Status.TODO, Task.Status.DONE, Task.Status.BLOCKED]
+        for i in range(23):
+            Task.objects.create(project=self.project, title=f'T{i}', status=statuses[i % 3], order=i % 4,
+                                due_date=None if i % 2 else f'2025-01-{i % 28 + 1:02d}')
+        self.client.login(username='u', password='pass12345')
+
+    def _walk(self, url):
+        seen, pages, prev = [], 0, None
+        while url:
+            data = self.client.get(url).json()
+            seen += [t['id'] for t in data['results']]
+            prev, url, pages = data['previous'], data['next'], pages + 1
+        return seen, pages, prev
+
+    def test_api_walks_every_task_once_in_key_order(self):
+        seen, pages, prev = self._walk('/api/tasks/?page_size=5')
+        expected = list(Task.objects.order_by('status', 'order', 'id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+        self.assertEqual(pages, 5)
+        back = self.client.get(prev).json()
+        self.assertEqual([t['id'] for t in back['results']], expected[15:20])
+
+    def test_api_ordering_on_nullable_field(self):
+        seen, _, _ = self._walk('/api/tasks/?page_size=4&ordering=due_date')
+        self.assertEqual(sorted(seen), sorted(Task.objects.values_list('id', flat=True)))
+        due = dict(Task.objects.values_list('id', 'due_date'))
+        dates = [due[i] for i in seen]
+        self.assertEqual(dates[:12], sorted(d for d in dates if d))
+        self.assertTrue(all(d is None for d in dates[12:]))
+
+    def test_project_list_cursor_links(self):
+        for i in range(12):
+            p = Project.objects.create(owner=self.user, name=f'Extra {i}')
+            ProjectMembership.objects.create(project=p, user=self.user, role=ProjectMembership.Role.OWNER)
+        resp = self.client.get(reverse('projects:project_list'))
+        page = resp.context['page_obj']
+        self.assertTrue(page.has_next())
+        resp = self.client.get(reverse('projects:project_list'), {'cursor': page.next_cursor})
+        self.assertEqual(len(resp.context['projects']), 3)
+        self.assertEqual(self.client.get(reverse('projects:project_list'), {'cursor': 'garbage'}).status_code, 404)
+
+    def test_tampered_cursor_values_are_rejected(self):
+        from .pagination import encode_cursor
+        for values in (['notadate', 1], ['2024-01-01T00:00:00+00:00', 'x'], [{'a': 1}, [1]]):
+            cursor = encode_cursor('n', values)
+            self.assertEqual(self.client.get(reverse('projects:project_list'), {'cursor': cursor}).status_code, 404)
+            self.assertEqual(self.client.get('/api/projects/', {'cursor': cursor}).status_code, 404)
+
+class SearchTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='u', password='pass12345')
+        self.other = User.objects.create_user(username='other')
+        self.project = Project.objects.create(owner=self.user, name='Apollo launch', description='Rocket programme')
+        ProjectMembership.objects.create(project=self.project, user=self.user, role=ProjectMembership.Role.OWNER)
+        hidden = Project.objects.create(owner=self.other, name='Apollo secret')
+        ProjectMembership.objects.create(project=hidden, user=self.other, role=ProjectMembership.Role.OWNER)
+        self.task = Task.objects.create(project=self.project, title='Fuel check', description='Inspect the tanks')
+        Task.objects.create(project=hidden, title='Fuel hidden')
+        self.client.login(username='u', password='pass12345')
+
+    def test_search_is_scoped_and_prefix_matched(self):
+        self.assertEqual(list(search(self.user, 'apol')), [self.project])
+        self.assertEqual(list(search(self.user, 'fuel tank', model=Task)), [self.task])
+        self.assertFalse(search(self.user, 'fuel missing', model=Task).exists())
+        self.assertFalse(search(self.user, '***').exists())
+
+    def test_index_follows_saves_and_deletes(self):
+        self.task.title = 'Oxidiser check'
+        self.task.save()
+        self.assertFalse(search(self.user, 'fuel', model=Task).exists())
+        self.assertEqual(list(search(self.user, 'oxid', model=Task)), [self.task])
+        self.task.delete()
+        self.assertFalse(search(self.user, 'oxid', model=Task).exists())
+
+    def test_html_list_and_api_use_search(self):
+        self.assertContains(self.client.get(reverse('projects:project_list'), {'q': 'rocket'}), 'Apollo launch')
+        self.assertNotContains(self.client.get(reverse('projects:project_list'), {'q': 'secret'}), 'Apollo')
+        data = self.client.get('/api/tasks/', {'search': 'insp'}).json()
+        self.assertEqual([t['id'] for t in data['results']], [self.task.pk])
+        data = self.client.get('/api/projects/', {'search': 'apollo'}).json()
+        self.assertEqual([p['id'] for p in data['results']], [self.project.pk])
+
+    def test_results_are_paginated_by_relevance(self):
+        best = Task.objects.create(project=self.project, title='Fuel fuel fuel', description='Fuel')
+        weak = Task.objects.create(project=self.project, title='Pumps', description='Check the pumps, then the valves, then fuel')
+        self.task.refresh_from_db()
+        self.task.save(update_fields=['updated_at'])  # most recently updated, but not the best match
+        ids, url = [], '/api/tasks/?search=fuel&page_size=1'
+        while url:
+            data = self.client.get(url).json()
+            ids += [t['id'] for t in data['results']]
+            url = data['next']
+        self.assertEqual(ids, [best.pk, self.task.pk, weak.pk])
+
+class TaskOrderingTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='u', password='pass12345')
+        self.project = Project.objects.create(owner=self.user, name='Proj')
+        ProjectMembership.objects.create(project=self.project, user=self.user, role=ProjectMembership.Role.OWNER)
+        self.tasks = [Task.objects.create(project=self.project, title=f'T{i}', order=(i + 1) * ORDER_GAP) for i in range(4)]
+        self.client.login(username='u', password='pass12345')
+
+    def column(self, status=Task.Status.TODO):
+        return list(Task.objects.filter(status=status).order_by('order', 'id').values_list('title', flat=True))
+
+    def test_move_between_neighbours_is_a_single_update(self):
+        t0, t1, t2, t3 = self.tasks
+        # anchor + neighbour lookups, the task UPDATE, a stats UPDATE and a change-log INSERT (+ savepoint)
+        with self.assertNumQueries(7):
+            move_task(t3, Task.Status.TODO, after_id=t0.pk)
+        self.assertEqual(self.column(), ['T0', 'T3', 'T1', 'T2'])
+        move_task(t0, Task.Status.DONE)
+        move_task(t1, Task.Status.DONE, before_id=t0.pk)
+        self.assertEqual(self.column(Task.Status.DONE), ['T1', 'T0'])
+
+    def test_rebalances_when_keys_collide(self):
+        Task.objects.update(order=7)
+        t0, t1, t2, t3 = self.tasks
+        move_task(t3, Task.Status.TODO, after_id=t1.pk)
+        self.assertEqual(self.column(), ['T0', 'T1', 'T3', 'T2'])
+        orders = list(Task.objects.order_by('order').values_list('order', flat=True))
+        self.assertEqual(len(set(orders)), 4)
+
+    def test_appends_go_past_the_32_bit_range(self):
+        from .serializers import BulkTaskSerializer
+        t0, t1, t2, t3 = self.tasks
+        Task.objects.filter(pk=t3.pk).update(order=2**31 - 1)
+        move_task(t0)
+        self.assertEqual(Task.objects.get(pk=t0.pk).order, 2**31 - 1 + ORDER_GAP)
+        self.assertTrue(BulkTaskSerializer(data={'project': t0.project_id, 'title': 'x', 'order': 2**40}).is_valid())
+
+    def test_api_accepts_before_and_after(self):
+        t0, t1, t2, t3 = self.tasks
+        resp = self.client.post(f'/api/tasks/{t2.pk}/move/', {'before_id': t0.pk}, content_type='application/json')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(self.column(), ['T2', 'T0', 'T1', 'T3'])
+        resp = self.client.post(f'/api/tasks/{t2.pk}/move/', {'status': 'DONE', 'after_id': t1.pk}, content_type='application/json')
+        self.assertEqual(resp.status_code, 400)
+
+class BulkTaskApiTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='u', password='pass12345')
+        self.other = User.objects.create_user(username='other')
+        self.project = Project.objects.create(owner=self.user, name='Proj')
+        ProjectMembership.objects.create(project=self.project, user=self.user, role=ProjectMembership.Role.OWNER)
+        self.foreign = Project.objects.create(owner=self.other, name='Foreign')
+        self.client.login(username='u', password='pass12345')
+
+    def post(self, payload, **params):
+        url = '/api/tasks/bulk/' + ('?atomic=1' if params.get('atomic') else '')
+        return self.client.post(url, payload, content_type='application/json')
+
+    def test_mixed_batch_with_per_item_errors(self):
+        keep = Task.objects.create(project=self.project, title='Keep')
+        drop = Task.objects.create(project=self.project, title='Drop')
+        hidden = Task.objects.create(project=self.foreign, title='Hidden')
+        creates = [{'project': self.project.pk, 'title': f'New {i}', 'assignee_id': self.user.pk} for i in range(50)]
+        creates.append({'project': self.foreign.pk, 'title': 'Nope'})
+        creates.append({'project': self.project.pk, 'title': ''})
+        # session, user, role map, target tasks, assignees, column maxima, the writes and the search index
+        with self.assertNumQueries(18):
+            resp = self.post({
+                'create': creates,
+                'update': [{'id': keep.pk, 'title': 'Kept', 'priority': 3}, {'id': hidden.pk, 'title': 'x'}],
+                'move': [{'id': keep.pk, 'status': 'DONE'}],
+                'delete': [drop.pk],
+            })
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()
+        self.assertEqual(len(data['created']), 50)
+        self.assertEqual(data['deleted'], [drop.pk])
+        self.assertEqual(sorted((e['op'], e['index']) for e in data['errors']), [('create', 50), ('create', 51), ('update', 1)])
+        keep.refresh_from_db()
+        self.assertEqual((keep.title, keep.priority, keep.status), ('Kept', 3, 'DONE'))
+        self.assertEqual(Task.objects.filter(project=self.project, status='TODO').values('order').distinct().count(), 50)
+        self.assertEqual(list(search(self.user, 'new', model=Task).order_by('pk'))[0].title, 'New 0')
+        self.assertEqual(Task.objects.get(pk=hidden.pk).title, 'Hidden')
+
+    def test_assignees_must_be_members_of_the_project(self):
+        task = Task.objects.create(project=self.project, title='Mine')
+        resp = self.post({
+            'create': [{'project': self.project.pk, 'title': 'A', 'assignee_id': self.other.pk},
+                       {'project': self.project.pk, 'title': 'B', 'assignee_id': self.user.pk}],
+            'update': [{'id': task.pk, 'assignee_id': self.other.pk}],
+        })
+        errors = {(e['op'], e['index']): e['errors'] for e in resp.json()['errors']}
+        self.assertEqual(errors, {('create', 0): {'assignee_id': ['Not a member of this project.']},
+                                  ('update', 0): {'assignee_id': ['Not a member of this project.']}})
+        self.assertEqual(list(Task.objects.exclude(assignee=None).values_list('title', flat=True)), ['B'])
+
+    def test_deletes_are_one_batched_write(self):
+        from .models import ChangeLog
+        tasks = Task.objects.bulk_create([Task(project=self.project, title=f'T{i}') for i in range(110)])
+        stats.rebuild([self.project.pk])
+        from . import search as search_index
+        search_index.index_objects(Task, tasks, replace=False)
+        with self.assertNumQueries(10) as few:
+            self.post({'delete': [t.pk for t in tasks[:10]]})
+        with self.assertNumQueries(len(few.captured_queries)):
+            self.post({'delete': [t.pk for t in tasks[10:]]})
+        self.assertFalse(Task.objects.exists())
+        self.assertEqual(ProjectStats.objects.get(pk=self.project.pk).total, 0)
+        self.assertEqual(ChangeLog.objects.filter(op=ChangeLog.Op.DELETE, kind=ChangeLog.Kind.TASK).count(), 110)
+        self.assertFalse(search(self.user, 't', model=Task).exists())
+
+    def test_atomic_mode_writes_nothing_on_error(self):
+        resp = self.post({'create': [{'project': self.project.pk, 'title': 'A'}, {'project': self.foreign.pk, 'title': 'B'}]}, atomic=True)
+        self.assertEqual(resp.status_code, 400)
+        self.assertFalse(Task.objects.exists())
+
+    def test_atomic_mode_rolls_back_when_a_move_fails_while_writing(self):
+        task = Task.objects.create(project=self.project, title='Move me')
+        anchor = Task.objects.create(project=self.project, title='Anchor')
+        resp = self.post({
+            'create': [{'project': self.project.pk, 'title': 'A'}],
+            'update': [{'id': anchor.pk, 'title': 'Renamed'}],
+            'move': [{'id': task.pk, 'status': 'DONE', 'after_id': anchor.pk}],  # anchor is in another column
+        }, atomic=True)
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual([(e['op'], e['index']) for e in resp.json()['errors']], [('move', 0)])
+        self.assertEqual(sorted(Task.objects.values_list('title', 'status')), [('Anchor', 'TODO'), ('Move me', 'TODO')])
+
+class BoardCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='u', password='pass12345')
+        self.project = Project.objects.create(owner=self.user, name='Proj')
+        ProjectMembership.objects.create(project=self.project, user=self.user, role=ProjectMembership.Role.OWNER)
+        self.task = Task.objects.create(project=self.project, title='Write spec')
+        self.client.login(username='u', password='pass12345')
+        self.url = reverse('projects:board', args=[self.project.pk])
+
+    def test_repeat_load_skips_task_query_and_change_invalidates(self):
+        self.assertContains(self.client.get(self.url), 'Write spec')
+        # session, user, project + role; no task query
+        with self.assertNumQueries(3):
+            resp = self.client.get(self.url)
+        self.assertContains(resp, 'Write spec')
+        self.assertContains(resp, 'name="csrfmiddlewaretoken"')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.task.title = 'Review spec'
+            self.task.save()
+        self.assertContains(self.client.get(self.url), 'Review spec')
+
+    def test_move_invalidates_board(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.url, {'task_id': self.task.pk, 'status': Task.Status.DONE})
+        columns = self.client.get(self.url).context['columns']
+        self.assertIn('Write spec', columns[3])
+        self.assertNotIn('Write spec', columns[0])
+
+class BoardSliceTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='u', password='pass12345')
+        self.project = Project.objects.create(owner=self.user, name='Proj')
+        ProjectMembership.objects.create(project=self.project, user=self.user, role=ProjectMembership.Role.OWNER)
+        Task.objects.bulk_create([Task(project=self.project, title=f'Todo {i}', order=i) for i in range(7)])
+        Task.objects.create(project=self.project, title='Only done', status=Task.Status.DONE)
+        self.client.login(username='u', password='pass12345')
+
+    @override_settings(BOARD_COLUMN_LIMIT=3)
+    def test_columns_are_limited_with_exact_counts_and_load_more(self):
+        from .board import column_slices
+        with self.assertNumQueries(1):
+            tasks, counts = column_slices(self.project)
+        self.assertEqual([t.title for t in tasks[Task.Status.TODO]], ['Todo 0', 'Todo 1', 'Todo 2'])
+        self.assertEqual(counts, {'TODO': 7, 'IN_PROGRESS': 0, 'BLOCKED': 0, 'DONE': 1})
+
+        resp = self.client.get(reverse('projects:board', args=[self.project.pk]))
+        self.assertContains(resp, 'Load more', count=1)
+        titles = []
+        url = resp.context['columns'][0].split('class="board-load-more" href="')[1].split('"')[0].replace('&amp;', '&')
+        while url:
+            resp = self.client.get(url)
+            titles += [t.title for t in resp.context['tasks']]
+            cursor = resp.context['more_cursor']
+            url = f"{reverse('projects:board_column', args=[self.project.pk, 'TODO'])}?cursor={cursor}" if cursor else None
+        self.assertEqual(titles, [f'Todo {i}' for i in range(3, 7)])
+
+class ProjectStatsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='u', password='pass12345')
+        self.project = Project.objects.create(owner=self.user, name='Proj')
+        ProjectMembership.objects.create(project=self.project, user=self.user, role=ProjectMembership.Role.OWNER)
+
+    def counts(self):
+        row = ProjectStats.objects.get(project=self.project)
+        return {f: getattr(row, f) for f in ('todo', 'in_progress', 'done', 'high_priority', 'medium_priority', 'overdue')}
+
+    def test_counters_follow_saves_moves_bulk_and_deletes(self):
+        a = Task.objects.create(project=self.project, title='A', priority=Task.Priority.HIGH)
+        b = Task.objects.create(project=self.project, title='B')
+        b = Task.objects.get(pk=b.pk)
+        b.status = Task.Status.DONE
+        b.save()
+        move_task(a, Task.Status.IN_PROGRESS)
+        self.client.login(username='u', password='pass12345')
+        self.client.post('/api/tasks/bulk/', {'create': [
+            {'project': self.project.pk, 'title': 'C', 'due_date': '2000-01-01'},
+        ]}, content_type='application/json')
+        self.assertEqual(self.counts(), {'todo': 1, 'in_progress': 1, 'done': 1, 'high_priority': 1, 'medium_priority': 2, 'overdue': 0})
+        Task.objects.get(title='C').delete()
+        expected = {'todo': 0, 'in_progress': 1, 'done': 1, 'high_priority': 1, 'medium_priority': 1, 'overdue': 0}
+        self.assertEqual(self.counts(), expected)
+        ProjectStats.objects.all().delete()
+        stats.rebuild()
+        self.assertEqual(self.counts(), expected)
+
+    def test_list_shows_progress_and_refreshes_overdue_once(self):
+        Task.objects.create(project=self.project, title='Late', due_date=date(2000, 1, 1))
+        Task.objects.create(project=self.project, title='Done', status=Task.Status.DONE, due_date=date(2000, 1, 1))
+        self.client.login(username='u', password='pass12345')
+        resp = self.client.get(reverse('projects:project_list'))
+        self.assertContains(resp, '1/2 done')
+        self.assertContains(resp, '1 overdue')
+        with self.assertNumQueries(0):
+            stats.refresh_overdue(resp.context['projects'])
+
+class RealtimeBoardTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='u', password='pass12345')
+        self.project = Project.objects.create(owner=self.user, name='Proj')
+        ProjectMembership.objects.create(project=self.project, user=self.user, role=ProjectMembership.Role.OWNER)
+        self.task = Task.objects.create(project=self.project, title='Card')
+        self.client.login(username='u', password='pass12345')
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def subscribe(self):
+        async def subscribe():
+            return realtime.broker.subscribe(self.project.pk)
+        subscription = self.loop.run_until_complete(subscribe())
+        self.addCleanup(subscription.close)
+        return subscription
+
+    def next_event(self, subscription):
+        return self.loop.run_until_complete(subscription.get(timeout=1))
+
+    def test_xhr_move_publishes_card_diff_after_commit(self):
+        subscription = self.subscribe()
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.post(reverse('projects:board', args=[self.project.pk]),
+                                    {'task_id': self.task.pk, 'status': 'DONE'}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(resp.status_code, 204)
+        event = self.next_event(subscription)
+        self.assertEqual((event['op'], event['id'], event['status'], event['previous_status']), ('upsert', self.task.pk, 'DONE', 'TODO'))
+        self.assertIn(f'data-task-id="{self.task.pk}"', event['html'])
+        self.assertIn(CSRF_PLACEHOLDER, event['html'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Task.objects.get(pk=self.task.pk).delete()
+        self.assertEqual(self.next_event(subscription), {'op': 'delete', 'id': self.task.pk, 'status': 'DONE'})
+
+    def test_rolled_back_writes_publish_nothing(self):
+        subscription = self.subscribe()
+        with self.captureOnCommitCallbacks(execute=False):
+            move_task(self.task, Task.Status.DONE)
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertTrue(subscription.queue.empty())
+
+    def test_stream_closes_once_the_viewer_is_no_longer_a_member(self):
+        from .views import _still_member
+        answers = iter([True, False])
+
+        async def allowed():
+            return next(answers)
+
+        async def read():
+            return [chunk async for chunk in realtime.event_stream(self.project.pk, keepalive=0.01, allowed=allowed)]
+        chunks = self.loop.run_until_complete(read())
+        self.assertEqual(chunks[1:], [': keepalive\n\n', 'event: close\ndata: {}\n\n'])
+        self.assertTrue(_still_member(self.user, self.project.pk))
+        ProjectMembership.objects.filter(project=self.project, user=self.user).delete()
+        self.assertFalse(_still_member(self.user, self.project.pk))
+
+class ConditionalRequestTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='u', password='pass12345')
+        self.project = Project.objects.create(owner=self.user, name='Proj')
+        ProjectMembership.objects.create(project=self.project, user=self.user, role=ProjectMembership.Role.OWNER)
+        self.task = Task.objects.create(project=self.project, title='Card')
+        self.client.login(username='u', password='pass12345')
+
+    def test_unchanged_polls_are_304_until_a_commit_bumps_the_version(self):
+        for url in ['/api/projects/', f'/api/tasks/?project={self.project.pk}', reverse('projects:board', args=[self.project.pk])]:
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                etag = first['ETag']
+                with self.assertNumQueries(3):  # session, user, membership roles (or the project + role)
+                    resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(resp.status_code, 304)
+                with self.captureOnCommitCallbacks(execute=True):
+                    Task.objects.create(project=self.project, title=f'New for {url}')
+                resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(resp.status_code, 200)
+                self.assertNotEqual(resp['ETag'], etag)
+
+    def test_if_match_guards_task_writes(self):
+        url = f'/api/tasks/{self.task.pk}/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        resp = self.client.patch(url, {'title': 'Mine'}, content_type='application/json', HTTP_IF_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        resp = self.client.patch(url, {'title': 'Stale'}, content_type='application/json', HTTP_IF_MATCH=etag)
+        self.assertEqual(resp.status_code, 412)
+        self.assertEqual(Task.objects.get(pk=self.task.pk).title, 'Mine')
+
+@override_settings(SYNC_SETTLE_SECONDS=0)
+class SyncApiTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='u', password='pass12345')
+        self.other = User.objects.create_user(username='o', password='pass12345')
+        self.project = Project.objects.create(owner=self.user, name='Mine')
+        ProjectMembership.objects.create(project=self.project, user=self.user, role=ProjectMembership.Role.OWNER)
+        self.foreign = Project.objects.create(owner=self.other, name='Theirs')
+        ProjectMembership.objects.create(project=self.foreign, user=self.other, role=ProjectMembership.Role.OWNER)
+        self.client.login(username='u', password='pass12345')
+
+    def sync(self, cursor):
+        resp = self.client.get('/api/sync/', {'since': cursor})
+        self.assertEqual(resp.status_code, 200)
+        return resp.json()
+
+    def test_returns_only_changes_since_cursor_with_tombstones(self):
+        cursor = self.client.get('/api/sync/').json()['cursor']
+        keep = Task.objects.create(project=self.project, title='Keep')
+        drop = Task.objects.create(project=self.project, title='Drop')
+        Task.objects.create(project=self.foreign, title='Hidden')
+        drop_pk = drop.pk
+        drop.delete()
+        data = self.sync(cursor)
+        self.assertEqual([t['title'] for t in data['tasks']], ['Keep'])
+        self.assertEqual(data['deleted']['tasks'], [drop_pk])
+        self.assertEqual(self.sync(data['cursor'])['tasks'], [])
+
+        keep.title = 'Renamed'
+        keep.save()
+        data = self.sync(data['cursor'])
+        self.assertEqual([t['title'] for t in data['tasks']], ['Renamed'])
+
+    def test_joining_brings_the_project_and_leaving_removes_it(self):
+        Task.objects.create(project=self.foreign, title='Old task')
+        cursor = self.client.get('/api/sync/').json()['cursor']
+        membership = ProjectMembership.objects.create(project=self.foreign, user=self.user)
+        data = self.sync(cursor)
+        self.assertEqual([p['name'] for p in data['projects']], ['Theirs'])
+        self.assertEqual([t['title'] for t in data['tasks']], ['Old task'])
+        membership.delete()
+        data = self.sync(data['cursor'])
+        self.assertEqual(data['deleted']['projects'], [self.foreign.pk])
+
+    def test_pruned_cursor_is_gone(self):
+        cursor = self.client.get('/api/sync/').json()['cursor']
+        Task.objects.create(project=self.project, title='Old')
+        sync.prune(timezone.now() + timedelta(seconds=1))
+        self.assertEqual(self.client.get('/api/sync/', {'since': cursor}).status_code, 410)
+
+class ExportTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='u', password='pass12345')
+        self.project = Project.objects.create(owner=self.user, name='Proj')
+        ProjectMembership.objects.create(project=self.project, user=self.user, role=ProjectMembership.Role.OWNER)
+        other = User.objects.create_user(username='o', password='pass12345')
+        hidden = Project.objects.create(owner=other, name='Hidden')
+        Task.objects.create(project=hidden, title='Not mine')
+        Task.objects.create(project=self.project, title='Open, "quoted"', assignee=self.user, due_date=date(2030, 1, 2))
+        Task.objects.create(project=self.project, title='Finished', status=Task.Status.DONE)
+        self.client.login(username='u', password='pass12345')
+
+    def test_streams_visible_filtered_rows_as_csv_and_ndjson(self):
+        url = reverse('projects:export', args=['tasks'])
+        resp = self.client.get(url, {'status': 'TODO'})
+        self.assertTrue(resp.streaming)
+        rows = list(csv.DictReader(io.StringIO(b''.join(resp.streaming_content).decode())))
+        self.assertEqual([(r['title'], r['assignee'], r['due_date']) for r in rows], [('Open, "quoted"', 'u', '2030-01-02')])
+
+        resp = self.client.get(url, {'format': 'ndjson', 'project': self.project.pk})
+        titles = [json.loads(line)['title'] for line in b''.join(resp.streaming_content).decode().splitlines()]
+        self.assertEqual(sorted(titles), ['Finished', 'Open, "quoted"'])
+        self.assertEqual(self.client.get(url, {'status': 'NOPE'}).status_code, 400)
+
+    def test_command_writes_all_tasks(self):
+        out = io.StringIO()
+        call_command('export_tasks', '--format', 'ndjson', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 3)
+        with tempfile.NamedTemporaryFile('r', suffix='.csv') as target:
+            call_command('export_tasks', '--status', 'DONE', '-o', target.name)
+            self.assertEqual(target.read().splitlines()[1].split(',')[3], 'Finished')
+
+    def test_command_leaves_out_soft_deleted_projects(self):
+        from .purge import soft_delete
+        soft_delete(Project.objects.get(name='Hidden'))
+        for args, expected in ((), 2), (('--projects',), 1):
+            out = io.StringIO()
+            call_command('export_tasks', '--format', 'ndjson', *args, stdout=out)
+            self.assertEqual(len(out.getvalue().splitlines()), expected, args)
+
+class ImportCommandTest(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', password='pass12345')
+        self.member = User.objects.create_user(username='member', password='pass12345')
+        Project.objects.create(owner=self.owner, name='Existing')
+
+    def run_import(self, content, *args):
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson', delete=False) as source:
+            source.write(content)
+        self.addCleanup(os.remove, source.name)
+        err = io.StringIO()
+        call_command('import_projects', source.name, *args, stdout=io.StringIO(), stderr=err)
+        return err.getvalue()
+
+    def test_ndjson_with_projects_memberships_and_tasks(self):
+        records = [
+            {'type': 'project', 'owner': 'owner', 'name': 'Imported', 'start_date': '2030-01-01'},
+            {'type': 'project', 'owner': 'owner', 'name': 'Existing'},
+            {'type': 'project', 'owner': 'owner', 'name': 'Backwards', 'start_date': '2030-01-02', 'end_date': '2030-01-01'},
+            {'type': 'membership', 'project': 'Imported', 'project_owner': 'owner', 'user': 'member'},
+            {'type': 'task', 'project': 'Imported', 'project_owner': 'owner', 'title': 'A', 'assignee': 'member'},
+            {'type': 'task', 'project': 'Imported', 'project_owner': 'owner', 'title': 'B', 'status': 'DONE'},
+            {'type': 'task', 'project': 'Imported', 'project_owner': 'owner', 'title': 'C', 'assignee': 'ghost'},
+        ]
+        errors = self.run_import('\n'.join(json.dumps(r) for r in records), '--batch-size', '3')
+        self.assertIn('line 2: name:', errors)
+        self.assertIn('line 3: end_date:', errors)
+        self.assertIn('line 7: assignee: Unknown user "ghost".', errors)
+
+        project = Project.objects.get(name='Imported')
+        self.assertEqual(dict(project.memberships.values_list('user__username', 'role')), {'owner': 'OWNER', 'member': 'MEMBER'})
+        self.assertEqual(list(project.tasks.order_by('title').values_list('title', 'order')), [('A', ORDER_GAP), ('B', ORDER_GAP)])
+        stats = ProjectStats.objects.get(project=project)
+        self.assertEqual((stats.todo, stats.done), (1, 1))
+        self.assertEqual(search(self.member, 'Imported').get(), project)
+
+    def test_lines_that_are_not_objects_are_reported_and_skipped(self):
+        content = '[1]\n"x"\n3\n' + json.dumps({'type': 'project', 'owner': 'owner', 'name': 'Kept'})
+        errors = self.run_import(content)
+        for line in (1, 2, 3):
+            self.assertIn(f'line {line}: record: Must be a JSON object.', errors)
+        self.assertTrue(Project.objects.filter(name='Kept').exists())
+
+class QueryBudgetTest(TestCase):
+    def test_every_endpoint_stays_within_its_query_budget(self):
+        small = benchmark.run(benchmark.generate(users=4, projects=3, tasks_per_project=4, fanout=2), repeat=1)
+        large = benchmark.run(benchmark.generate(users=12, projects=8, tasks_per_project=15, fanout=8, seed=1), repeat=1)
+        self.assertEqual({r['name'] for r in large}, {endpoint[0] for endpoint in benchmark.ENDPOINTS})
+        for before, after in zip(small, large):
+            with self.subTest(after['name']):
+                self.assertEqual(after['status'], 200)
+                self.assertFalse(after['over_budget'], f'{after["queries"]} queries, budget {after["budget"]}')
+                self.assertEqual(after['queries'], before['queries'])
+
+    def test_compare_reports_query_deltas(self):
+        results = [{'name': 'board', 'p50_ms': 4.0, 'queries': 5}]
+        self.assertEqual(benchmark.compare(results, [{'name': 'board', 'p50_ms': 2.0, 'queries': 3}]), [('board', 2.0, 2)])
+
+@override_settings(REQUEST_METRICS=True, METRICS_ALLOWED_IPS=[])
+class RequestMetricsTest(TestCase):
+    def setUp(self):
+        instrumentation.registry.clear()
+        self.user = User.objects.create_user(username='u', password='pass12345')
+        project = Project.objects.create(owner=self.user, name='P')
+        ProjectMembership.objects.create(project=project, user=self.user, role=ProjectMembership.Role.OWNER)
+        Task.objects.create(project=project, title='T')
+        self.client.force_login(self.user)
+
+    def test_timings_are_reported_per_request_and_aggregated_per_view(self):
+        with self.assertLogs('projects.metrics', 'INFO') as logs:
+            resp = self.client.get('/api/tasks/')
+        timing = resp['Server-Timing']
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="\d+ queries"')
+        self.assertIn('ser;dur=', timing)
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual((record['view'], record['status']), ('api-tasks-list', 200))
+        self.assertGreater(record['queries'], 0)
+        self.client.get(reverse('projects:project_list'))
+
+        series = instrumentation.registry.views['projects:project_list', 'GET']
+        self.assertEqual(series['duration'].total, 1)
+        self.assertGreater(series['template'], 0)
+
+    def test_async_and_streamed_queries_are_counted(self):
+        from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+        from django.http import HttpResponse, StreamingHttpResponse
+
+        async def view(request):
+            await sync_to_async(Task.objects.count)()
+            return HttpResponse()
+
+        def streaming_view(request):
+            return StreamingHttpResponse(str(Task.objects.count()) for _ in range(3))
+
+        middleware = instrumentation.RequestMetricsMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        resp = async_to_sync(middleware)(RequestFactory().get('/a/'))
+        self.assertIn('desc="1 queries"', resp['Server-Timing'])
+        with self.assertLogs('projects.metrics', 'INFO') as logs:
+            resp = instrumentation.RequestMetricsMiddleware(streaming_view)(RequestFactory().get('/s/'))
+            self.assertEqual(logs.records, [])
+            self.assertEqual(b''.join(resp), b'111')
+            resp.close()
+        self.assertEqual(json.loads(logs.records[-1].getMessage())['queries'], 3)
+
+    def test_metrics_endpoint_is_staff_only(self):
+        self.client.get(reverse('projects:project_list'))
+        self.assertEqual(self.client.get('/metrics/').status_code, 403)
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        body = self.client.get('/metrics/').content.decode()
+        self.assertIn('# TYPE http_request_queries histogram', body)
+        self.assertIn('http_requests_total{view="projects:project_list",method="GET",status="200"} 1', body)
+
+class AsyncViewsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='u', password='pass12345')
+        self.project = Project.objects.create(owner=self.user, name='Mine')
+        ProjectMembership.objects.create(project=self.project, user=self.user, role=ProjectMembership.Role.OWNER)
+        for i, status in enumerate(['TODO', 'TODO', 'DONE']):
+            Task.objects.create(project=self.project, title=f'T{i}', status=status, assignee=self.user if i else None)
+        other = Project.objects.create(owner=User.objects.create_user(username='o'), name='Theirs')
+        self.hidden = Task.objects.create(project=other, title='Hidden')
+        self.client.force_login(self.user)
+
+    def test_task_api_matches_the_sync_endpoint(self):
+        for query in ('', f'?project={self.project.pk}', '?status=TODO', f'?assignee={self.user.pk}', '?ordering=-order',
+                      '?search=t1'):
+            sync_data = self.client.get(f'/api/tasks/{query}').json()
+            async_data = self.client.get(f'/async/api/tasks/{query}').json()
+            self.assertEqual(async_data['results'], sync_data['results'], query)
+        first = self.client.get('/async/api/tasks/?page_size=2').json()
+        rest = self.client.get(first['next']).json()
+        self.assertEqual(len(first['results']) + len(rest['results']), 3)
+        for query in ('?status=NOPE', '?project=x'):
+            self.assertEqual(self.client.get(f'/async/api/tasks/{query}').json(), self.client.get(f'/api/tasks/{query}').json())
+        self.assertEqual(self.client.get('/async/api/tasks/?status=NOPE').status_code, 400)
+        resp = self.client.get('/async/api/tasks/')
+        self.assertEqual(self.client.get('/async/api/tasks/', headers={'If-None-Match': resp['ETag']}).status_code, 304)
+
+    async def test_task_detail_with_etag(self):
+        await self.async_client.aforce_login(self.user)
+        task = await Task.objects.filter(project=self.project).afirst()
+        resp = await self.async_client.get(f'/async/api/tasks/{task.pk}/')
+        self.assertEqual(resp.json()['title'], task.title)
+        resp = await self.async_client.get(f'/async/api/tasks/{task.pk}/', headers={'If-None-Match': resp['ETag']})
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual((await self.async_client.get(f'/async/api/tasks/{self.hidden.pk}/')).status_code, 404)
+        await self.async_client.alogout()
+        self.assertEqual((await self.async_client.get(f'/async/api/tasks/{task.pk}/')).status_code, 403)
+
+    def test_pages_render_like_the_sync_views(self):
+        resp = self.client.get('/async/')
+        self.assertContains(resp, 'Mine')
+        self.assertNotContains(resp, 'Theirs')
+        resp = self.client.get(f'/async/{self.project.pk}/board/')
+        self.assertContains(resp, 'T2')
+        self.assertEqual(self.client.get(f'/async/{self.project.pk}/board/', headers={'If-None-Match': resp['ETag']}).status_code, 304)
+        self.assertEqual(self.client.get(f'/async/{self.hidden.project_id}/board/').status_code, 403)
+        self.client.logout()
+        self.assertEqual(self.client.get('/async/').status_code, 302)
+
+class DetailPagesTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='u', password='pass12345')
+        self.project = Project.objects.create(owner=self.user, name='Proj')
+        ProjectMembership.objects.create(project=self.project, user=self.user, role=ProjectMembership.Role.OWNER)
+        people = User.objects.bulk_create([User(username=f'm{i}') for i in range(4)])
+        ProjectMembership.objects.bulk_create([ProjectMembership(project=self.project, user=p) for p in people])
+        Task.objects.bulk_create([Task(project=self.project, title=f'Task {i}', order=i) for i in range(5)])
+        User.objects.create_user(username='outsider')
+        self.client.force_login(self.user)
+
+    def _follow(self, url, key, label):
+        """Labels of every item of the page at ``url`` and of the slices its "load more" links lead to."""
+        seen = []
+        while url:
+            resp = self.client.get(url)
+            seen += [label(item) for item in resp.context[key]]
+            body = resp.content.decode()
+            url = body.split('class="load-more" href="')[1].split('"')[0] if 'class="load-more"' in body else None
+        return seen
+
+    def test_tasks_and_members_load_in_slices(self):
+        from .views import ProjectDetailView, ProjectMembersView
+        with mock.patch.object(ProjectDetailView, 'tasks_per_page', 2), \
+                mock.patch.object(ProjectMembersView, 'members_per_page', 2):
+            tasks = self._follow(reverse('projects:project_detail', args=[self.project.pk]), 'tasks_page', lambda t: t.title)
+            members = self._follow(reverse('projects:project_members', args=[self.project.pk]), 'members_page',
+                                   lambda m: m.user.username)
+        self.assertEqual(tasks, [f'Task {i}' for i in range(5)])
+        self.assertEqual(members, ['u', 'm0', 'm1', 'm2', 'm3'])
+        self.assertEqual(self.client.get(reverse('projects:project_tasks_more', args=[self.project.pk]) + '?cursor=x').status_code, 404)
+
+    def test_assignee_choices_are_project_members(self):
+        resp = self.client.get(reverse('projects:task_create', args=[self.project.pk]))
+        choices = [label for _, label in resp.context['form'].fields['assignee'].choices]
+        self.assertIn('m0', choices)
+        self.assertNotIn('outsider', choices)
+
+    def test_template_queries_fail_tests(self):
+        from django.template import engines
+        from .testing import TemplateQueryError, allow_template_queries
+        template = engines['django'].from_string('{{ project.tasks.count }}')
+        with self.assertRaises(TemplateQueryError):
+            template.render({'project': self.project})
+        with allow_template_queries():
+            self.assertEqual(template.render({'project': self.project}), '5')
+
+class AdminTest(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass12345')
+        self.member = User.objects.create_user(username='member')
+        self.project = Project.objects.create(owner=self.admin, name='Big')
+        ProjectMembership.objects.create(project=self.project, user=self.admin, role=ProjectMembership.Role.OWNER)
+        ProjectMembership.objects.create(project=self.project, user=self.member)
+        self.other = Project.objects.create(owner=self.admin, name='Other')
+        Task.objects.bulk_create([Task(project=self.project, title=f'Task {i}', assignee=self.admin) for i in range(30)])
+        Task.objects.create(project=self.other, title='Elsewhere', assignee=self.admin)
+        stats.rebuild()
+        self.client.force_login(self.admin)
+
+    def test_changelists_have_fixed_query_counts(self):
+        from .testing import allow_template_queries
+        url = reverse('admin:projects_task_changelist')
+        with allow_template_queries():
+            with self.assertNumQueries(4):
+                self.client.get(url)
+            Task.objects.bulk_create([Task(project=self.other, title=f'More {i}', assignee=self.member) for i in range(20)])
+            with self.assertNumQueries(4):
+                resp = self.client.get(url)
+            self.assertEqual(resp.context['cl'].result_count, 51)
+            self.assertEqual(self.client.get(url, {'q': 'elsewhere'}).context['cl'].result_count, 1)
+
+    def test_project_page_shows_a_read_only_first_page_of_tasks(self):
+        from .testing import allow_template_queries
+        url = reverse('admin:projects_project_change', args=[self.project.pk])
+        with allow_template_queries():
+            resp = self.client.get(url)
+            tasks = resp.context['inline_admin_formsets'][1].formset
+            self.assertEqual(len(tasks.forms), 20)
+            self.assertContains(resp, f'?project__id__exact={self.project.pk}')
+            resp = self.client.get(reverse('admin:projects_task_changelist'), {'project__id__exact': self.project.pk})
+            self.assertEqual(resp.context['cl'].result_count, 30)
+            data = {'name': 'Renamed', 'owner': self.admin.pk, 'status': Project.Status.PLANNED, 'description': ''}
+            for formset in self.client.get(url).context['inline_admin_formsets']:
+                prefix = formset.formset.prefix
+                data.update({f'{prefix}-TOTAL_FORMS': len(formset.formset.forms), f'{prefix}-INITIAL_FORMS': len(formset.formset.forms)})
+            self.assertEqual(self.client.post(url, data).status_code, 302)
+        self.assertEqual(self.project.tasks.count(), 30)
+
+    def test_bulk_actions_update_in_one_statement_per_batch(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .testing import allow_template_queries
+        url = reverse('admin:projects_task_changelist')
+        ids = list(Task.objects.values_list('pk', flat=True))
+        with allow_template_queries(), CaptureQueriesContext(connection) as captured:
+            self.client.post(url, {'action': 'mark_done', '_selected_action': ids})
+        self.assertEqual(sum(q['sql'].startswith('UPDATE "projects_task"') for q in captured.captured_queries), 1)
+        with allow_template_queries():
+            self.assertEqual(Task.objects.filter(status=Task.Status.DONE).count(), 31)
+            self.assertEqual(ProjectStats.objects.get(project=self.project).done, 30)
+            self.client.post(url, {'action': 'assign', 'assignee': 'member', '_selected_action': ids})
+        self.assertEqual(Task.objects.filter(assignee=self.member).count(), 30)
+        self.assertEqual(Task.objects.get(project=self.other).assignee, self.admin)
+        from .bulk import update_tasks
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(update_tasks(Task.objects.all(), batch_size=8, priority=Task.Priority.HIGH), 31)
+        self.assertEqual(sum(q['sql'].startswith('UPDATE "projects_task"') for q in captured.captured_queries), 4)
+        self.assertEqual(ProjectStats.objects.get(project=self.project).high_priority, 30)
+
+    def test_estimated_count_is_exact_off_postgres(self):
+        from .pagination import EstimatedCountPaginator
+        self.assertEqual(EstimatedCountPaginator(Task.objects.all(), 10).count, 31)
+
+class UserLookupTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username='owner', password='pass12345')
+        self.member = User.objects.create_user(username='alice')
+        self.outsider = User.objects.create_user(username='alan')
+        self.project = Project.objects.create(owner=self.owner, name='Proj')
+        ProjectMembership.objects.create(project=self.project, user=self.owner, role=ProjectMembership.Role.OWNER)
+        ProjectMembership.objects.create(project=self.project, user=self.member)
+        self.url = reverse('projects:project_users', args=[self.project.pk])
+        self.client.force_login(self.owner)
+
+    def test_only_members_can_be_assigned(self):
+        create = reverse('projects:task_create', args=[self.project.pk])
+        resp = self.client.post(create, {'title': 'T', 'status': 'TODO', 'priority': 2, 'assignee': self.outsider.pk})
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn('assignee', resp.context['form'].errors)
+        self.client.post(create, {'title': 'T', 'status': 'TODO', 'priority': 2, 'assignee': self.member.pk})
+        self.assertEqual(Task.objects.get().assignee, self.member)
+
+        data = {'project': self.project.pk, 'title': 'Api', 'assignee_id': self.outsider.pk}
+        resp = self.client.post('/api/tasks/', data, content_type='application/json')
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn('assignee_id', resp.json())
+        resp = self.client.post('/api/tasks/', {**data, 'assignee_id': self.member.pk}, content_type='application/json')
+        self.assertEqual(resp.json()['assignee']['username'], 'alice')
+
+    def test_autocomplete(self):
+        self.assertEqual(self.client.get(self.url, {'q': 'AL'}).json()['results'], [{'id': self.member.pk, 'username': 'alice'}])
+        self.assertEqual(self.client.get(self.url, {'q': 'al', 'invite': 1}).json()['results'],
+                         [{'id': self.outsider.pk, 'username': 'alan'}])
+        self.assertEqual(self.client.get(self.url, {'q': 'a', 'invite': 1}).json()['results'], [])
+        self.client.force_login(self.member)
+        self.assertEqual(self.client.get(self.url, {'q': 'al', 'invite': 1}).status_code, 403)
+        self.client.force_login(self.outsider)
+        self.assertEqual(self.client.get(self.url, {'q': 'al'}).status_code, 403)
+
+    @override_settings(PROJECT_CANDIDATE_CACHE_TIMEOUT=60)
+    def test_candidates_are_cached_until_memberships_change(self):
+        from . import users
+        self.assertEqual(users.candidates(self.project.pk), [(self.member.pk, 'alice'), (self.owner.pk, 'owner')])
+        with self.assertNumQueries(0):
+            self.assertTrue(users.is_candidate(self.project.pk, self.member.pk))
+        resp = self.client.post(reverse('projects:project_members', args=[self.project.pk]), {'username': 'alan', 'role': 'MEMBER'})
+        self.assertEqual(resp.status_code, 302)
+        self.assertTrue(users.is_candidate(self.project.pk, self.outsider.pk))
+        self.outsider.username = 'alan2'
+        self.outsider.save()
+        self.assertIn((self.outsider.pk, 'alan2'), users.candidates(self.project.pk))
+
+class ProjectPurgeTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='u', password='pass12345')
+        self.member = User.objects.create_user(username='m')
+        self.project = Project.objects.create(owner=self.user, name='Doomed')
+        ProjectMembership.objects.create(project=self.project, user=self.user, role=ProjectMembership.Role.OWNER)
+        ProjectMembership.objects.create(project=self.project, user=self.member)
+        Task.objects.bulk_create([Task(project=self.project, title=f'Task {i}') for i in range(5)])
+        self.task = Task.objects.filter(project=self.project).first()
+        self.client.force_login(self.user)
+
+    def test_delete_hides_the_project_at_once(self):
+        cursor = self.client.get('/api/sync/').json()['cursor']
+        resp = self.client.post(reverse('projects:project_delete', args=[self.project.pk]))
+        self.assertRedirects(resp, reverse('projects:project_list'))
+        self.assertEqual(Task.objects.count(), 5)  # rows stay until the purge
+        self.assertNotContains(self.client.get(reverse('projects:project_list')), 'Doomed')
+        self.assertEqual(self.client.get(reverse('projects:project_detail', args=[self.project.pk])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('projects:task_detail', args=[self.task.pk])).status_code, 404)
+        self.assertEqual(self.client.get('/api/tasks/').json()['results'], [])
+        self.assertEqual(self.client.get(f'/api/tasks/{self.task.pk}/').status_code, 404)
+        with override_settings(SYNC_SETTLE_SECONDS=0):
+            self.assertEqual(self.client.get('/api/sync/', {'since': cursor}).json()['deleted']['projects'], [self.project.pk])
+        self.assertEqual(self.client.post('/api/projects/', {'name': 'Doomed'}).status_code, 201)
+
+    def test_api_destroy_soft_deletes(self):
+        self.assertEqual(self.client.delete(f'/api/projects/{self.project.pk}/').status_code, 204)
+        self.assertIsNotNone(Project.all_objects.get(pk=self.project.pk).deleted_at)
+        self.assertFalse(Project.objects.filter(pk=self.project.pk).exists())
+
+    def test_purge_deletes_in_batches_and_resumes(self):
+        from . import purge
+        purge.soft_delete(self.project)
+        live = Project.objects.create(owner=self.user, name='Live')
+        Task.objects.create(project=live, title='Stays')
+        original = purge._delete_rows
+        calls = []
+
+        def crash_on_third(model, ids):
+            calls.append(ids)
+            if len(calls) == 3:
+                raise RuntimeError('worker died')
+            return original(model, ids)
+
+        with mock.patch.object(purge, '_delete_rows', crash_on_third), self.assertRaises(RuntimeError):
+            purge.purge(batch_size=2)
+        self.assertEqual(Task.objects.filter(project=self.project).count(), 1)
+        call_command('purge_projects', '--batch-size', '2', stdout=io.StringIO())
+        progress = ProjectPurge.objects.get(project_id=self.project.pk)
+        self.assertEqual((progress.tasks_deleted, progress.memberships_deleted), (5, 2))
+        self.assertIsNotNone(progress.finished_at)
+        self.assertFalse(Project.all_objects.filter(pk=self.project.pk).exists())
+        self.assertFalse(ProjectStats.objects.filter(pk=self.project.pk).exists())
+        self.assertEqual(list(Task.objects.values_list('title', flat=True)), ['Stays'])
+        self.assertEqual(purge.pending(), [])
+
+
+class ActivityTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='u', password='pass12345')
+        self.member = User.objects.create_user(username='m')
+        self.project = Project.objects.create(owner=self.user, name='Audited')
+        ProjectMembership.objects.create(project=self.project, user=self.user, role=ProjectMembership.Role.OWNER)
+        ProjectMembership.objects.create(project=self.project, user=self.member)
+        self.task = Task.objects.create(project=self.project, title='Write docs', order=1000)
+        self.client.force_login(self.user)
+
+    def test_edits_and_moves_are_recorded_as_field_diffs(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('projects:task_edit', args=[self.task.pk]), {
+                'title': 'Write the docs', 'description': '', 'status': 'TODO', 'priority': 2, 'assignee': self.member.pk,
+            })
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post(f'/api/tasks/{self.task.pk}/move/', {'status': 'DONE'}).status_code, 200)
+        moved, edited = activity.for_object(self.task)
+        self.assertEqual(edited.changes, {'title': ['Write docs', 'Write the docs'], 'assignee_id': [None, self.member.pk]})
+        self.assertEqual(moved.changes['status'], ['TODO', 'DONE'])
+        self.assertEqual((moved.action, moved.actor_id, moved.project_id), (Activity.Action.UPDATED, self.user.pk, self.project.pk))
+        history = self.client.get(f'/api/tasks/{self.task.pk}/history/').json()['results']
+        self.assertEqual([entry['id'] for entry in history], [moved.pk, edited.pk])
+        self.assertEqual(self.client.get(f'/api/projects/{self.project.pk}/activity/').json()['results'][0]['id'], moved.pk)
+
+    def test_a_request_writes_its_committed_entries_with_one_insert(self):
+        from django.db import connection, transaction
+        from django.http import HttpResponse
+        from django.test.utils import CaptureQueriesContext
+
+        def view(request):
+            with self.captureOnCommitCallbacks(execute=True):
+                move_task(self.task, Task.Status.DONE)
+                Task.objects.create(project=self.project, title='New')
+                self.task.save()  # nothing changed: no entry
+                try:
+                    with transaction.atomic():
+                        Task.objects.create(project=self.project, title='Rolled back')
+                        raise RuntimeError
+                except RuntimeError:
+                    pass
+            return HttpResponse()
+
+        request = RequestFactory().post('/')
+        request.user = self.user
+        with CaptureQueriesContext(connection) as captured:
+            activity.ActivityMiddleware(view)(request)
+        self.assertEqual(len([q for q in captured if 'projects_activity' in q['sql']]), 1)
+        self.assertEqual(sorted(Activity.objects.values_list('action', flat=True)), ['created', 'updated'])
+        self.assertEqual(set(Activity.objects.values_list('actor_id', flat=True)), {self.user.pk})
+
+    def test_middleware_keeps_async_requests_on_the_event_loop(self):
+        from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+        from django.http import HttpResponse
+
+        def write():
+            with self.captureOnCommitCallbacks(execute=True):
+                move_task(self.task, Task.Status.DONE)
+
+        async def view(request):
+            await sync_to_async(write)()
+            return HttpResponse()
+
+        middleware = activity.ActivityMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        request = RequestFactory().post('/')
+        request.user = self.user
+        async_to_sync(middleware)(request)
+        self.assertEqual(list(Activity.objects.values_list('action', 'actor_id')), [('updated', self.user.pk)])
+
+    def test_prune_deletes_old_entries(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/projects/{self.project.pk}/remove_member/', {'user_id': self.member.pk})
+            Task.objects.filter(pk=self.task.pk).delete()
+        self.assertEqual(Activity.objects.count(), 2)
+        Activity.objects.filter(kind='membership').update(created_at=timezone.now() - timedelta(days=400))
+        out = io.StringIO()
+        call_command('prune_activity', '--days', '365', '--batch-size', '1', stdout=out)
+        self.assertIn('Pruned 1 activity entries', out.getvalue())
+        self.assertEqual(list(Activity.objects.values_list('kind', 'action')), [('task', 'deleted')])
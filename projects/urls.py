@@ -4,11 +4,17 @@ from . import views
 urlpatterns = [
     path('', views.ProjectListView.as_view(), name='project_list'),
     path('create/', views.ProjectCreateView.as_view(), name='project_create'),
+    path('export/<str:kind>/', views.ExportView.as_view(), name='export'),
     path('<int:pk>/', views.ProjectDetailView.as_view(), name='project_detail'),
     path('<int:pk>/edit/', views.ProjectUpdateView.as_view(), name='project_edit'),
     path('<int:pk>/delete/', views.ProjectDeleteView.as_view(), name='project_delete'),
     path('<int:pk>/board/', views.BoardView.as_view(), name='board'),
+    path('<int:pk>/board/events/', views.BoardEventsView.as_view(), name='board_events'),
+    path('<int:pk>/board/<str:status>/', views.BoardColumnView.as_view(), name='board_column'),
     path('<int:pk>/members/', views.ProjectMembersView.as_view(), name='project_members'),
+    path('<int:pk>/members/more/', views.ProjectMemberSliceView.as_view(), name='project_members_more'),
+    path('<int:pk>/users/', views.ProjectUserLookupView.as_view(), name='project_users'),
+    path('<int:pk>/tasks/more/', views.ProjectTaskSliceView.as_view(), name='project_tasks_more'),
     path('<int:project_pk>/tasks/create/', views.TaskCreateView.as_view(), name='task_create'),
     path('tasks/<int:pk>/', views.TaskDetailView.as_view(), name='task_detail'),
     path('tasks/<int:pk>/edit/', views.TaskUpdateView.as_view(), name='task_edit'),
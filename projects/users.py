@@ -0,0 +1,84 @@
+"""User lookups behind the assignee and collaborator pickers.
+
+Tasks can only be assigned to members of their project: ``candidates`` lists
+them as ``[(id, username)]`` with one query, shared between requests through
+the cache when ``PROJECT_CANDIDATE_CACHE_TIMEOUT`` is set and dropped whenever
+the project's memberships change (see ``projects.signals``). ``find`` matches
+usernames by case-insensitive prefix against a dedicated index, so inviting a
+collaborator costs one bounded index scan however many users there are.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef
+
+from .models import ProjectMembership
+
+User = get_user_model()
+
+CANDIDATES_CACHE_KEY = 'projects:candidates:{project_id}'
+
+
+def _cache_timeout():
+    return getattr(settings, 'PROJECT_CANDIDATE_CACHE_TIMEOUT', 0)
+
+
+def install_prefix_index(connection):
+    """Index ``istartswith`` lookups on usernames can use (Django's stock one serves exact matches only)."""
+    table = User._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {table}_username_prefix_idx '
+                           f'ON {table} (UPPER(username::text) text_pattern_ops)')
+        elif connection.vendor == 'sqlite':
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {table}_username_prefix_idx ON {table} (username COLLATE NOCASE)')
+
+
+def candidates(project_id):
+    """``[(user_id, username)]`` of the project's members, ordered by username."""
+    timeout = _cache_timeout()
+    key = CANDIDATES_CACHE_KEY.format(project_id=project_id)
+    if timeout:
+        rows = cache.get(key)
+        if rows is not None:
+            return rows
+    rows = list(User.objects.filter(project_memberships__project=project_id)
+                .order_by('username').values_list('pk', 'username'))
+    if timeout:
+        cache.set(key, rows, timeout)
+    return rows
+
+
+def is_candidate(project_id, user_id):
+    """Whether tasks of the project can be assigned to ``user_id``: the cached list when there is one, else one EXISTS."""
+    if _cache_timeout():
+        return any(pk == user_id for pk, _ in candidates(project_id))
+    return ProjectMembership.objects.filter(project=project_id, user=user_id).exists()
+
+
+def invalidate_candidates(project_ids):
+    if _cache_timeout():
+        cache.delete_many([CANDIDATES_CACHE_KEY.format(project_id=pk) for pk in project_ids])
+
+
+def invalidate_user(user):
+    """Drop the cached lists ``user`` appears in (after a rename)."""
+    if _cache_timeout():
+        invalidate_candidates(ProjectMembership.objects.filter(user=user).values_list('project_id', flat=True))
+
+
+def matching(rows, prefix, limit=10):
+    prefix = prefix.lower()
+    return [row for row in rows if row[1].lower().startswith(prefix)][:limit]
+
+
+def find(prefix, limit=10, exclude_project=None):
+    """Active users whose username starts with ``prefix``, optionally leaving out a project's members."""
+    queryset = User.objects.filter(username__istartswith=prefix, is_active=True)
+    if exclude_project is not None:
+        queryset = queryset.exclude(Exists(ProjectMembership.objects.filter(project=exclude_project, user=OuterRef('pk'))))
+    return list(queryset.order_by('username').values_list('pk', 'username')[:limit])
+
+
+def get_by_username(username):
+    return User.objects.filter(username=username).first()
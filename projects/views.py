@@ -1,18 +1,31 @@
+from asgiref.sync import sync_to_async
 from django.contrib import messages
-from django.contrib.auth import login, get_user_model
+from django.contrib.auth import login
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import Q, Max
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.db import connection
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect
+from django.middleware.csrf import get_token
 from django.urls import reverse_lazy
+from django.utils.cache import get_conditional_response
+from django.views import View
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, FormView, TemplateView
 from django.views.generic.detail import SingleObjectMixin
 
+from . import export, realtime, users
+from .board import board_column_limit, board_columns, board_version, csrf_input
+from .conditional import finish, make_etag
 from .forms import ProjectForm, TaskForm, AddCollaboratorForm
+from .membership import MembershipResolver
 from .models import Project, Task, ProjectMembership
+from .ordering import move_task
+from .pagination import InvalidCursor, KeysetPaginationMixin, KeysetPaginator
 from .permissions import OwnerRequiredMixin, MemberRequiredMixin
-
-User = get_user_model()
+from .purge import soft_delete
+from .search import search
+from .stats import refresh_overdue
 
 class SignUpView(CreateView):
     form_class = UserCreationForm
@@ -24,32 +37,64 @@ class SignUpView(CreateView):
         login(self.request, self.object, backend='django.contrib.auth.backends.ModelBackend')
         return response
 
-class ProjectListView(LoginRequiredMixin, ListView):
+class ProjectListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = Project
     template_name = 'projects/project_list.html'
     context_object_name = 'projects'
     paginate_by = 10
+    keyset_ordering = ('-updated_at', '-id')
 
     def get_queryset(self):
         user = self.request.user
-        qs = Project.objects.filter(memberships__user=user).distinct()
+        qs = Project.objects.visible_to(user)
         q = self.request.GET.get('q')
         if q:
-            qs = qs.filter(Q(name__icontains=q) | Q(description__icontains=q))
+            qs = search(user, q, queryset=qs, ranked=True)
         status = self.request.GET.get('status')
         if status:
             qs = qs.filter(status=status)
-        return qs
+        return qs.select_related('stats')
 
-class ProjectDetailView(LoginRequiredMixin, DetailView):
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        refresh_overdue(ctx['projects'])
+        ctx['status_choices'] = Project.Status.choices
+        return ctx
+
+def keyset_slice(queryset, ordering, per_page, cursor):
+    try:
+        return KeysetPaginator(queryset, ordering, per_page).page(cursor)
+    except InvalidCursor:
+        raise Http404('Invalid cursor.')
+
+class ProjectDetailView(LoginRequiredMixin, MemberRequiredMixin, DetailView):
     model = Project
     template_name = 'projects/project_detail.html'
+    deny_redirect = 'login'
+    tasks_per_page = 25
+    task_ordering = ('status', 'order', 'id')
 
-    def dispatch(self, request, *args, **kwargs):
-        project = self.get_object()
-        if not ProjectMembership.objects.filter(project=project, user=request.user).exists():
-            return redirect('login')
-        return super().dispatch(request, *args, **kwargs)
+    def get_access_queryset(self):
+        return super().get_access_queryset().select_related('stats')
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        refresh_overdue([self.object])
+        ctx['tasks_page'] = keyset_slice(self.object.tasks.all(), self.task_ordering, self.tasks_per_page,
+                                         self.request.GET.get('cursor'))
+        return ctx
+
+class ProjectTaskSliceView(MemberRequiredMixin, TemplateView):
+    """Next slice of the project page's task list, for its "load more" link."""
+    model = Project
+    template_name = 'projects/project_task_items.html'
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx['object'] = self.project
+        ctx['tasks_page'] = keyset_slice(self.project.tasks.all(), ProjectDetailView.task_ordering,
+                                         ProjectDetailView.tasks_per_page, self.request.GET.get('cursor'))
+        return ctx
 
 class ProjectCreateView(LoginRequiredMixin, CreateView):
     model = Project
@@ -72,10 +117,20 @@ class ProjectDeleteView(OwnerRequiredMixin, DeleteView):
     template_name = 'projects/project_confirm_delete.html'
     success_url = reverse_lazy('projects:project_list')
 
+    def form_valid(self, form):
+        soft_delete(self.object)  # the rows go later, in batches (projects.purge)
+        return redirect(self.get_success_url())
+
+def members_slice(project, cursor):
+    return keyset_slice(project.memberships.select_related('user'), ProjectMembersView.member_ordering,
+                        ProjectMembersView.members_per_page, cursor)
+
 class ProjectMembersView(OwnerRequiredMixin, SingleObjectMixin, FormView):
     model = Project
     form_class = AddCollaboratorForm
     template_name = 'projects/project_members.html'
+    members_per_page = 50
+    member_ordering = ('-role', 'id')  # owners first
 
     def get(self, request, *args, **kwargs):
         self.object = self.get_object()
@@ -84,6 +139,7 @@ class ProjectMembersView(OwnerRequiredMixin, SingleObjectMixin, FormView):
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
         ctx['object'] = getattr(self, 'object', self.get_object())
+        ctx['members_page'] = members_slice(ctx['object'], self.request.GET.get('cursor'))
         return ctx
 
     def get_success_url(self):
@@ -91,9 +147,8 @@ class ProjectMembersView(OwnerRequiredMixin, SingleObjectMixin, FormView):
 
     def form_valid(self, form):
         self.object = self.get_object()
-        username = form.cleaned_data['username']
         role = form.cleaned_data['role']
-        user = User.objects.get(username=username)
+        user = form.user
         if user == self.request.user and role != ProjectMembership.Role.OWNER:
             ProjectMembership.objects.update_or_create(project=self.object, user=user, defaults={'role': ProjectMembership.Role.OWNER})
         else:
@@ -114,17 +169,41 @@ class ProjectMembersView(OwnerRequiredMixin, SingleObjectMixin, FormView):
             return redirect(self.object.get_absolute_url())
         return super().post(request, *args, **kwargs)
 
+class ProjectMemberSliceView(OwnerRequiredMixin, TemplateView):
+    """Next slice of the collaborators list, for its "load more" link."""
+    model = Project
+    template_name = 'projects/project_member_items.html'
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx['object'] = self.project
+        ctx['members_page'] = members_slice(self.project, self.request.GET.get('cursor'))
+        return ctx
+
+class ProjectUserLookupView(MemberRequiredMixin, View):
+    """JSON username suggestions: the project's members (assignees), or with ``invite=1`` users outside it (owners only)."""
+    model = Project
+    min_invite_length = 2
+
+    def get(self, request, *args, **kwargs):
+        q = request.GET.get('q', '').strip()
+        if request.GET.get('invite'):
+            if not MembershipResolver.for_request(request).is_owner(self.project.pk):
+                raise PermissionDenied
+            rows = users.find(q, exclude_project=self.project.pk) if len(q) >= self.min_invite_length else []
+        else:
+            rows = users.matching(users.candidates(self.project.pk), q)
+        return JsonResponse({'results': [{'id': pk, 'username': username} for pk, username in rows]})
+
 # Tasks
 class TaskCreateView(MemberRequiredMixin, CreateView):
     model = Task
     form_class = TaskForm
     template_name = 'projects/task_form.html'
+    deny_redirect = 'login'
 
-    def dispatch(self, request, *args, **kwargs):
-        self.project = get_object_or_404(Project, pk=self.kwargs['project_pk'])
-        if not ProjectMembership.objects.filter(project=self.project, user=request.user).exists():
-            return redirect('login')
-        return super().dispatch(request, *args, **kwargs)
+    def get_form_kwargs(self):
+        return {**super().get_form_kwargs(), 'project': self.project}
 
     def form_valid(self, form):
         form.instance.project = self.project
@@ -142,6 +221,9 @@ class TaskUpdateView(MemberRequiredMixin, UpdateView):
     form_class = TaskForm
     template_name = 'projects/task_form.html'
 
+    def get_form_kwargs(self):
+        return {**super().get_form_kwargs(), 'project': self.project}
+
     def get_success_url(self):
         return self.object.project.get_absolute_url()
 
@@ -153,35 +235,113 @@ class TaskDeleteView(MemberRequiredMixin, DeleteView):
         return self.object.project.get_absolute_url()
 
 class BoardView(MemberRequiredMixin, TemplateView):
+    model = Project
     template_name = 'projects/board.html'
 
+    def get(self, request, *args, **kwargs):
+        # Pending flash messages are rendered into the page, so only message-free loads are conditional.
+        # The page embeds a CSRF token; any masking of the same secret stays valid, so the secret keys the tag.
+        get_token(request)
+        etag = None if len(messages.get_messages(request)) else make_etag(
+            'board', request.user.pk, request.META['CSRF_COOKIE'], board_version(self.project.pk))
+        response = get_conditional_response(request, etag=etag) if etag else None
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        return finish(response, etag)
+
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
-        project = get_object_or_404(Project, pk=kwargs['pk'])
-        ctx['project'] = project
-        columns = [
-            (Task.Status.TODO, 'To Do'),
-            (Task.Status.IN_PROGRESS, 'In Progress'),
-            (Task.Status.BLOCKED, 'Blocked'),
-            (Task.Status.DONE, 'Done'),
-        ]
-        tasks = list(project.tasks.all().order_by('status', 'order', '-updated_at'))
-        columns_data = []
-        for code, label in columns:
-            tasks_for_code = [t for t in tasks if t.status == code]
-            columns_data.append((code, label, tasks_for_code))
-        ctx['columns_data'] = columns_data
+        ctx['project'] = self.project
+        ctx['columns'] = board_columns(self.request, self.project)
         return ctx
 
     def post(self, request, *args, **kwargs):
-        project = get_object_or_404(Project, pk=kwargs['pk'])
+        project = self.project
         task_id = request.POST.get('task_id')
         new_status = request.POST.get('status')
+        is_xhr = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
         if task_id and new_status in Task.Status.values:
             task = get_object_or_404(Task, pk=task_id, project=project)
-            if ProjectMembership.objects.filter(project=project, user=request.user).exists():
-                task.status = new_status
-                max_order = Task.objects.filter(project=project, status=new_status).aggregate(Max('order'))['order__max'] or 0
-                task.order = max_order + 1
-                task.save(update_fields=['status', 'order', 'updated_at'])
+            try:
+                move_task(task, new_status, before_id=request.POST.get('before_id'), after_id=request.POST.get('after_id'))
+            except ValidationError as exc:
+                if is_xhr:
+                    return JsonResponse({'error': ' '.join(exc.messages)}, status=400)
+                messages.error(request, ' '.join(exc.messages))
+        elif is_xhr:
+            return JsonResponse({'error': 'Unknown task or status.'}, status=400)
+        if is_xhr:
+            # The board's event stream delivers the change, to this viewer as to everyone else.
+            return HttpResponse(status=204)
         return redirect('projects:board', pk=project.pk)
+
+def _release_connection():
+    if not connection.in_atomic_block:  # e.g. inside a test case's transaction
+        connection.close()
+
+def _still_member(user, project_id):
+    # Through the shared role cache when it is on (dropped on membership changes and soft deletes).
+    try:
+        return MembershipResolver(user).is_member(project_id)
+    finally:
+        _release_connection()
+
+class BoardEventsView(View):
+    """Server-sent events with the board's task changes; needs an ASGI server (project_manager.asgi)."""
+
+    async def get(self, request, pk):
+        user = await request.auser()
+        if not user.is_authenticated or not await ProjectMembership.objects.filter(
+                project_id=pk, user=user, project__deleted_at__isnull=True).aexists():
+            raise PermissionDenied
+        # The stream can stay open for hours: hand the connection back to the pool now, not when it ends.
+        await sync_to_async(_release_connection)()
+
+        async def allowed():  # rechecked while the stream is open, so removed members stop getting events
+            return await sync_to_async(_still_member)(user, pk)
+
+        response = StreamingHttpResponse(realtime.event_stream(pk, allowed=allowed), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+class BoardColumnView(MemberRequiredMixin, TemplateView):
+    """Next slice of one board column, as list items for the board's "load more" link."""
+    model = Project
+    template_name = 'projects/board_tasks.html'
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        status = kwargs['status']
+        if status not in Task.Status.values:
+            raise Http404('Unknown column.')
+        paginator = KeysetPaginator(self.project.tasks.filter(status=status), ('order', 'id'), board_column_limit())
+        try:
+            page = paginator.page(self.request.GET.get('cursor'))
+        except InvalidCursor:
+            raise Http404('Invalid cursor.')
+        ctx.update({
+            'project': self.project,
+            'code': status,
+            'tasks': page.object_list,
+            'more_cursor': page.next_cursor,
+            'status_choices': Task.Status.choices,
+            'csrf_input': csrf_input(self.request),
+        })
+        return ctx
+
+class ExportView(LoginRequiredMixin, View):
+    """CSV/NDJSON download of the caller's projects or tasks, streamed row by row."""
+    querysets = {'tasks': (Task, export.filter_tasks), 'projects': (Project, export.filter_projects)}
+
+    def get(self, request, kind):
+        if kind not in self.querysets:
+            raise Http404('Unknown export.')
+        model, apply_filters = self.querysets[kind]
+        fmt = request.GET.get('format', 'csv')
+        try:
+            queryset = apply_filters(model.objects.visible_to(request.user), request.GET.get('project'),
+                                     request.GET.get('status'), request.GET.get('assignee'))
+            return export.streaming_response(request, queryset, fmt, kind)
+        except ValueError as exc:
+            return HttpResponseBadRequest(str(exc))